@@ -1,16 +1,27 @@
 import pygame
 import sys
+import bisect
+import argparse
+import csv
+from collections import OrderedDict, deque
+import multiprocessing
+from multiprocessing import shared_memory
 import math
+import mmap
+import queue
 import random
-
-# Initialize Pygame and mixer
-pygame.init()
-pygame.mixer.init()
+import struct
+import threading
+import time
+import numpy as np
 
 # Constants
 SCREEN_WIDTH = 800
 SCREEN_HEIGHT = 600
 FPS = 60
+TICK_MS = 1000 / FPS  # Simulated milliseconds per update
+RENDER_FPS = FPS  # Frame rate cap for drawing; 0 draws as fast as possible
+MAX_CATCH_UP_STEPS = 5  # Updates run per frame before falling behind is dropped
 
 # Colors
 WHITE = (255, 255, 255)
@@ -35,8 +46,73 @@ MAX_PLATFORM_HEIGHT = 25
 MIN_PLATFORM_GAP = 100
 MAX_PLATFORM_GAP = 200
 
+# Platform texture cache
+PLATFORM_TEXTURE_CACHE_SIZE = 64
+PLATFORM_OVERHANG = 8  # Room above the platform for grass blades and flowers
+PLATFORM_UNDERHANG = 24  # Room below for bricks and stone blocks that run past the bottom
+
+# Player sprite atlas
+PLAYER_WALK_FRAMES = 16
+PLAYER_SPRITE_PADDING = 4  # Room around the 32x32 body for hat, arms and shoes
+
+# Enemy animation frames
+ENEMY_ANIMATION_FRAMES = 16
+ENEMY_SPRITE_PADDING = 8  # Room for spikes and the ghost's wavy tail
+# Length of one animation cycle in animation_frame units
+ENEMY_ANIMATION_PERIODS = {
+    'goomba': 2 * math.pi / 3,  # Feet use sin(frame * 3)
+    'koopa': math.pi,           # Feet use sin(frame * 2)
+    'spiky': 45 / 20,           # Spikes every 45 degrees, turning 20 degrees per frame
+    'ghost': 2 * math.pi        # Tail uses sin(frame * 5), mouth sin(frame * 3)
+}
+
+# Coin rotation frames (one per rotation step over a full turn)
+COIN_ROTATION_STEP = 5
+COIN_ROTATION_FRAMES = 360 // COIN_ROTATION_STEP
+
+# Rendered text surfaces kept by the HUD text cache
+TEXT_CACHE_SIZE = 256
+
+# Opt-in dirty-rect rendering (only changed screen areas are repainted)
+DIRTY_RECT_RENDERING = False
+
+# Room kept around the screen when culling, for sprites that overhang their hitboxes
+VIEW_MARGIN = 32
+
+# Spatial grid cell size for collision queries
+GRID_CELL_SIZE = 64
+
+# Batched training environment: action bits and padded object slots per level
+ACTION_LEFT = 1
+ACTION_RIGHT = 2
+ACTION_JUMP = 4
+VECTOR_ENV_MAX_PLATFORMS = 24  # Levels that don't fit are regenerated
+VECTOR_ENV_MAX_ENEMIES = 4
+VECTOR_ENV_MAX_COINS = 32
+VECTOR_ENV_MAX_POWER_UPS = 4
+
+# Episodes handed to a rollout worker at a time
+ROLLOUT_SHARD_SIZE = 4
+
+# Layouts that can't be won are generated again from the next seed, at most this many times
+LEVEL_RETRIES = 10
+
+# Levels generated ahead on a background thread, 0 generates each one on demand
+LEVEL_QUEUE_SIZE = 2
+
+# Levels handed to a batch generation worker at a time
+LEVEL_BATCH_SHARD_SIZE = 16
+
+# Endless mode: the world is a row of chunks, each one generated screen-sized level
+CHUNK_WIDTH = SCREEN_WIDTH
+CHUNK_ACTIVE_RADIUS = 1  # Chunks either side of the player's that are simulated and drawn
+CHUNK_LOAD_RADIUS = 2  # Chunks either side that are generated ahead of time
+CHUNK_KEEP_RADIUS = 3  # Chunks further away than this are serialized and dropped
+CHUNK_ARCHIVE_SIZE = 64  # Serialized chunks kept; older ones are generated afresh when revisited
+
 # Add new constants for improvements
 PARTICLE_COUNT = 20
+PARTICLE_CAPACITY = 8192  # Maximum live particles, oldest are recycled first
 POWER_UP_SPAWN_CHANCE = 0.3
 
 # Add new colors for improvements
@@ -45,12 +121,34 @@ PURPLE = (128, 0, 128)
 CYAN = (0, 255, 255)
 PINK = (255, 192, 203)
 
+# Transparent key color for cached background layers
+BACKGROUND_COLORKEY = (255, 0, 255)
+
+# Background clouds
+CLOUD_SEED = 2025
+CLOUD_DRIFT_SPEED = 0.2  # Pixels per simulation tick, 0 disables drift
+
+def display_format(surface, alpha=True):
+    """A cached sprite in the display's pixel format for fast blits, or as is before a display exists"""
+    if pygame.display.get_surface() is None:
+        return surface
+    return surface.convert_alpha() if alpha else surface.convert()
+
 class Player:
+    # Sprite atlases keyed by color palette, shared by all players
+    atlas_cache = {}
+    
     def __init__(self, x, y):
         self.x = x
         self.y = y
+        # Position after the previous update, for render interpolation
+        self.prev_x = x
+        self.prev_y = y
         self.width = 32
         self.height = 32
+        # Horizontal limits of the world the player is kept inside
+        self.min_x = 0
+        self.max_x = SCREEN_WIDTH
         self.vel_x = 0
         self.vel_y = 0
         self.on_ground = False
@@ -78,8 +176,12 @@ class Player:
         self.mustache_color = (139, 69, 19) # Brown mustache
         self.shoe_color = (139, 69, 19)   # Brown shoes
         
-    def update(self, platforms):
-        current_time = pygame.time.get_ticks()
+        # Pre-render all poses once
+        self.sprites = self.build_sprite_atlas()
+        
+    def update(self, platform_grid, inputs, current_time):
+        self.prev_x = self.x
+        self.prev_y = self.y
         
         # Update power-up effects
         if self.speed_boost and current_time > self.speed_boost_end:
@@ -91,9 +193,6 @@ class Player:
         if self.magnet_power and current_time > self.magnet_power_end:
             self.magnet_power = False
         
-        # Handle input
-        keys = pygame.key.get_pressed()
-        
         # Reset walking state
         self.is_walking = False
         
@@ -101,11 +200,11 @@ class Player:
         current_speed = PLAYER_SPEED * 1.5 if self.speed_boost else PLAYER_SPEED
         
         # Horizontal movement
-        if keys[pygame.K_LEFT] or keys[pygame.K_a]:
+        if inputs.left:
             self.vel_x = -current_speed
             self.facing_right = False
             self.is_walking = True
-        elif keys[pygame.K_RIGHT] or keys[pygame.K_d]:
+        elif inputs.right:
             self.vel_x = current_speed
             self.facing_right = True
             self.is_walking = True
@@ -114,7 +213,7 @@ class Player:
             
         # Jumping with power-up enhancement
         jump_strength = JUMP_STRENGTH * 1.3 if self.jump_boost else JUMP_STRENGTH
-        if (keys[pygame.K_SPACE] or keys[pygame.K_UP] or keys[pygame.K_w]) and self.on_ground:
+        if inputs.jump and self.on_ground:
             self.vel_y = jump_strength
             self.on_ground = False
             self.is_jumping = True
@@ -136,52 +235,50 @@ class Player:
         old_y = self.y
         
         # Update horizontal position first
+        start_rect = pygame.Rect(old_x, old_y, self.width, self.height)
         self.x += self.vel_x
         
-        # Check horizontal collisions
+        # Check horizontal collisions along the whole move, so a fast player can't skip a platform
         player_rect = pygame.Rect(self.x, self.y, self.width, self.height)
-        for platform in platforms:
-            platform_rect = pygame.Rect(platform.x, platform.y, platform.width, platform.height)
-            
-            if player_rect.colliderect(platform_rect):
-                # Horizontal collision - push player out
-                if self.vel_x > 0:  # Moving right
-                    self.x = platform.x - self.width
-                elif self.vel_x < 0:  # Moving left
-                    self.x = platform.x + platform.width
-                self.vel_x = 0
-                break
+        hits = platform_grid.sweep(start_rect, player_rect)
+        if hits:
+            # Push player out before the first platform hit, which clears the rest too
+            platform = hits[0][1]
+            if self.vel_x > 0:  # Moving right
+                self.x = platform.x - self.width
+            elif self.vel_x < 0:  # Moving left
+                self.x = platform.x + platform.width
+            self.vel_x = 0
         
         # Update vertical position
+        start_rect = pygame.Rect(self.x, old_y, self.width, self.height)
         self.y += self.vel_y
         
-        # Check vertical collisions
+        # Check vertical collisions in order of impact, stopping at the first one that counts
         self.on_ground = False
         player_rect = pygame.Rect(self.x, self.y, self.width, self.height)
         
-        for platform in platforms:
-            platform_rect = pygame.Rect(platform.x, platform.y, platform.width, platform.height)
-            
-            if player_rect.colliderect(platform_rect):
-                if self.vel_y > 0:  # Falling down - landing on platform
-                    # Only land on platform if player was above it
-                    if old_y + self.height <= platform.y + 5:  # Small tolerance
-                        self.y = platform.y - self.height
-                        self.vel_y = 0
-                        self.on_ground = True
-                        self.is_jumping = False
-                elif self.vel_y < 0:  # Moving up - hitting platform from below
-                    # Only hit from below if player was below it
-                    if old_y >= platform.y + platform.height - 5:  # Small tolerance
-                        self.y = platform.y + platform.height
-                        self.vel_y = 0
-                break
+        for _, platform in platform_grid.sweep(start_rect, player_rect):
+            if self.vel_y > 0:  # Falling down - landing on platform
+                # Only land on platform if player was above it
+                if old_y + self.height <= platform.y + 5:  # Small tolerance
+                    self.y = platform.y - self.height
+                    self.vel_y = 0
+                    self.on_ground = True
+                    self.is_jumping = False
+                    break
+            elif self.vel_y < 0:  # Moving up - hitting platform from below
+                # Only hit from below if player was below it
+                if old_y >= platform.y + platform.height - 5:  # Small tolerance
+                    self.y = platform.y + platform.height
+                    self.vel_y = 0
+                    break
                     
-        # Keep player on screen horizontally
-        if self.x < 0:
-            self.x = 0
-        elif self.x > SCREEN_WIDTH - self.width:
-            self.x = SCREEN_WIDTH - self.width
+        # Keep player inside the world horizontally
+        if self.x < self.min_x:
+            self.x = self.min_x
+        elif self.x > self.max_x - self.width:
+            self.x = self.max_x - self.width
             
         # Ground collision (bottom of screen)
         if self.y > SCREEN_HEIGHT - self.height:
@@ -190,9 +287,7 @@ class Player:
             self.on_ground = True
             self.is_jumping = False
     
-    def apply_power_up(self, power_type, duration):
-        current_time = pygame.time.get_ticks()
-        
+    def apply_power_up(self, power_type, duration, current_time):
         if power_type == 'speed':
             self.speed_boost = True
             self.speed_boost_end = current_time + duration
@@ -206,55 +301,119 @@ class Player:
             self.magnet_power = True
             self.magnet_power_end = current_time + duration
     
-    def draw(self, screen):
+    def draw(self, screen, alpha=1.0, offset=(0, 0)):
+        atlas, frames, overlays = self.sprites
+        # Blend the last two updates; alpha is how far we are into the next one
+        x = self.prev_x + (self.x - self.prev_x) * alpha + offset[0]
+        y = self.prev_y + (self.y - self.prev_y) * alpha + offset[1]
+        center_x = int(x + self.width//2)
+        center_y = int(y + self.height//2)
+        rects = []
+        
         # Add glow effect for power-ups
         if self.invincible_power:
             # Draw invincible glow
-            for i in range(3):
-                glow_color = (255, 255, 0, 100 - i * 30)  # Yellow glow
-                pygame.draw.circle(screen, YELLOW, 
-                                 (int(self.x + self.width//2), int(self.y + self.height//2)), 
-                                 self.width//2 + i * 3)
+            glow = overlays['invincible']
+            rects.append(screen.blit(glow, (center_x - glow.get_width() // 2, center_y - glow.get_height() // 2)))
         
         if self.speed_boost:
             # Draw speed trails
-            for i in range(3):
-                trail_x = self.x - (i + 1) * 5 * (1 if self.facing_right else -1)
-                trail_alpha = 100 - i * 30
-                # Simple trail effect (you could make this more sophisticated)
-                pygame.draw.circle(screen, ORANGE, 
-                                 (int(trail_x + self.width//2), int(self.y + self.height//2)), 
-                                 3 - i)
+            trail = overlays[('speed', self.facing_right)]
+            rects.append(screen.blit(trail, (center_x - trail.get_width() // 2, center_y - trail.get_height() // 2)))
         
         # Draw normal player
+        rect = screen.blit(atlas, (int(x) - PLAYER_SPRITE_PADDING, int(y) - PLAYER_SPRITE_PADDING), 
+                           frames[self.get_pose_key()])
+        return rect.unionall(rects)
+    
+    def get_pose_key(self):
+        """Pick the atlas frame for the current pose"""
         if self.is_jumping:
-            self.draw_jumping(screen)
+            return ('jumping', self.facing_right)
         elif self.is_walking:
-            self.draw_walking(screen)
+            # Quantize the walk cycle into PLAYER_WALK_FRAMES phases
+            cycle = (self.animation_frame * 4) / (2 * math.pi)
+            phase = int(cycle * PLAYER_WALK_FRAMES) % PLAYER_WALK_FRAMES
+            return ('walking', self.facing_right, phase)
         else:
-            self.draw_standing(screen)
+            return ('standing', self.facing_right)
+    
+    def build_sprite_atlas(self):
+        """Pre-render every pose into a sprite atlas shared by players with the same colors"""
+        palette = (self.hat_color, self.shirt_color, self.overalls_color, 
+                   self.skin_color, self.mustache_color, self.shoe_color)
+        if palette in Player.atlas_cache:
+            return Player.atlas_cache[palette]
+        
+        pose_keys = []
+        for facing_right in (True, False):
+            pose_keys.append(('standing', facing_right))
+            pose_keys.append(('jumping', facing_right))
+            for phase in range(PLAYER_WALK_FRAMES):
+                pose_keys.append(('walking', facing_right, phase))
+        
+        # Lay out all frames in a single row
+        cell_width = self.width + PLAYER_SPRITE_PADDING * 2
+        cell_height = self.height + PLAYER_SPRITE_PADDING * 2
+        atlas = pygame.Surface((cell_width * len(pose_keys), cell_height), pygame.SRCALPHA)
+        frames = {}
+        
+        for i, pose_key in enumerate(pose_keys):
+            x = i * cell_width + PLAYER_SPRITE_PADDING
+            y = PLAYER_SPRITE_PADDING
+            facing_right = pose_key[1]
+            if pose_key[0] == 'standing':
+                self.draw_standing(atlas, x, y, facing_right)
+            elif pose_key[0] == 'jumping':
+                self.draw_jumping(atlas, x, y, facing_right)
+            else:
+                walk_angle = pose_key[2] * 2 * math.pi / PLAYER_WALK_FRAMES
+                self.draw_walking(atlas, x, y, facing_right, walk_angle)
+            frames[pose_key] = pygame.Rect(i * cell_width, 0, cell_width, cell_height)
+        
+        # Power-up overlays, centered on the player
+        overlays = {}
+        glow_radius = self.width//2 + 2 * 3
+        glow = pygame.Surface((glow_radius * 2, glow_radius * 2), pygame.SRCALPHA)
+        for i in range(3):
+            pygame.draw.circle(glow, YELLOW, (glow_radius, glow_radius), self.width//2 + i * 3)
+        overlays['invincible'] = glow
+        
+        for facing_right in (True, False):
+            trail = pygame.Surface((40, 8), pygame.SRCALPHA)
+            for i in range(3):
+                trail_x = 20 - (i + 1) * 5 * (1 if facing_right else -1)
+                # Simple trail effect (you could make this more sophisticated)
+                pygame.draw.circle(trail, ORANGE, (trail_x, 4), 3 - i)
+            overlays[('speed', facing_right)] = trail
+        
+        atlas = display_format(atlas)
+        overlays = {key: display_format(overlay) for key, overlay in overlays.items()}
+        
+        Player.atlas_cache[palette] = (atlas, frames, overlays)
+        return Player.atlas_cache[palette]
     
-    def draw_standing(self, screen):
+    def draw_standing(self, surface, x, y, facing_right):
         """Draw Mario in standing pose"""
         # Body base
-        body_x = self.x + 4
-        body_y = self.y + 8
+        body_x = x + 4
+        body_y = y + 8
         body_width = self.width - 8
         body_height = self.height - 8
         
         # Draw overalls (blue)
-        pygame.draw.rect(screen, self.overalls_color, 
+        pygame.draw.rect(surface, self.overalls_color, 
                         (body_x + 2, body_y + 8, body_width - 4, body_height - 12))
         
         # Draw shirt (red) - upper body
-        pygame.draw.rect(screen, self.shirt_color, 
+        pygame.draw.rect(surface, self.shirt_color, 
                         (body_x + 4, body_y + 4, body_width - 8, 8))
         
         # Draw head (skin color)
         head_radius = 8
-        head_x = int(self.x + self.width // 2)
-        head_y = int(self.y + head_radius + 2)
-        pygame.draw.circle(screen, self.skin_color, (head_x, head_y), head_radius)
+        head_x = int(x + self.width // 2)
+        head_y = int(y + head_radius + 2)
+        pygame.draw.circle(surface, self.skin_color, (head_x, head_y), head_radius)
         
         # Draw hat (red)
         hat_points = [
@@ -263,15 +422,15 @@ class Player:
             (head_x + 8, head_y - 12),
             (head_x - 8, head_y - 12)
         ]
-        pygame.draw.polygon(screen, self.hat_color, hat_points)
+        pygame.draw.polygon(surface, self.hat_color, hat_points)
         
         # Hat brim
-        pygame.draw.ellipse(screen, self.hat_color, 
+        pygame.draw.ellipse(surface, self.hat_color, 
                           (head_x - 12, head_y - 6, 24, 8))
         
         # Hat emblem (M)
-        pygame.draw.circle(screen, WHITE, (head_x, head_y - 8), 4)
-        pygame.draw.circle(screen, self.hat_color, (head_x, head_y - 8), 3)
+        pygame.draw.circle(surface, WHITE, (head_x, head_y - 8), 4)
+        pygame.draw.circle(surface, self.hat_color, (head_x, head_y - 8), 3)
         
         # Draw mustache
         mustache_points = [
@@ -280,89 +439,89 @@ class Player:
             (head_x + 2, head_y + 4),
             (head_x + 6, head_y + 2)
         ]
-        pygame.draw.polygon(screen, self.mustache_color, mustache_points)
+        pygame.draw.polygon(surface, self.mustache_color, mustache_points)
         
         # Draw nose
-        pygame.draw.circle(screen, (255, 200, 150), (head_x, head_y + 1), 2)
+        pygame.draw.circle(surface, (255, 200, 150), (head_x, head_y + 1), 2)
         
         # Draw eyes
-        eye_offset = 4 if self.facing_right else -4
-        pygame.draw.circle(screen, WHITE, (head_x - 3, head_y - 2), 2)
-        pygame.draw.circle(screen, WHITE, (head_x + 3, head_y - 2), 2)
-        pygame.draw.circle(screen, BLACK, (head_x - 3 + (1 if self.facing_right else -1), head_y - 2), 1)
-        pygame.draw.circle(screen, BLACK, (head_x + 3 + (1 if self.facing_right else -1), head_y - 2), 1)
+        eye_offset = 4 if facing_right else -4
+        pygame.draw.circle(surface, WHITE, (head_x - 3, head_y - 2), 2)
+        pygame.draw.circle(surface, WHITE, (head_x + 3, head_y - 2), 2)
+        pygame.draw.circle(surface, BLACK, (head_x - 3 + (1 if facing_right else -1), head_y - 2), 1)
+        pygame.draw.circle(surface, BLACK, (head_x + 3 + (1 if facing_right else -1), head_y - 2), 1)
         
         # Draw arms
         arm_y = body_y + 6
-        if self.facing_right:
+        if facing_right:
             # Right arm forward
-            pygame.draw.circle(screen, self.skin_color, (body_x + body_width + 2, arm_y), 3)
-            pygame.draw.circle(screen, self.skin_color, (body_x - 2, arm_y + 2), 3)
+            pygame.draw.circle(surface, self.skin_color, (body_x + body_width + 2, arm_y), 3)
+            pygame.draw.circle(surface, self.skin_color, (body_x - 2, arm_y + 2), 3)
         else:
             # Left arm forward
-            pygame.draw.circle(screen, self.skin_color, (body_x - 2, arm_y), 3)
-            pygame.draw.circle(screen, self.skin_color, (body_x + body_width + 2, arm_y + 2), 3)
+            pygame.draw.circle(surface, self.skin_color, (body_x - 2, arm_y), 3)
+            pygame.draw.circle(surface, self.skin_color, (body_x + body_width + 2, arm_y + 2), 3)
         
         # Draw gloves (white circles on hands)
-        if self.facing_right:
-            pygame.draw.circle(screen, WHITE, (body_x + body_width + 2, arm_y), 2)
-            pygame.draw.circle(screen, WHITE, (body_x - 2, arm_y + 2), 2)
+        if facing_right:
+            pygame.draw.circle(surface, WHITE, (body_x + body_width + 2, arm_y), 2)
+            pygame.draw.circle(surface, WHITE, (body_x - 2, arm_y + 2), 2)
         else:
-            pygame.draw.circle(screen, WHITE, (body_x - 2, arm_y), 2)
-            pygame.draw.circle(screen, WHITE, (body_x + body_width + 2, arm_y + 2), 2)
+            pygame.draw.circle(surface, WHITE, (body_x - 2, arm_y), 2)
+            pygame.draw.circle(surface, WHITE, (body_x + body_width + 2, arm_y + 2), 2)
         
         # Draw legs
         leg_width = 4
         leg_height = 8
-        pygame.draw.rect(screen, self.overalls_color, 
+        pygame.draw.rect(surface, self.overalls_color, 
                         (body_x + 2, body_y + body_height - 4, leg_width, leg_height))
-        pygame.draw.rect(screen, self.overalls_color, 
+        pygame.draw.rect(surface, self.overalls_color, 
                         (body_x + body_width - 6, body_y + body_height - 4, leg_width, leg_height))
         
         # Draw shoes
         shoe_width = 8
         shoe_height = 4
-        pygame.draw.ellipse(screen, self.shoe_color, 
-                          (body_x, self.y + self.height - shoe_height, shoe_width, shoe_height))
-        pygame.draw.ellipse(screen, self.shoe_color, 
-                          (body_x + body_width - shoe_width, self.y + self.height - shoe_height, 
+        pygame.draw.ellipse(surface, self.shoe_color, 
+                          (body_x, y + self.height - shoe_height, shoe_width, shoe_height))
+        pygame.draw.ellipse(surface, self.shoe_color, 
+                          (body_x + body_width - shoe_width, y + self.height - shoe_height, 
                            shoe_width, shoe_height))
         
         # Draw overalls straps
-        pygame.draw.line(screen, self.overalls_color, 
+        pygame.draw.line(surface, self.overalls_color, 
                         (body_x + 6, body_y + 4), (body_x + 4, body_y + 12), 2)
-        pygame.draw.line(screen, self.overalls_color, 
+        pygame.draw.line(surface, self.overalls_color, 
                         (body_x + body_width - 6, body_y + 4), (body_x + body_width - 4, body_y + 12), 2)
         
         # Draw buttons on overalls
-        pygame.draw.circle(screen, YELLOW, (body_x + 6, body_y + 8), 1)
-        pygame.draw.circle(screen, YELLOW, (body_x + body_width - 6, body_y + 8), 1)
+        pygame.draw.circle(surface, YELLOW, (body_x + 6, body_y + 8), 1)
+        pygame.draw.circle(surface, YELLOW, (body_x + body_width - 6, body_y + 8), 1)
     
-    def draw_walking(self, screen):
+    def draw_walking(self, surface, x, y, facing_right, walk_angle):
         """Draw Mario in walking animation"""
         # Walking animation with leg movement
-        leg_offset = int(math.sin(self.animation_frame * 4) * 2)
-        arm_swing = int(math.sin(self.animation_frame * 4) * 1)
+        leg_offset = int(math.sin(walk_angle) * 2)
+        arm_swing = int(math.sin(walk_angle) * 1)
         
         # Body base
-        body_x = self.x + 4
-        body_y = self.y + 8 + abs(leg_offset) // 2  # Slight bounce
+        body_x = x + 4
+        body_y = y + 8 + abs(leg_offset) // 2  # Slight bounce
         body_width = self.width - 8
         body_height = self.height - 8
         
         # Draw overalls (blue)
-        pygame.draw.rect(screen, self.overalls_color, 
+        pygame.draw.rect(surface, self.overalls_color, 
                         (body_x + 2, body_y + 8, body_width - 4, body_height - 12))
         
         # Draw shirt (red) - upper body
-        pygame.draw.rect(screen, self.shirt_color, 
+        pygame.draw.rect(surface, self.shirt_color, 
                         (body_x + 4, body_y + 4, body_width - 8, 8))
         
         # Draw head (skin color) - slight head bob
         head_radius = 8
-        head_x = int(self.x + self.width // 2)
+        head_x = int(x + self.width // 2)
         head_y = int(body_y + head_radius - 6 + abs(leg_offset) // 4)
-        pygame.draw.circle(screen, self.skin_color, (head_x, head_y), head_radius)
+        pygame.draw.circle(surface, self.skin_color, (head_x, head_y), head_radius)
         
         # Draw hat (red)
         hat_points = [
@@ -371,15 +530,15 @@ class Player:
             (head_x + 8, head_y - 12),
             (head_x - 8, head_y - 12)
         ]
-        pygame.draw.polygon(screen, self.hat_color, hat_points)
+        pygame.draw.polygon(surface, self.hat_color, hat_points)
         
         # Hat brim
-        pygame.draw.ellipse(screen, self.hat_color, 
+        pygame.draw.ellipse(surface, self.hat_color, 
                           (head_x - 12, head_y - 6, 24, 8))
         
         # Hat emblem (M)
-        pygame.draw.circle(screen, WHITE, (head_x, head_y - 8), 4)
-        pygame.draw.circle(screen, self.hat_color, (head_x, head_y - 8), 3)
+        pygame.draw.circle(surface, WHITE, (head_x, head_y - 8), 4)
+        pygame.draw.circle(surface, self.hat_color, (head_x, head_y - 8), 3)
         
         # Draw mustache
         mustache_points = [
@@ -388,80 +547,80 @@ class Player:
             (head_x + 2, head_y + 4),
             (head_x + 6, head_y + 2)
         ]
-        pygame.draw.polygon(screen, self.mustache_color, mustache_points)
+        pygame.draw.polygon(surface, self.mustache_color, mustache_points)
         
         # Draw nose
-        pygame.draw.circle(screen, (255, 200, 150), (head_x, head_y + 1), 2)
+        pygame.draw.circle(surface, (255, 200, 150), (head_x, head_y + 1), 2)
         
         # Draw eyes
-        pygame.draw.circle(screen, WHITE, (head_x - 3, head_y - 2), 2)
-        pygame.draw.circle(screen, WHITE, (head_x + 3, head_y - 2), 2)
-        pygame.draw.circle(screen, BLACK, (head_x - 3 + (1 if self.facing_right else -1), head_y - 2), 1)
-        pygame.draw.circle(screen, BLACK, (head_x + 3 + (1 if self.facing_right else -1), head_y - 2), 1)
+        pygame.draw.circle(surface, WHITE, (head_x - 3, head_y - 2), 2)
+        pygame.draw.circle(surface, WHITE, (head_x + 3, head_y - 2), 2)
+        pygame.draw.circle(surface, BLACK, (head_x - 3 + (1 if facing_right else -1), head_y - 2), 1)
+        pygame.draw.circle(surface, BLACK, (head_x + 3 + (1 if facing_right else -1), head_y - 2), 1)
         
         # Draw arms with swinging motion
         arm_y = body_y + 6
-        if self.facing_right:
-            pygame.draw.circle(screen, self.skin_color, (body_x + body_width + 2, arm_y + arm_swing), 3)
-            pygame.draw.circle(screen, self.skin_color, (body_x - 2, arm_y - arm_swing), 3)
+        if facing_right:
+            pygame.draw.circle(surface, self.skin_color, (body_x + body_width + 2, arm_y + arm_swing), 3)
+            pygame.draw.circle(surface, self.skin_color, (body_x - 2, arm_y - arm_swing), 3)
             # Gloves
-            pygame.draw.circle(screen, WHITE, (body_x + body_width + 2, arm_y + arm_swing), 2)
-            pygame.draw.circle(screen, WHITE, (body_x - 2, arm_y - arm_swing), 2)
+            pygame.draw.circle(surface, WHITE, (body_x + body_width + 2, arm_y + arm_swing), 2)
+            pygame.draw.circle(surface, WHITE, (body_x - 2, arm_y - arm_swing), 2)
         else:
-            pygame.draw.circle(screen, self.skin_color, (body_x - 2, arm_y + arm_swing), 3)
-            pygame.draw.circle(screen, self.skin_color, (body_x + body_width + 2, arm_y - arm_swing), 3)
+            pygame.draw.circle(surface, self.skin_color, (body_x - 2, arm_y + arm_swing), 3)
+            pygame.draw.circle(surface, self.skin_color, (body_x + body_width + 2, arm_y - arm_swing), 3)
             # Gloves
-            pygame.draw.circle(screen, WHITE, (body_x - 2, arm_y + arm_swing), 2)
-            pygame.draw.circle(screen, WHITE, (body_x + body_width + 2, arm_y - arm_swing), 2)
+            pygame.draw.circle(surface, WHITE, (body_x - 2, arm_y + arm_swing), 2)
+            pygame.draw.circle(surface, WHITE, (body_x + body_width + 2, arm_y - arm_swing), 2)
         
         # Draw legs with walking animation
         leg_width = 4
         leg_height = 8
-        pygame.draw.rect(screen, self.overalls_color, 
+        pygame.draw.rect(surface, self.overalls_color, 
                         (body_x + 2, body_y + body_height - 4, leg_width, leg_height + leg_offset))
-        pygame.draw.rect(screen, self.overalls_color, 
+        pygame.draw.rect(surface, self.overalls_color, 
                         (body_x + body_width - 6, body_y + body_height - 4, leg_width, leg_height - leg_offset))
         
         # Draw shoes with walking animation
         shoe_width = 8
         shoe_height = 4
-        pygame.draw.ellipse(screen, self.shoe_color, 
-                          (body_x, self.y + self.height - shoe_height + leg_offset, shoe_width, shoe_height))
-        pygame.draw.ellipse(screen, self.shoe_color, 
-                          (body_x + body_width - shoe_width - 1, self.y + self.height - shoe_height - leg_offset, 
+        pygame.draw.ellipse(surface, self.shoe_color, 
+                          (body_x, y + self.height - shoe_height + leg_offset, shoe_width, shoe_height))
+        pygame.draw.ellipse(surface, self.shoe_color, 
+                          (body_x + body_width - shoe_width - 1, y + self.height - shoe_height - leg_offset, 
                            shoe_width, shoe_height))
         
         # Draw overalls straps
-        pygame.draw.line(screen, self.overalls_color, 
+        pygame.draw.line(surface, self.overalls_color, 
                         (body_x + 6, body_y + 4), (body_x + 4, body_y + 12), 2)
-        pygame.draw.line(screen, self.overalls_color, 
+        pygame.draw.line(surface, self.overalls_color, 
                         (body_x + body_width - 6, body_y + 4), (body_x + body_width - 4, body_y + 12), 2)
         
         # Draw buttons on overalls
-        pygame.draw.circle(screen, YELLOW, (body_x + 6, body_y + 8), 1)
-        pygame.draw.circle(screen, YELLOW, (body_x + body_width - 6, body_y + 8), 1)
+        pygame.draw.circle(surface, YELLOW, (body_x + 6, body_y + 8), 1)
+        pygame.draw.circle(surface, YELLOW, (body_x + body_width - 6, body_y + 8), 1)
     
-    def draw_jumping(self, screen):
+    def draw_jumping(self, surface, x, y, facing_right):
         """Draw Mario in jumping pose"""
         # Body base
-        body_x = self.x + 4
-        body_y = self.y + 8
+        body_x = x + 4
+        body_y = y + 8
         body_width = self.width - 8
         body_height = self.height - 8
         
         # Draw overalls (blue)
-        pygame.draw.rect(screen, self.overalls_color, 
+        pygame.draw.rect(surface, self.overalls_color, 
                         (body_x + 2, body_y + 8, body_width - 4, body_height - 12))
         
         # Draw shirt (red) - upper body
-        pygame.draw.rect(screen, self.shirt_color, 
+        pygame.draw.rect(surface, self.shirt_color, 
                         (body_x + 4, body_y + 4, body_width - 8, 8))
         
         # Draw head (skin color)
         head_radius = 8
-        head_x = int(self.x + self.width // 2)
-        head_y = int(self.y + head_radius + 2)
-        pygame.draw.circle(screen, self.skin_color, (head_x, head_y), head_radius)
+        head_x = int(x + self.width // 2)
+        head_y = int(y + head_radius + 2)
+        pygame.draw.circle(surface, self.skin_color, (head_x, head_y), head_radius)
         
         # Draw hat (red)
         hat_points = [
@@ -470,15 +629,15 @@ class Player:
             (head_x + 8, head_y - 12),
             (head_x - 8, head_y - 12)
         ]
-        pygame.draw.polygon(screen, self.hat_color, hat_points)
+        pygame.draw.polygon(surface, self.hat_color, hat_points)
         
         # Hat brim
-        pygame.draw.ellipse(screen, self.hat_color, 
+        pygame.draw.ellipse(surface, self.hat_color, 
                           (head_x - 12, head_y - 6, 24, 8))
         
         # Hat emblem (M)
-        pygame.draw.circle(screen, WHITE, (head_x, head_y - 8), 4)
-        pygame.draw.circle(screen, self.hat_color, (head_x, head_y - 8), 3)
+        pygame.draw.circle(surface, WHITE, (head_x, head_y - 8), 4)
+        pygame.draw.circle(surface, self.hat_color, (head_x, head_y - 8), 3)
         
         # Draw mustache
         mustache_points = [
@@ -487,79 +646,232 @@ class Player:
             (head_x + 2, head_y + 4),
             (head_x + 6, head_y + 2)
         ]
-        pygame.draw.polygon(screen, self.mustache_color, mustache_points)
+        pygame.draw.polygon(surface, self.mustache_color, mustache_points)
         
         # Draw nose
-        pygame.draw.circle(screen, (255, 200, 150), (head_x, head_y + 1), 2)
+        pygame.draw.circle(surface, (255, 200, 150), (head_x, head_y + 1), 2)
         
         # Draw eyes (excited expression)
-        pygame.draw.circle(screen, WHITE, (head_x - 3, head_y - 2), 2)
-        pygame.draw.circle(screen, WHITE, (head_x + 3, head_y - 2), 2)
-        pygame.draw.circle(screen, BLACK, (head_x - 3, head_y - 3), 1)  # Eyes looking up
-        pygame.draw.circle(screen, BLACK, (head_x + 3, head_y - 3), 1)
+        pygame.draw.circle(surface, WHITE, (head_x - 3, head_y - 2), 2)
+        pygame.draw.circle(surface, WHITE, (head_x + 3, head_y - 2), 2)
+        pygame.draw.circle(surface, BLACK, (head_x - 3, head_y - 3), 1)  # Eyes looking up
+        pygame.draw.circle(surface, BLACK, (head_x + 3, head_y - 3), 1)
         
         # Draw arms raised up (jumping pose)
         arm_y = body_y + 2
-        if self.facing_right:
-            pygame.draw.circle(screen, self.skin_color, (body_x + body_width + 4, arm_y - 4), 3)
-            pygame.draw.circle(screen, self.skin_color, (body_x - 4, arm_y - 2), 3)
+        if facing_right:
+            pygame.draw.circle(surface, self.skin_color, (body_x + body_width + 4, arm_y - 4), 3)
+            pygame.draw.circle(surface, self.skin_color, (body_x - 4, arm_y - 2), 3)
             # Gloves
-            pygame.draw.circle(screen, WHITE, (body_x + body_width + 4, arm_y - 4), 2)
-            pygame.draw.circle(screen, WHITE, (body_x - 4, arm_y - 2), 2)
+            pygame.draw.circle(surface, WHITE, (body_x + body_width + 4, arm_y - 4), 2)
+            pygame.draw.circle(surface, WHITE, (body_x - 4, arm_y - 2), 2)
         else:
-            pygame.draw.circle(screen, self.skin_color, (body_x - 4, arm_y - 4), 3)
-            pygame.draw.circle(screen, self.skin_color, (body_x + body_width + 4, arm_y - 2), 3)
+            pygame.draw.circle(surface, self.skin_color, (body_x - 4, arm_y - 4), 3)
+            pygame.draw.circle(surface, self.skin_color, (body_x + body_width + 4, arm_y - 2), 3)
             # Gloves
-            pygame.draw.circle(screen, WHITE, (body_x - 4, arm_y - 4), 2)
-            pygame.draw.circle(screen, WHITE, (body_x + body_width + 4, arm_y - 2), 2)
+            pygame.draw.circle(surface, WHITE, (body_x - 4, arm_y - 4), 2)
+            pygame.draw.circle(surface, WHITE, (body_x + body_width + 4, arm_y - 2), 2)
         
         # Draw legs bent (jumping pose)
         leg_width = 4
         leg_height = 6  # Shorter legs when jumping
-        pygame.draw.rect(screen, self.overalls_color, 
+        pygame.draw.rect(surface, self.overalls_color, 
                         (body_x + 3, body_y + body_height - 2, leg_width, leg_height))
-        pygame.draw.rect(screen, self.overalls_color, 
+        pygame.draw.rect(surface, self.overalls_color, 
                         (body_x + body_width - 7, body_y + body_height - 2, leg_width, leg_height))
         
         # Draw shoes (slightly angled for jumping)
         shoe_width = 8
         shoe_height = 4
-        pygame.draw.ellipse(screen, self.shoe_color, 
-                          (body_x + 1, self.y + self.height - shoe_height + 2, shoe_width, shoe_height))
-        pygame.draw.ellipse(screen, self.shoe_color, 
-                          (body_x + body_width - shoe_width - 1, self.y + self.height - shoe_height + 2, 
+        pygame.draw.ellipse(surface, self.shoe_color, 
+                          (body_x + 1, y + self.height - shoe_height + 2, shoe_width, shoe_height))
+        pygame.draw.ellipse(surface, self.shoe_color, 
+                          (body_x + body_width - shoe_width - 1, y + self.height - shoe_height + 2, 
                            shoe_width, shoe_height))
         
         # Draw overalls straps
-        pygame.draw.line(screen, self.overalls_color, 
+        pygame.draw.line(surface, self.overalls_color, 
                         (body_x + 6, body_y + 4), (body_x + 4, body_y + 12), 2)
-        pygame.draw.line(screen, self.overalls_color, 
+        pygame.draw.line(surface, self.overalls_color, 
                         (body_x + body_width - 6, body_y + 4), (body_x + body_width - 4, body_y + 12), 2)
         
         # Draw buttons on overalls
-        pygame.draw.circle(screen, YELLOW, (body_x + 6, body_y + 8), 1)
-        pygame.draw.circle(screen, YELLOW, (body_x + body_width - 6, body_y + 8), 1)
+        pygame.draw.circle(surface, YELLOW, (body_x + 6, body_y + 8), 1)
+        pygame.draw.circle(surface, YELLOW, (body_x + body_width - 6, body_y + 8), 1)
+
+class SpatialGrid:
+    """Uniform grid that buckets rects by the cells they overlap.
+    
+    Items that move can be re-bucketed with move(), which only touches the
+    cell lists when the item crosses into different cells.
+    """
+    def __init__(self, cell_size=GRID_CELL_SIZE):
+        self.cell_size = cell_size
+        self.cells = {}
+        self.items = []
+        self.rects = []
+        self.indices = {}
+    
+    def cell_bounds(self, rect):
+        """First and last cell (left, right, top, bottom) covered by a rect"""
+        return (rect.left // self.cell_size, (rect.right - 1) // self.cell_size, 
+                rect.top // self.cell_size, (rect.bottom - 1) // self.cell_size)
+    
+    def cell_range(self, rect):
+        """Cell coordinates covered by a rect"""
+        left, right, top, bottom = self.cell_bounds(rect)
+        for cell_x in range(left, right + 1):
+            for cell_y in range(top, bottom + 1):
+                yield (cell_x, cell_y)
+    
+    def insert(self, item, rect):
+        index = len(self.items)
+        self.items.append(item)
+        self.rects.append(rect)
+        self.indices[item] = index
+        for cell in self.cell_range(rect):
+            self.cells.setdefault(cell, []).append(index)
+    
+    def move(self, item, rect):
+        """Give an inserted item a new rect"""
+        index = self.indices[item]
+        old_rect = self.rects[index]
+        self.rects[index] = rect
+        if self.cell_bounds(rect) != self.cell_bounds(old_rect):
+            for cell in self.cell_range(old_rect):
+                self.cells[cell].remove(index)
+            for cell in self.cell_range(rect):
+                self.cells.setdefault(cell, []).append(index)
+    
+    def insert_point(self, item):
+        """Insert an item by its x and y, for near()"""
+        self.insert(item, pygame.Rect(item.x, item.y, 1, 1))
+    
+    def query(self, rect):
+        """Items sharing a cell with rect, in insertion order"""
+        return [self.items[index] for index in self.query_indices(rect)]
+    
+    def query_indices(self, rect):
+        indices = set()
+        for cell in self.cell_range(rect):
+            indices.update(self.cells.get(cell, ()))
+        return sorted(indices)
+    
+    def pairs(self, items):
+        """Pairs (a, b) of the given items whose rects overlap, a inserted before b, in insertion order"""
+        wanted = {self.indices[item] for item in items}
+        pairs = []
+        for index in sorted(wanted):
+            rect = self.rects[index]
+            for other in self.query_indices(rect):
+                if other > index and other in wanted and rect.colliderect(self.rects[other]):
+                    pairs.append((self.items[index], self.items[other]))
+        return pairs
+    
+    def sweep(self, start, end):
+        """Items hit by a rect moving from start to end along one axis, as (time, item) in order of impact.
+        
+        An item is hit if it overlaps end or if the moving rect's leading edge
+        crosses its near side on the way, so a fast rect can't skip over a thin
+        one. Time is the fraction of the move done when the leading edge
+        reaches the near side, negative for items start already overlapped.
+        Ties keep insertion order.
+        """
+        path = start.union(end)
+        hits = []
+        for index in self.query_indices(path):
+            rect = self.rects[index]
+            if end.x > start.x:
+                time = (rect.left - start.right) / (end.x - start.x)
+                crossed = start.right <= rect.left < end.right
+            elif end.x < start.x:
+                time = (start.left - rect.right) / (start.x - end.x)
+                crossed = end.left < rect.right <= start.left
+            elif end.y > start.y:
+                time = (rect.top - start.bottom) / (end.y - start.y)
+                crossed = start.bottom <= rect.top < end.bottom
+            elif end.y < start.y:
+                time = (start.top - rect.bottom) / (start.y - end.y)
+                crossed = end.top < rect.bottom <= start.top
+            else:
+                time, crossed = 0, False
+            if (crossed and path.colliderect(rect)) or end.colliderect(rect):
+                hits.append((time, index))
+        hits.sort()
+        return [(time, self.items[index]) for time, index in hits]
+    
+    def collides(self, rect):
+        """Whether rect overlaps any inserted rect"""
+        for cell in self.cell_range(rect):
+            for index in self.cells.get(cell, ()):
+                if rect.colliderect(self.rects[index]):
+                    return True
+        return False
+    
+    def near(self, x, y, distance):
+        """Whether an item is closer than distance to (x, y) along both axes"""
+        box = pygame.Rect(x - distance, y - distance, 2 * distance + 1, 2 * distance + 1)
+        return any(abs(item.x - x) < distance and abs(item.y - y) < distance for item in self.query(box))
 
 class Platform:
-    def __init__(self, x, y, width, height, color=BROWN):
+    platform_types = ['brick', 'stone', 'grass', 'metal']
+    # Shared LRU cache of rasterized textures keyed by (type, width, height)
+    texture_cache = OrderedDict()
+    
+    def __init__(self, x, y, width, height, color=BROWN, rng=random):
         self.x = x
         self.y = y
         self.width = width
         self.height = height
         self.color = color
-        self.platform_type = random.choice(['brick', 'stone', 'grass', 'metal'])
-        
-    def draw(self, screen):
-        if self.platform_type == 'brick':
-            self.draw_brick_platform(screen)
-        elif self.platform_type == 'stone':
-            self.draw_stone_platform(screen)
-        elif self.platform_type == 'grass':
-            self.draw_grass_platform(screen)
-        elif self.platform_type == 'metal':
-            self.draw_metal_platform(screen)
-    
-    def draw_brick_platform(self, screen):
+        self.platform_type = rng.choice(Platform.platform_types)
+        self.rect = pygame.Rect(x, y, width, height)
+        
+        # Rasterized texture, looked up on first draw
+        self.surface = None
+        self.surface_key = None
+    
+    def draw(self, screen, offset=(0, 0)):
+        screen.blit(self.get_surface(), (self.x + offset[0], self.y + offset[1] - PLATFORM_OVERHANG))
+    
+    def get_surface(self):
+        """Return the cached texture for this platform's (type, width, height)"""
+        key = (self.platform_type, int(self.width), int(self.height))
+        if self.surface_key != key:
+            cache = Platform.texture_cache
+            if key in cache:
+                cache.move_to_end(key)
+            else:
+                cache[key] = self.render_texture(key)
+                if len(cache) > PLATFORM_TEXTURE_CACHE_SIZE:
+                    cache.popitem(last=False)
+            self.surface = cache[key]
+            self.surface_key = key
+        return self.surface
+    
+    def render_texture(self, key):
+        """Rasterize the platform once into a surface"""
+        platform_type, width, height = key
+        surface = pygame.Surface((width, PLATFORM_OVERHANG + height + PLATFORM_UNDERHANG))
+        surface.fill(BACKGROUND_COLORKEY)
+        
+        # Texture details are seeded by the key so identical platforms look the same
+        texture_rng = random.Random(f"{platform_type}-{width}-{height}")
+        
+        if platform_type == 'brick':
+            self.draw_brick_platform(surface, 0, PLATFORM_OVERHANG)
+        elif platform_type == 'stone':
+            self.draw_stone_platform(surface, 0, PLATFORM_OVERHANG, texture_rng)
+        elif platform_type == 'grass':
+            self.draw_grass_platform(surface, 0, PLATFORM_OVERHANG, texture_rng)
+        elif platform_type == 'metal':
+            self.draw_metal_platform(surface, 0, PLATFORM_OVERHANG)
+        
+        surface = display_format(surface, alpha=False)
+        surface.set_colorkey(BACKGROUND_COLORKEY, pygame.RLEACCEL)
+        return surface
+    
+    def draw_brick_platform(self, surface, x, y):
         # Base brick color with gradient
         brick_colors = [
             (139, 69, 19),   # Dark brown
@@ -572,7 +884,7 @@ class Platform:
         for i in range(self.height):
             color_index = min(i // (self.height // 4 + 1), len(brick_colors) - 1)
             color = brick_colors[color_index]
-            pygame.draw.rect(screen, color, (self.x, self.y + i, self.width, 1))
+            pygame.draw.rect(surface, color, (x, y + i, self.width, 1))
         
         # Draw individual bricks
         brick_width = 32
@@ -582,26 +894,26 @@ class Platform:
             for col in range(0, self.width, brick_width):
                 # Offset every other row for realistic brick pattern
                 offset = (brick_width // 2) if (row // brick_height) % 2 == 1 else 0
-                brick_x = self.x + col + offset
-                brick_y = self.y + row
+                brick_x = x + col + offset
+                brick_y = y + row
                 
                 # Don't draw partial bricks outside platform
-                if brick_x + brick_width > self.x + self.width:
+                if brick_x + brick_width > x + self.width:
                     continue
                     
                 # Draw brick outline
-                pygame.draw.rect(screen, (101, 67, 33), 
+                pygame.draw.rect(surface, (101, 67, 33), 
                                (brick_x, brick_y, brick_width, brick_height), 2)
                 
                 # Add highlight on top and left
-                pygame.draw.line(screen, (255, 228, 196), 
+                pygame.draw.line(surface, (255, 228, 196), 
                                (brick_x + 1, brick_y + 1), 
                                (brick_x + brick_width - 2, brick_y + 1), 1)
-                pygame.draw.line(screen, (255, 228, 196), 
+                pygame.draw.line(surface, (255, 228, 196), 
                                (brick_x + 1, brick_y + 1), 
                                (brick_x + 1, brick_y + brick_height - 2), 1)
     
-    def draw_stone_platform(self, screen):
+    def draw_stone_platform(self, surface, x, y, texture_rng):
         # Stone gray gradient
         stone_colors = [
             (105, 105, 105),  # Dim gray
@@ -614,75 +926,75 @@ class Platform:
         for i in range(self.height):
             color_index = min(i // (self.height // 4 + 1), len(stone_colors) - 1)
             color = stone_colors[color_index]
-            pygame.draw.rect(screen, color, (self.x, self.y + i, self.width, 1))
+            pygame.draw.rect(surface, color, (x, y + i, self.width, 1))
         
         # Draw stone blocks
         block_size = 24
         for row in range(0, self.height, block_size):
             for col in range(0, self.width, block_size):
-                block_x = self.x + col
-                block_y = self.y + row
+                block_x = x + col
+                block_y = y + row
                 
-                if block_x + block_size > self.x + self.width:
+                if block_x + block_size > x + self.width:
                     continue
                 
                 # Draw block with 3D effect
-                pygame.draw.rect(screen, (169, 169, 169), 
+                pygame.draw.rect(surface, (169, 169, 169), 
                                (block_x, block_y, block_size, block_size))
-                pygame.draw.rect(screen, (105, 105, 105), 
+                pygame.draw.rect(surface, (105, 105, 105), 
                                (block_x, block_y, block_size, block_size), 2)
                 
                 # Highlight
-                pygame.draw.line(screen, (211, 211, 211), 
+                pygame.draw.line(surface, (211, 211, 211), 
                                (block_x + 1, block_y + 1), 
                                (block_x + block_size - 2, block_y + 1), 1)
-                pygame.draw.line(screen, (211, 211, 211), 
+                pygame.draw.line(surface, (211, 211, 211), 
                                (block_x + 1, block_y + 1), 
                                (block_x + 1, block_y + block_size - 2), 1)
                 
                 # Add some texture dots
                 for _ in range(3):
-                    dot_x = block_x + random.randint(3, block_size - 3)
-                    dot_y = block_y + random.randint(3, block_size - 3)
-                    pygame.draw.circle(screen, (128, 128, 128), (dot_x, dot_y), 1)
+                    dot_x = block_x + texture_rng.randint(3, block_size - 3)
+                    dot_y = block_y + texture_rng.randint(3, block_size - 3)
+                    pygame.draw.circle(surface, (128, 128, 128), (dot_x, dot_y), 1)
     
-    def draw_grass_platform(self, screen):
+    def draw_grass_platform(self, surface, x, y, texture_rng):
         # Draw dirt base
         dirt_color = (101, 67, 33)
-        pygame.draw.rect(screen, dirt_color, (self.x, self.y + 4, self.width, self.height - 4))
+        pygame.draw.rect(surface, dirt_color, (x, y + 4, self.width, self.height - 4))
         
         # Draw grass top
         grass_color = (34, 139, 34)
-        pygame.draw.rect(screen, grass_color, (self.x, self.y, self.width, 8))
+        pygame.draw.rect(surface, grass_color, (x, y, self.width, 8))
         
         # Add grass blades
         for i in range(0, self.width, 4):
-            grass_x = self.x + i + random.randint(-1, 1)
-            grass_height = random.randint(3, 6)
+            grass_x = x + i + texture_rng.randint(-1, 1)
+            grass_height = texture_rng.randint(3, 6)
             
             # Draw grass blade
-            pygame.draw.line(screen, (0, 128, 0), 
-                           (grass_x, self.y), 
-                           (grass_x, self.y - grass_height), 2)
+            pygame.draw.line(surface, (0, 128, 0), 
+                           (grass_x, y), 
+                           (grass_x, y - grass_height), 2)
             
             # Add lighter green highlight
-            pygame.draw.line(screen, (50, 205, 50), 
-                           (grass_x - 1, self.y), 
-                           (grass_x - 1, self.y - grass_height + 1), 1)
+            pygame.draw.line(surface, (50, 205, 50), 
+                           (grass_x - 1, y), 
+                           (grass_x - 1, y - grass_height + 1), 1)
         
         # Add some flowers
         if self.width > 60:
             for _ in range(self.width // 80):
-                flower_x = self.x + random.randint(10, self.width - 10)
-                flower_y = self.y - 2
+                flower_x = x + texture_rng.randint(10, self.width - 10)
+                flower_y = y - 2
                 
                 # Draw flower
                 flower_colors = [(255, 192, 203), (255, 255, 0), (255, 165, 0)]
-                flower_color = random.choice(flower_colors)
-                pygame.draw.circle(screen, flower_color, (flower_x, flower_y), 2)
-                pygame.draw.circle(screen, (255, 255, 255), (flower_x, flower_y), 1)
+                flower_color = texture_rng.choice(flower_colors)
+                pygame.draw.circle(surface, flower_color, (flower_x, flower_y), 2)
+                pygame.draw.circle(surface, (255, 255, 255), (flower_x, flower_y), 1)
     
-    def draw_metal_platform(self, screen):
+    def draw_metal_platform(self, surface, x, y):
         # Metal gradient
         metal_colors = [
             (169, 169, 169),  # Dark gray
@@ -695,51 +1007,61 @@ class Platform:
         for i in range(self.height):
             color_index = min(i // (self.height // 4 + 1), len(metal_colors) - 1)
             color = metal_colors[color_index]
-            pygame.draw.rect(screen, color, (self.x, self.y + i, self.width, 1))
+            pygame.draw.rect(surface, color, (x, y + i, self.width, 1))
         
         # Draw metal panels
         panel_width = 40
         for col in range(0, self.width, panel_width):
-            panel_x = self.x + col
+            panel_x = x + col
             
-            if panel_x + panel_width > self.x + self.width:
+            if panel_x + panel_width > x + self.width:
                 continue
             
             # Draw panel outline
-            pygame.draw.rect(screen, (105, 105, 105), 
-                           (panel_x, self.y, panel_width, self.height), 2)
+            pygame.draw.rect(surface, (105, 105, 105), 
+                           (panel_x, y, panel_width, self.height), 2)
             
             # Add rivets
             rivet_positions = [
-                (panel_x + 5, self.y + 5),
-                (panel_x + panel_width - 5, self.y + 5),
-                (panel_x + 5, self.y + self.height - 5),
-                (panel_x + panel_width - 5, self.y + self.height - 5)
+                (panel_x + 5, y + 5),
+                (panel_x + panel_width - 5, y + 5),
+                (panel_x + 5, y + self.height - 5),
+                (panel_x + panel_width - 5, y + self.height - 5)
             ]
             
             for rivet_x, rivet_y in rivet_positions:
-                if rivet_y >= self.y and rivet_y <= self.y + self.height:
-                    pygame.draw.circle(screen, (105, 105, 105), (rivet_x, rivet_y), 2)
-                    pygame.draw.circle(screen, (169, 169, 169), (rivet_x, rivet_y), 1)
+                if rivet_y >= y and rivet_y <= y + self.height:
+                    pygame.draw.circle(surface, (105, 105, 105), (rivet_x, rivet_y), 2)
+                    pygame.draw.circle(surface, (169, 169, 169), (rivet_x, rivet_y), 1)
         
         # Add metallic shine effect
-        shine_y = self.y + self.height // 3
-        pygame.draw.line(screen, (255, 255, 255), 
-                        (self.x, shine_y), 
-                        (self.x + self.width, shine_y), 1)
+        shine_y = y + self.height // 3
+        pygame.draw.line(surface, (255, 255, 255), 
+                        (x, shine_y), 
+                        (x + self.width, shine_y), 1)
 
 class Enemy:
-    def __init__(self, x, y):
+    enemy_types = ['goomba', 'koopa', 'spiky', 'ghost']
+    # Animation frames per enemy type, shared by all enemies
+    frame_cache = {}
+    
+    def __init__(self, x, y, enemy_type=None, rng=random):
         self.x = x
         self.y = y
+        # Position after the previous update, for render interpolation
+        self.prev_x = x
+        self.prev_y = y
         self.width = 24
         self.height = 24
+        # Horizontal range the enemy turns around at (its chunk in an endless world)
+        self.min_x = 0
+        self.max_x = SCREEN_WIDTH
         self.vel_x = -2
         self.vel_y = 0
         self.alive = True
         self.animation_frame = 0
         self.animation_speed = 0.2
-        self.enemy_type = random.choice(['goomba', 'koopa', 'spiky', 'ghost'])
+        self.enemy_type = enemy_type or rng.choice(Enemy.enemy_types)
         self.on_ground = False  # Add ground tracking for enemies
         
         # Set properties based on enemy type
@@ -747,27 +1069,30 @@ class Enemy:
             self.color = (139, 69, 19)  # Brown
             self.width = 24
             self.height = 24
-            self.vel_x = random.choice([-1.5, 1.5])
+            self.vel_x = rng.choice([-1.5, 1.5])
         elif self.enemy_type == 'koopa':
             self.color = (0, 128, 0)  # Green
             self.width = 26
             self.height = 28
-            self.vel_x = random.choice([-2, 2])
+            self.vel_x = rng.choice([-2, 2])
         elif self.enemy_type == 'spiky':
             self.color = (128, 0, 128)  # Purple
             self.width = 22
             self.height = 22
-            self.vel_x = random.choice([-1, 1])
+            self.vel_x = rng.choice([-1, 1])
         elif self.enemy_type == 'ghost':
             self.color = (240, 248, 255)  # Ghost white
             self.width = 26
             self.height = 26
-            self.vel_x = random.choice([-0.8, 0.8])
+            self.vel_x = rng.choice([-0.8, 0.8])
             self.float_offset = 0
         
-    def update(self, platforms):
+    def update(self, platform_grid):
         if not self.alive:
             return
+        
+        self.prev_x = self.x
+        self.prev_y = self.y
             
         # Update animation
         self.animation_frame += self.animation_speed
@@ -778,7 +1103,7 @@ class Enemy:
             self.x += self.vel_x
             
             # Reverse direction at screen edges
-            if self.x <= 0 or self.x >= SCREEN_WIDTH - self.width:
+            if self.x <= self.min_x or self.x >= self.max_x - self.width:
                 self.vel_x *= -1
             
             # Optional: Add slight vertical floating motion (much smaller)
@@ -794,45 +1119,43 @@ class Enemy:
             self.vel_y += GRAVITY
             
             # Update horizontal position first
+            start_rect = pygame.Rect(old_x, old_y, self.width, self.height)
             self.x += self.vel_x
             
-            # Check horizontal collisions with platforms
+            # Check horizontal collisions with platforms along the whole move
             enemy_rect = pygame.Rect(self.x, self.y, self.width, self.height)
-            for platform in platforms:
-                platform_rect = pygame.Rect(platform.x, platform.y, platform.width, platform.height)
-                
-                if enemy_rect.colliderect(platform_rect):
-                    # Horizontal collision - reverse direction
-                    if self.vel_x > 0:  # Moving right
-                        self.x = platform.x - self.width
-                    elif self.vel_x < 0:  # Moving left
-                        self.x = platform.x + platform.width
-                    self.vel_x *= -1
-                    break
+            hits = platform_grid.sweep(start_rect, enemy_rect)
+            if hits:
+                # Horizontal collision - reverse direction before the first platform hit
+                platform = hits[0][1]
+                if self.vel_x > 0:  # Moving right
+                    self.x = platform.x - self.width
+                elif self.vel_x < 0:  # Moving left
+                    self.x = platform.x + platform.width
+                self.vel_x *= -1
             
             # Update vertical position
+            start_rect = pygame.Rect(self.x, old_y, self.width, self.height)
             self.y += self.vel_y
             
-            # Check vertical collisions with platforms
+            # Check vertical collisions with platforms in order of impact
             self.on_ground = False
             enemy_rect = pygame.Rect(self.x, self.y, self.width, self.height)
             
-            for platform in platforms:
-                platform_rect = pygame.Rect(platform.x, platform.y, platform.width, platform.height)
-                
-                if enemy_rect.colliderect(platform_rect):
-                    if self.vel_y > 0:  # Falling down
-                        # Only land if enemy was above platform
-                        if old_y + self.height <= platform.y + 5:
-                            self.y = platform.y - self.height
-                            self.vel_y = 0
-                            self.on_ground = True
-                    elif self.vel_y < 0:  # Moving up
-                        # Hit platform from below
-                        if old_y >= platform.y + platform.height - 5:
-                            self.y = platform.y + platform.height
-                            self.vel_y = 0
-                    break
+            for _, platform in platform_grid.sweep(start_rect, enemy_rect):
+                if self.vel_y > 0:  # Falling down
+                    # Only land if enemy was above platform
+                    if old_y + self.height <= platform.y + 5:
+                        self.y = platform.y - self.height
+                        self.vel_y = 0
+                        self.on_ground = True
+                        break
+                elif self.vel_y < 0:  # Moving up
+                    # Hit platform from below
+                    if old_y >= platform.y + platform.height - 5:
+                        self.y = platform.y + platform.height
+                        self.vel_y = 0
+                        break
                         
             # Ground collision
             if self.y > SCREEN_HEIGHT - self.height:
@@ -842,14 +1165,14 @@ class Enemy:
         
         # Reverse direction at screen edges (for non-ghosts, this is handled above for ghosts)
         if self.enemy_type != 'ghost':
-            if self.x <= 0 or self.x >= SCREEN_WIDTH - self.width:
+            if self.x <= self.min_x or self.x >= self.max_x - self.width:
                 self.vel_x *= -1
                 
             # Platform edge detection for non-ghost enemies (improved)
             if self.on_ground:
-                self.check_platform_edges(platforms)
+                self.check_platform_edges(platform_grid)
     
-    def check_platform_edges(self, platforms):
+    def check_platform_edges(self, platform_grid):
         """Make enemies turn around at platform edges - improved version"""
         # Check if enemy is about to walk off a platform
         look_ahead_distance = 10
@@ -859,9 +1182,8 @@ class Enemy:
         foot_rect = pygame.Rect(look_ahead_x, self.y + self.height, 5, 10)
         
         on_platform = False
-        for platform in platforms:
-            platform_rect = pygame.Rect(platform.x, platform.y, platform.width, platform.height)
-            if foot_rect.colliderect(platform_rect):
+        for platform in platform_grid.query(foot_rect):
+            if foot_rect.colliderect(platform.rect):
                 on_platform = True
                 break
         
@@ -869,132 +1191,160 @@ class Enemy:
         if not on_platform and self.on_ground:
             self.vel_x *= -1
     
-    def draw(self, screen):
+    def draw(self, screen, alpha=1.0, offset=(0, 0)):
         if not self.alive:
             return
             
-        if self.enemy_type == 'goomba':
-            self.draw_goomba(screen)
-        elif self.enemy_type == 'koopa':
-            self.draw_koopa(screen)
-        elif self.enemy_type == 'spiky':
-            self.draw_spiky(screen)
-        elif self.enemy_type == 'ghost':
-            self.draw_ghost(screen)
+        frames = self.get_frames()
+        period = ENEMY_ANIMATION_PERIODS[self.enemy_type]
+        frame_index = int(self.animation_frame / period * ENEMY_ANIMATION_FRAMES) % ENEMY_ANIMATION_FRAMES
+    
+        # Blend the last two updates; alpha is how far we are into the next one
+        x = self.prev_x + (self.x - self.prev_x) * alpha + offset[0]
+        y = self.prev_y + (self.y - self.prev_y) * alpha + offset[1]
+        if self.enemy_type == 'ghost':
+            # Much more subtle floating animation - just for visual effect
+            y += math.sin(self.float_offset) * 1  # Reduced from 2 to 1
+        
+        return screen.blit(frames[frame_index], 
+                           (int(x) - ENEMY_SPRITE_PADDING, round(y) - ENEMY_SPRITE_PADDING))
+    
+    def get_frames(self):
+        """Return the animation frames for this enemy type, rendering them once per process"""
+        if self.enemy_type not in Enemy.frame_cache:
+            frames = []
+            for i in range(ENEMY_ANIMATION_FRAMES):
+                animation_frame = i * ENEMY_ANIMATION_PERIODS[self.enemy_type] / ENEMY_ANIMATION_FRAMES
+                frame = pygame.Surface((self.width + ENEMY_SPRITE_PADDING * 2, 
+                                        self.height + ENEMY_SPRITE_PADDING * 2), pygame.SRCALPHA)
+                x = y = ENEMY_SPRITE_PADDING
+                
+                if self.enemy_type == 'goomba':
+                    self.draw_goomba(frame, x, y, animation_frame)
+                elif self.enemy_type == 'koopa':
+                    self.draw_koopa(frame, x, y, animation_frame)
+                elif self.enemy_type == 'spiky':
+                    self.draw_spiky(frame, x, y, animation_frame)
+                elif self.enemy_type == 'ghost':
+                    self.draw_ghost(frame, x, y, animation_frame)
+                
+                frames.append(display_format(frame))
+            Enemy.frame_cache[self.enemy_type] = frames
+        return Enemy.frame_cache[self.enemy_type]
     
-    def draw_goomba(self, screen):
+    def draw_goomba(self, surface, x, y, animation_frame):
         # Goomba body (mushroom-like)
         body_color = (139, 69, 19)
         dark_brown = (101, 67, 33)
         light_brown = (160, 82, 45)
         
         # Main body
-        pygame.draw.ellipse(screen, body_color, 
-                          (self.x, self.y + 8, self.width, self.height - 8))
+        pygame.draw.ellipse(surface, body_color, 
+                          (x, y + 8, self.width, self.height - 8))
         
         # Head/cap
-        pygame.draw.ellipse(screen, dark_brown, 
-                          (self.x + 2, self.y, self.width - 4, 16))
+        pygame.draw.ellipse(surface, dark_brown, 
+                          (x + 2, y, self.width - 4, 16))
         
         # Cap spots
-        spot_positions = [(self.x + 6, self.y + 3), (self.x + 16, self.y + 5)]
+        spot_positions = [(x + 6, y + 3), (x + 16, y + 5)]
         for spot_x, spot_y in spot_positions:
-            pygame.draw.circle(screen, light_brown, (spot_x, spot_y), 2)
+            pygame.draw.circle(surface, light_brown, (spot_x, spot_y), 2)
         
         # Eyes
-        eye_y = self.y + 10
+        eye_y = y + 10
         # Angry eyebrows
-        pygame.draw.line(screen, BLACK, (self.x + 6, eye_y - 2), (self.x + 10, eye_y), 2)
-        pygame.draw.line(screen, BLACK, (self.x + 14, eye_y), (self.x + 18, eye_y - 2), 2)
+        pygame.draw.line(surface, BLACK, (x + 6, eye_y - 2), (x + 10, eye_y), 2)
+        pygame.draw.line(surface, BLACK, (x + 14, eye_y), (x + 18, eye_y - 2), 2)
         
         # Eyes
-        pygame.draw.circle(screen, WHITE, (int(self.x + 8), eye_y), 3)
-        pygame.draw.circle(screen, WHITE, (int(self.x + 16), eye_y), 3)
-        pygame.draw.circle(screen, BLACK, (int(self.x + 8), eye_y), 2)
-        pygame.draw.circle(screen, BLACK, (int(self.x + 16), eye_y), 2)
+        pygame.draw.circle(surface, WHITE, (int(x + 8), eye_y), 3)
+        pygame.draw.circle(surface, WHITE, (int(x + 16), eye_y), 3)
+        pygame.draw.circle(surface, BLACK, (int(x + 8), eye_y), 2)
+        pygame.draw.circle(surface, BLACK, (int(x + 16), eye_y), 2)
         
         # Feet (animated)
-        foot_offset = int(math.sin(self.animation_frame * 3) * 2)
-        pygame.draw.ellipse(screen, dark_brown, 
-                          (self.x + 2 + foot_offset, self.y + self.height - 4, 6, 4))
-        pygame.draw.ellipse(screen, dark_brown, 
-                          (self.x + self.width - 8 - foot_offset, self.y + self.height - 4, 6, 4))
+        foot_offset = int(math.sin(animation_frame * 3) * 2)
+        pygame.draw.ellipse(surface, dark_brown, 
+                          (x + 2 + foot_offset, y + self.height - 4, 6, 4))
+        pygame.draw.ellipse(surface, dark_brown, 
+                          (x + self.width - 8 - foot_offset, y + self.height - 4, 6, 4))
     
-    def draw_koopa(self, screen):
+    def draw_koopa(self, surface, x, y, animation_frame):
         # Koopa shell
         shell_color = (0, 128, 0)
         shell_dark = (0, 100, 0)
         shell_light = (50, 178, 50)
         
         # Shell body
-        pygame.draw.ellipse(screen, shell_color, 
-                          (self.x, self.y + 6, self.width, self.height - 10))
+        pygame.draw.ellipse(surface, shell_color, 
+                          (x, y + 6, self.width, self.height - 10))
         
         # Shell pattern
-        pygame.draw.ellipse(screen, shell_dark, 
-                          (self.x + 2, self.y + 8, self.width - 4, self.height - 14), 2)
+        pygame.draw.ellipse(surface, shell_dark, 
+                          (x + 2, y + 8, self.width - 4, self.height - 14), 2)
         
         # Shell segments
         for i in range(3):
-            segment_y = self.y + 10 + i * 4
-            pygame.draw.line(screen, shell_dark, 
-                           (self.x + 4, segment_y), (self.x + self.width - 4, segment_y), 1)
+            segment_y = y + 10 + i * 4
+            pygame.draw.line(surface, shell_dark, 
+                           (x + 4, segment_y), (x + self.width - 4, segment_y), 1)
         
         # Head
         head_color = (255, 255, 0)  # Yellow
-        pygame.draw.circle(screen, head_color, 
-                         (int(self.x + self.width // 2), int(self.y + 8)), 6)
+        pygame.draw.circle(surface, head_color, 
+                         (int(x + self.width // 2), int(y + 8)), 6)
         
         # Eyes
-        eye_x = self.x + self.width // 2
-        pygame.draw.circle(screen, WHITE, (int(eye_x - 3), int(self.y + 6)), 2)
-        pygame.draw.circle(screen, WHITE, (int(eye_x + 3), int(self.y + 6)), 2)
-        pygame.draw.circle(screen, BLACK, (int(eye_x - 3), int(self.y + 6)), 1)
-        pygame.draw.circle(screen, BLACK, (int(eye_x + 3), int(self.y + 6)), 1)
+        eye_x = x + self.width // 2
+        pygame.draw.circle(surface, WHITE, (int(eye_x - 3), int(y + 6)), 2)
+        pygame.draw.circle(surface, WHITE, (int(eye_x + 3), int(y + 6)), 2)
+        pygame.draw.circle(surface, BLACK, (int(eye_x - 3), int(y + 6)), 1)
+        pygame.draw.circle(surface, BLACK, (int(eye_x + 3), int(y + 6)), 1)
         
         # Feet
-        foot_offset = int(math.sin(self.animation_frame * 2) * 1)
-        pygame.draw.ellipse(screen, (255, 200, 0), 
-                          (self.x + 3 + foot_offset, self.y + self.height - 6, 5, 6))
-        pygame.draw.ellipse(screen, (255, 200, 0), 
-                          (self.x + self.width - 8 - foot_offset, self.y + self.height - 6, 5, 6))
+        foot_offset = int(math.sin(animation_frame * 2) * 1)
+        pygame.draw.ellipse(surface, (255, 200, 0), 
+                          (x + 3 + foot_offset, y + self.height - 6, 5, 6))
+        pygame.draw.ellipse(surface, (255, 200, 0), 
+                          (x + self.width - 8 - foot_offset, y + self.height - 6, 5, 6))
     
-    def draw_spiky(self, screen):
+    def draw_spiky(self, surface, x, y, animation_frame):
         # Spiky enemy body
         body_color = (128, 0, 128)  # Purple
         dark_purple = (100, 0, 100)
         
         # Main body
-        pygame.draw.circle(screen, body_color, 
-                         (int(self.x + self.width // 2), int(self.y + self.height // 2)), 
+        pygame.draw.circle(surface, body_color, 
+                         (int(x + self.width // 2), int(y + self.height // 2)), 
                          self.width // 2)
         
         # Spikes around the body
-        center_x = self.x + self.width // 2
-        center_y = self.y + self.height // 2
+        center_x = x + self.width // 2
+        center_y = y + self.height // 2
         radius = self.width // 2
         
         for angle in range(0, 360, 45):
-            spike_angle = math.radians(angle + self.animation_frame * 20)
+            spike_angle = math.radians(angle + animation_frame * 20)
             spike_x = center_x + math.cos(spike_angle) * radius
             spike_y = center_y + math.sin(spike_angle) * radius
             spike_end_x = center_x + math.cos(spike_angle) * (radius + 6)
             spike_end_y = center_y + math.sin(spike_angle) * (radius + 6)
             
-            pygame.draw.line(screen, dark_purple, 
+            pygame.draw.line(surface, dark_purple, 
                            (spike_x, spike_y), (spike_end_x, spike_end_y), 3)
         
         # Eyes
-        pygame.draw.circle(screen, RED, (int(center_x - 4), int(center_y - 2)), 3)
-        pygame.draw.circle(screen, RED, (int(center_x + 4), int(center_y - 2)), 3)
-        pygame.draw.circle(screen, BLACK, (int(center_x - 4), int(center_y - 2)), 2)
-        pygame.draw.circle(screen, BLACK, (int(center_x + 4), int(center_y - 2)), 2)
+        pygame.draw.circle(surface, RED, (int(center_x - 4), int(center_y - 2)), 3)
+        pygame.draw.circle(surface, RED, (int(center_x + 4), int(center_y - 2)), 3)
+        pygame.draw.circle(surface, BLACK, (int(center_x - 4), int(center_y - 2)), 2)
+        pygame.draw.circle(surface, BLACK, (int(center_x + 4), int(center_y - 2)), 2)
         
         # Angry mouth
-        pygame.draw.arc(screen, BLACK, 
+        pygame.draw.arc(surface, BLACK, 
                        (center_x - 6, center_y + 2, 12, 8), 0, math.pi, 2)
     
-    def draw_ghost(self, screen):
+    def draw_ghost(self, surface, x, y, animation_frame):
         # Ghost body with transparency effect
         ghost_colors = [
             (240, 248, 255),  # Ghost white
@@ -1002,18 +1352,18 @@ class Enemy:
             (200, 208, 215)   # Even darker
         ]
         
-        # Much more subtle floating animation - just for visual effect
-        float_y = self.y + math.sin(self.float_offset) * 1  # Reduced from 2 to 1
+        # Floating offset is applied when the frame is blitted
+        float_y = y
         
         # Ghost body (wavy bottom)
         body_points = []
         for i in range(self.width + 1):
-            wave_y = float_y + self.height - 6 + math.sin((i + self.animation_frame * 10) * 0.5) * 3
-            body_points.append((self.x + i, wave_y))
+            wave_y = float_y + self.height - 6 + math.sin((i + animation_frame * 10) * 0.5) * 3
+            body_points.append((x + i, wave_y))
         
         # Add top of ghost
         for i in range(self.width, -1, -1):
-            body_points.append((self.x + i, float_y + 6))
+            body_points.append((x + i, float_y + 6))
         
         # Draw ghost body with gradient effect
         for i, color in enumerate(ghost_colors):
@@ -1021,35 +1371,38 @@ class Enemy:
             if len(body_points) > 4:
                 adjusted_points = [(x + offset, y + offset) for x, y in body_points]
                 if len(adjusted_points) >= 3:
-                    pygame.draw.polygon(screen, color, adjusted_points)
+                    pygame.draw.polygon(surface, color, adjusted_points)
         
         # Ghost head
-        pygame.draw.circle(screen, ghost_colors[0], 
-                         (int(self.x + self.width // 2), int(float_y + 8)), 10)
+        pygame.draw.circle(surface, ghost_colors[0], 
+                         (int(x + self.width // 2), int(float_y + 8)), 10)
         
         # Eyes (spooky)
         eye_color = (0, 0, 139)  # Dark blue
-        pygame.draw.circle(screen, eye_color, 
-                         (int(self.x + self.width // 2 - 4), int(float_y + 6)), 3)
-        pygame.draw.circle(screen, eye_color, 
-                         (int(self.x + self.width // 2 + 4), int(float_y + 6)), 3)
+        pygame.draw.circle(surface, eye_color, 
+                         (int(x + self.width // 2 - 4), int(float_y + 6)), 3)
+        pygame.draw.circle(surface, eye_color, 
+                         (int(x + self.width // 2 + 4), int(float_y + 6)), 3)
         
         # Glowing effect
-        glow_radius = int(12 + math.sin(self.animation_frame * 2) * 2)
+        glow_radius = int(12 + math.sin(animation_frame * 2) * 2)
         glow_color = (240, 248, 255, 50)  # Semi-transparent white
         
         # Mouth (wavy)
         mouth_y = float_y + 12
         mouth_points = []
         for i in range(-4, 5):
-            mouth_x = self.x + self.width // 2 + i
-            mouth_wave = mouth_y + math.sin(i * 0.8 + self.animation_frame * 3) * 1
+            mouth_x = x + self.width // 2 + i
+            mouth_wave = mouth_y + math.sin(i * 0.8 + animation_frame * 3) * 1
             mouth_points.append((mouth_x, mouth_wave))
         
         if len(mouth_points) >= 2:
-            pygame.draw.lines(screen, BLACK, False, mouth_points, 2)
+            pygame.draw.lines(surface, BLACK, False, mouth_points, 2)
 
 class Coin:
+    # Rotation frames shared by all coins
+    frame_table = None
+    
     def __init__(self, x, y):
         self.x = x
         self.y = y
@@ -1061,42 +1414,170 @@ class Coin:
     def update(self):
         self.rotation += 5
         
-    def draw(self, screen):
+    def draw(self, screen, offset=(0, 0)):
         if not self.collected:
             # Animate coin rotation
-            scale = abs(math.cos(math.radians(self.rotation)))
-            width = int(self.width * scale)
-            if width > 2:
-                coin_rect = pygame.Rect(self.x + (self.width - width) // 2, self.y, width, self.height)
-                pygame.draw.ellipse(screen, YELLOW, coin_rect)
-                pygame.draw.ellipse(screen, BLACK, coin_rect, 2)
+            frame = self.get_frames()[int(self.rotation // COIN_ROTATION_STEP) % COIN_ROTATION_FRAMES]
+            if frame is not None:
+                return screen.blit(frame, (int(self.x + offset[0]), int(self.y + offset[1])))
+    
+    def get_frames(self):
+        """Return the shared rotation frame table, rendering it on first use"""
+        if Coin.frame_table is None:
+            frames = []
+            for i in range(COIN_ROTATION_FRAMES):
+                scale = abs(math.cos(math.radians(i * COIN_ROTATION_STEP)))
+                width = int(self.width * scale)
+                if width > 2:
+                    frame = pygame.Surface((self.width, self.height), pygame.SRCALPHA)
+                    coin_rect = pygame.Rect((self.width - width) // 2, 0, width, self.height)
+                    pygame.draw.ellipse(frame, YELLOW, coin_rect)
+                    pygame.draw.ellipse(frame, BLACK, coin_rect, 2)
+                    frames.append(display_format(frame))
+                else:
+                    # Coin is edge-on, nothing to draw
+                    frames.append(None)
+            Coin.frame_table = frames
+        return Coin.frame_table
 
-class Particle:
-    def __init__(self, x, y, color, vel_x=0, vel_y=0, life=60):
-        self.x = x
-        self.y = y
-        self.color = color
-        self.vel_x = vel_x + random.uniform(-2, 2)
-        self.vel_y = vel_y + random.uniform(-3, -1)
-        self.life = life
-        self.max_life = life
-        self.size = random.randint(2, 4)
+class ParticleSystem:
+    """Fixed-capacity particle pool stored as one NumPy array per attribute.
+    
+    Particles live in a ring buffer: new ones are written after the newest
+    slot and expired ones are retired from the oldest end, so nothing is
+    allocated per particle or per frame.
+    """
+    def __init__(self, capacity=PARTICLE_CAPACITY, seed=None):
+        self.capacity = capacity
+        self.x = np.zeros(capacity, dtype=np.float32)
+        self.y = np.zeros(capacity, dtype=np.float32)
+        self.vel_x = np.zeros(capacity, dtype=np.float32)
+        self.vel_y = np.zeros(capacity, dtype=np.float32)
+        self.life = np.zeros(capacity, dtype=np.float32)
+        self.max_life = np.ones(capacity, dtype=np.float32)
+        self.size = np.zeros(capacity, dtype=np.float32)
+        self.color = np.zeros(capacity, dtype=np.int32)
+        
+        # Scratch buffers reused by update and draw
+        self.alive = np.zeros(capacity, dtype=bool)
+        self.scale = np.zeros(capacity, dtype=np.float32)
+        self.draw_size = np.zeros(capacity, dtype=np.int32)
+        
+        # Ring buffer bounds: oldest live slot and number of slots in use
+        self.head = 0
+        self.count = 0
+        
+        # Palette of particle colors and circle sprites keyed by (color index, size)
+        self.colors = []
+        self.color_ids = {}
+        self.sprites = {}
+        self.rng = np.random.default_rng(seed)
+    
+    def __len__(self):
+        return self.count
+    
+    def clear(self):
+        self.head = 0
+        self.count = 0
+    
+    def emit(self, x, y, color, count=PARTICLE_COUNT, vel_x=0, vel_y=0, life=60):
+        """Spawn a burst of particles, overwriting the oldest ones when full"""
+        count = min(count, self.capacity)
+        if count <= 0:
+            return
+        
+        overflow = self.count + count - self.capacity
+        if overflow > 0:
+            self.head = (self.head + overflow) % self.capacity
+            self.count -= overflow
+        
+        if color not in self.color_ids:
+            self.color_ids[color] = len(self.colors)
+            self.colors.append(color)
+        
+        slots = (self.head + self.count + np.arange(count)) % self.capacity
+        self.x[slots] = x
+        self.y[slots] = y
+        self.vel_x[slots] = vel_x + self.rng.uniform(-2, 2, count)
+        self.vel_y[slots] = vel_y + self.rng.uniform(-3, -1, count)
+        self.life[slots] = life
+        self.max_life[slots] = life
+        self.size[slots] = self.rng.integers(2, 5, count)
+        self.color[slots] = self.color_ids[color]
+        self.count += count
+    
+    def spans(self):
+        """Slices covering the live part of the ring buffer (at most two)"""
+        end = self.head + self.count
+        if end <= self.capacity:
+            return [slice(self.head, end)]
+        return [slice(self.head, self.capacity), slice(0, end - self.capacity)]
         
     def update(self):
-        self.x += self.vel_x
-        self.y += self.vel_y
-        self.vel_y += 0.1  # Gravity
-        self.life -= 1
-        
-    def draw(self, screen):
-        if self.life > 0:
-            alpha = int(255 * (self.life / self.max_life))
-            size = int(self.size * (self.life / self.max_life))
-            if size > 0:
-                pygame.draw.circle(screen, self.color, (int(self.x), int(self.y)), size)
+        for span in self.spans():
+            self.x[span] += self.vel_x[span]
+            self.y[span] += self.vel_y[span]
+            self.vel_y[span] += 0.1  # Gravity
+            self.life[span] -= 1
+        
+        # Retire expired particles from the oldest end of the ring
+        for span in self.spans():
+            alive = self.alive[span]
+            np.greater(self.life[span], 0, out=alive)
+            if alive.any():
+                retired = int(alive.argmax())
+                self.head = (self.head + retired) % self.capacity
+                self.count -= retired
+                break
+            retired = span.stop - span.start
+            self.head = (self.head + retired) % self.capacity
+            self.count -= retired
+    
+    def get_sprite(self, color_id, size):
+        key = (color_id, size)
+        if key not in self.sprites:
+            sprite = pygame.Surface((size * 2, size * 2), pygame.SRCALPHA)
+            pygame.draw.circle(sprite, self.colors[color_id], (size, size), size)
+            self.sprites[key] = display_format(sprite)
+        return self.sprites[key]
+        
+    def draw(self, screen, offset=(0, 0), view=None):
+        """Draw the live particles inside view (a world rect, all of them if None) with one 
+        batched blit call and return the covered rects"""
+        offset_x, offset_y = offset
+        blits = []
+        for span in self.spans():
+            # Particles shrink as they fade
+            scale = self.scale[span]
+            np.divide(self.life[span], self.max_life[span], out=scale)
+            np.multiply(scale, self.size[span], out=scale)
+            draw_size = self.draw_size[span]
+            np.copyto(draw_size, scale, casting='unsafe')
+            
+            # Skip particles that have shrunk away or are off screen
+            shown = self.alive[span]
+            np.greater(draw_size, 0, out=shown)
+            if view is not None:
+                x = self.x[span]
+                y = self.y[span]
+                shown &= (x >= view.left) & (x < view.right) & (y >= view.top) & (y < view.bottom)
+            indices = np.flatnonzero(shown)
+            
+            for x, y, size, color_id in zip(self.x[span][indices].tolist(), self.y[span][indices].tolist(), 
+                                            draw_size[indices].tolist(), self.color[span][indices].tolist()):
+                blits.append((self.get_sprite(color_id, size), 
+                              (int(x + offset_x) - size, int(y + offset_y) - size)))
+        
+        if not blits:
+            return []
+        return screen.blits(blits)
 
 class PowerUp:
-    def __init__(self, x, y):
+    power_types = ['speed', 'jump', 'invincible', 'magnet']
+    # Glow and icon sprites keyed by power type
+    sprite_cache = {}
+    
+    def __init__(self, x, y, power_type=None, rng=random):
         self.x = x
         self.y = y
         self.width = 20
@@ -1105,11 +1586,10 @@ class PowerUp:
         self.animation_frame = 0
         
         # Better random distribution of power types
-        power_types = ['speed', 'jump', 'invincible', 'magnet']
         weights = [25, 25, 20, 30]  # Magnet slightly more common, invincible slightly less
-        self.power_type = random.choices(power_types, weights=weights)[0]
+        self.power_type = power_type or rng.choices(PowerUp.power_types, weights=weights)[0]
         
-        self.float_offset = random.uniform(0, 6.28)  # Random start phase
+        self.float_offset = rng.uniform(0, 6.28)  # Random start phase
         
         # Set properties based on power type
         if self.power_type == 'speed':
@@ -1129,36 +1609,45 @@ class PowerUp:
         self.animation_frame += 0.1
         self.float_offset += 0.05
         
-    def draw(self, screen):
+    def draw(self, screen, offset=(0, 0)):
         if not self.collected:
             # Floating animation
-            float_y = self.y + math.sin(self.float_offset) * 3
+            float_y = self.y + offset[1] + math.sin(self.float_offset) * 3
+            
+            sprite = self.get_sprite()
+            center_x = int(self.x + offset[0] + self.width//2)
+            center_y = int(float_y + self.height//2)
+            return screen.blit(sprite, (center_x - sprite.get_width() // 2, center_y - sprite.get_height() // 2))
+    
+    def get_sprite(self):
+        """Return the cached glow and icon sprite for this power type"""
+        power_type = self.power_type
+        if power_type not in PowerUp.sprite_cache:
+            glow_radius = self.width // 2 + 3 * 3
+            sprite = pygame.Surface((glow_radius * 2 + 2, glow_radius * 2 + 2), pygame.SRCALPHA)
+            center_x = center_y = glow_radius + 1
             
             # Draw power-up with glow effect (more visible)
             for i in range(4):  # More glow layers
                 size = self.width // 2 + i * 3
                 alpha_color = tuple(min(255, c + 60 - i * 15) for c in self.color)
-                pygame.draw.circle(screen, alpha_color, 
-                                 (int(self.x + self.width//2), int(float_y + self.height//2)), size)
+                pygame.draw.circle(sprite, alpha_color, (center_x, center_y), size)
             
             # Draw icon based on type (larger and more visible)
-            center_x = int(self.x + self.width//2)
-            center_y = int(float_y + self.height//2)
-            
-            if self.power_type == 'speed':
+            if power_type == 'speed':
                 # Draw speed lines (larger)
                 for i in range(4):
-                    pygame.draw.line(screen, WHITE, 
+                    pygame.draw.line(sprite, WHITE, 
                                    (center_x - 10 + i*3, center_y - 3), 
                                    (center_x - 5 + i*3, center_y + 3), 3)
-            elif self.power_type == 'jump':
+            elif power_type == 'jump':
                 # Draw up arrow (larger)
-                pygame.draw.polygon(screen, WHITE, [
+                pygame.draw.polygon(sprite, WHITE, [
                     (center_x, center_y - 8),
                     (center_x - 6, center_y + 4),
                     (center_x + 6, center_y + 4)
                 ])
-            elif self.power_type == 'invincible':
+            elif power_type == 'invincible':
                 # Draw star (larger)
                 points = []
                 for i in range(5):
@@ -1166,43 +1655,323 @@ class PowerUp:
                     x = center_x + math.cos(angle) * 8
                     y = center_y + math.sin(angle) * 8
                     points.append((x, y))
-                pygame.draw.polygon(screen, WHITE, points)
-            elif self.power_type == 'magnet':
+                pygame.draw.polygon(sprite, WHITE, points)
+            elif power_type == 'magnet':
                 # Draw magnet shape (larger)
-                pygame.draw.rect(screen, WHITE, (center_x - 4, center_y - 8, 3, 12))
-                pygame.draw.rect(screen, WHITE, (center_x + 1, center_y - 8, 3, 12))
-                pygame.draw.rect(screen, WHITE, (center_x - 6, center_y - 8, 5, 3))
-                pygame.draw.rect(screen, WHITE, (center_x + 1, center_y - 8, 5, 3))
-                pygame.draw.rect(screen, WHITE, (center_x - 6, center_y + 5, 5, 3))
-                pygame.draw.rect(screen, WHITE, (center_x + 1, center_y + 5, 5, 3))
+                pygame.draw.rect(sprite, WHITE, (center_x - 4, center_y - 8, 3, 12))
+                pygame.draw.rect(sprite, WHITE, (center_x + 1, center_y - 8, 3, 12))
+                pygame.draw.rect(sprite, WHITE, (center_x - 6, center_y - 8, 5, 3))
+                pygame.draw.rect(sprite, WHITE, (center_x + 1, center_y - 8, 5, 3))
+                pygame.draw.rect(sprite, WHITE, (center_x - 6, center_y + 5, 5, 3))
+                pygame.draw.rect(sprite, WHITE, (center_x + 1, center_y + 5, 5, 3))
+            
+            PowerUp.sprite_cache[power_type] = display_format(sprite)
+        return PowerUp.sprite_cache[power_type]
 
-class Game:
-    def __init__(self):
-        self.screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
-        pygame.display.set_caption("Mario Bros Clone - Enhanced Edition")
-        self.clock = pygame.time.Clock()
-        
-        # Initialize music
-        self.music_playing = False
-        self.music_volume = 0.7
-        self.load_music()
-        
-        # Load sound effects
-        self.load_sound_effects()
+class PlayerInput:
+    """Buttons held by the player during one simulation tick"""
+    def __init__(self, left=False, right=False, jump=False):
+        self.left = left
+        self.right = right
+        self.jump = jump
+    
+class JumpEnvelope:
+    """Where a standing jump can land, tabulated from Player.update's physics.
+    
+    The arcs are stepped once per physics configuration; after that, whether
+    one platform can be reached from another is a few table lookups. Use get()
+    for the shared envelope of plain, speed-boosted or jump-boosted jumps.
+    """
+    # Envelopes keyed by (speed, jump strength, gravity)
+    cache = {}
+    
+    def __init__(self, speed=PLAYER_SPEED, jump_strength=JUMP_STRENGTH, gravity=GRAVITY, 
+                 player_width=32, player_height=32):
+        self.speed = speed
+        self.player_width = player_width
+        self.player_height = player_height
+        
+        # Height above the takeoff point after each tick, jumping or dropping from rest
+        self.jump = self.arc(jump_strength, gravity)
+        self.fall = self.arc(0, gravity)
+        self.apex = max(self.jump)
+        
+        # First tick of a jump the feet are above a height, or at least a depth below the takeoff
+        self.rise_ticks = [next(tick for tick, rise in enumerate(self.jump, 1) if rise > height) 
+                           for height in range(int(self.apex))]
+        self.fall_ticks = [next(tick for tick, rise in enumerate(self.jump, 1) if rise < 0 and -rise >= depth) 
+                           for depth in range(SCREEN_HEIGHT + 1)]
+        
+        # Landing tick and how far the feet sink past the top, by drop from takeoff to the top
+        self.min_drop = -int(self.apex)
+        self.landing_ticks = []
+        self.overshoots = []
+        for drop in range(self.min_drop, SCREEN_HEIGHT + 1):
+            previous_rise = 0
+            for tick, rise in enumerate(self.jump, 1):
+                # Player.update lands on the tick the feet pass the top on the way down
+                if rise < previous_rise and -rise > drop and -previous_rise <= drop + 5:
+                    self.landing_ticks.append(tick)
+                    self.overshoots.append(-rise - drop)
+                    break
+                previous_rise = rise
+            else:
+                self.landing_ticks.append(0)
+                self.overshoots.append(0)
+    
+    @staticmethod
+    def get(speed_boost=False, jump_boost=False):
+        """Shared envelope for jumps with the given power-ups"""
+        key = (PLAYER_SPEED * 1.5 if speed_boost else PLAYER_SPEED, 
+               JUMP_STRENGTH * 1.3 if jump_boost else JUMP_STRENGTH, GRAVITY)
+        if key not in JumpEnvelope.cache:
+            JumpEnvelope.cache[key] = JumpEnvelope(*key)
+        return JumpEnvelope.cache[key]
+    
+    @staticmethod
+    def arc(vel_y, gravity):
+        rises = []
+        rise = 0
+        while rise > -SCREEN_HEIGHT:
+            vel_y += gravity
+            rise -= vel_y
+            rises.append(rise)
+        return rises
+    
+    def x_range(self, rect):
+        """On-screen player x positions that overlap rect horizontally"""
+        return (max(0, rect.left - self.player_width + 1), 
+                min(SCREEN_WIDTH - self.player_width, rect.right - 1))
+    
+    def reach(self, drop):
+        """Farthest horizontal travel for a jump that lands drop pixels below the takeoff, or -1"""
+        index = int(drop) - self.min_drop
+        if not 0 <= index < len(self.landing_ticks) or not self.landing_ticks[index]:
+            return -1
+        return self.speed * self.landing_ticks[index]
+    
+    def can_land(self, source, target):
+        """Whether a jump from the top of source can land on target, with no other platform in the way"""
+        drop = int(target.top - source.top)
+        reach = self.reach(drop)
+        # A fall fast enough to pass through the platform in one tick doesn't land
+        if reach < 0 or self.overshoots[drop - self.min_drop] >= self.player_height + target.height:
+            return False
+        
+        source_left, source_right = self.x_range(source)
+        target_left, target_right = self.x_range(target)
+        max_x = SCREEN_WIDTH - self.player_width
+        if target_left > source_right or source_left > target_right:
+            return reach >= max(target_left - source_right, source_left - target_right)
+        
+        if drop < 0 and target_left <= source_left and source_right <= target_right:
+            # The head would bump the target, so rise beside it and step over the top
+            exits = [distance for distance, room in ((source_left - target_left + 1, target_left > 0), 
+                                                     (target_right + 1 - source_right, target_right < max_x)) if room]
+            height = source.top - self.player_height - target.bottom
+            if not exits or height < 0:
+                return False
+            return self.speed * self.rise_ticks[min(height, len(self.rise_ticks) - 1)] >= min(exits)
+        
+        if drop > 0 and source_left <= target_left and target_right <= source_right:
+            # Step off the source, then back in under it once the head clears its bottom
+            exits = [distance for distance, room in ((target_left - source_left + 1, source_left > 0), 
+                                                     (source_right + 1 - target_right, source_right < max_x)) if room]
+            depth = self.player_height + source.height
+            if not exits or depth > SCREEN_HEIGHT:
+                return False
+            return self.speed * (self.landing_ticks[drop - self.min_drop] - self.fall_ticks[depth]) >= min(exits)
+        return True
+
+class ReachabilityGraph:
+    """Platforms the player can reach from the spawn, and what they can touch.
+    
+    Jumps from each platform, and walks off its ends, are swept tick by tick
+    along a JumpEnvelope's arcs (plain jumps by default), tracking the x
+    positions the player can be in as the bits of an int. Positions that run
+    into a platform are cut out, or fall from its underside after a bump.
+    Only platforms the search reaches are swept, once each.
+    """
+    def __init__(self, platforms, envelope=None, spawn_x=100, spawn_y=400):
+        self.platforms = platforms
+        self.envelope = envelope or JumpEnvelope.get()
+        self.player_width = self.envelope.player_width
+        self.player_height = self.envelope.player_height
+        self.screen = self.positions(0, SCREEN_WIDTH - self.player_width)
+        # Shifts that spread positions by the envelope's speed, each at most doubling the distance covered
+        self.shifts = []
+        step = math.ceil(self.envelope.speed)
+        while sum(self.shifts) < step:
+            self.shifts.append(min(sum(self.shifts) + 1, step - sum(self.shifts)))
+        self.sweeps = {}
+        
+        # Top, bottom and blocked player x positions of every platform
+        self.bounds = [(platform.rect.top, platform.rect.bottom, self.positions(*self.envelope.x_range(platform.rect))) 
+                       for platform in platforms]
+        # Platforms level with the player and all the positions they block, by the pixel row 
+        # its feet are in, so a sweep never looks at the others: from a platform's top to a 
+        # player's height below its bottom
+        self.rows = {}
+        for index, bounds in enumerate(self.bounds):
+            for row in range(bounds[0], bounds[1] + self.player_height):
+                level, blocked = self.rows.get(row, ((), 0))
+                self.rows[row] = (level + ((index, bounds),), blocked | bounds[2])
+        # Feet exactly on a platform's top are above it, not beside it
+        self.rows_on = dict(self.rows)
+        for top, _, _ in self.bounds:
+            level = tuple(entry for entry in self.rows[top][0] if entry[1][0] < top)
+            blocked = 0
+            for _, (_, _, platform_blocked) in level:
+                blocked |= platform_blocked
+            self.rows_on[top] = (level, blocked)
+        # Sweep frames of every reachable platform sorted by the height of the feet, built on the first can_touch()
+        self.frame_bottoms = None
+        self.frame_positions = None
+        
+        # Breadth-first search from the platform the player drops onto at spawn
+        self.reachable = set()
+        start = self.spawn_platform(spawn_x, spawn_y)
+        if start is not None:
+            self.reachable.add(start)
+            frontier = deque([start])
+            while frontier:
+                for index in self.neighbors(frontier.popleft()):
+                    if index not in self.reachable:
+                        self.reachable.add(index)
+                        frontier.append(index)
+    
+    def spawn_platform(self, spawn_x, spawn_y):
+        """Index of the platform a player dropped at the spawn point lands on"""
+        # Same rule as Player.update: the feet may start up to 5 pixels below the top
+        below = [index for index, platform in enumerate(self.platforms) 
+                 if platform.x < spawn_x + self.player_width and platform.x + platform.width > spawn_x 
+                 and platform.y + 5 >= spawn_y + self.player_height]
+        return min(below, key=lambda index: self.platforms[index].y, default=None)
+    
+    def sweep(self, index):
+        """Player bottoms and x positions, tick by tick, of jumps from and walks off 
+        platforms[index], and the platforms they land on"""
+        if index not in self.sweeps:
+            top, _, positions = self.bounds[index]
+            # Leave out spots where another platform leaves no room to stand
+            positions &= ~self.overlapping(top)[1]
+            frames = [(top, positions)]
+            landings = set()
+            
+            # Each branch follows positions along one arc from the same starting height: a jump, 
+            # a walk off either end (which lands straight back on the source anywhere else), 
+            # or a fall from under a platform the player bumped into
+            branches = [(top, self.envelope.jump, positions), (top, self.envelope.fall, positions)]
+            while branches:
+                start, arc, positions = branches.pop()
+                previous_bottom = start
+                beside, blocked_beside = self.overlapping(start)
+                for rise in arc:
+                    if not positions or previous_bottom >= SCREEN_HEIGHT:
+                        break
+                    bottom = start - rise
+                    # Player.update moves sideways before falling, and gets pushed back out of 
+                    # platforms beside it at the old height
+                    positions = self.spread(positions) & ~blocked_beside
+                    
+                    beside, blocked_beside = self.overlapping(bottom)
+                    if not positions & blocked_beside:
+                        beside = ()
+                    for other, (platform_top, platform_bottom, blocked) in beside:
+                        hit = positions & blocked
+                        if not hit:
+                            continue
+                        # Same rules as Player.update: land on the top, stop rising under the bottom
+                        if bottom > previous_bottom and previous_bottom <= platform_top + 5:
+                            landings.add(other)
+                        elif bottom < previous_bottom and previous_bottom - self.player_height >= platform_bottom - 5:
+                            branches.append((platform_bottom + self.player_height, self.envelope.fall, hit))
+                        positions &= ~blocked
+                    
+                    if positions:
+                        frames.append((bottom, positions))
+                    previous_bottom = bottom
+            
+            landings.discard(index)
+            self.sweeps[index] = (frames, sorted(landings))
+        return self.sweeps[index]
+    
+    def overlapping(self, bottom):
+        """Indices and bounds of platforms level with a player whose feet are at bottom, 
+        and the positions they block between them"""
+        row = math.floor(bottom)
+        return (self.rows_on if row == bottom else self.rows).get(row, ((), 0))
+    
+    @staticmethod
+    def positions(left, right):
+        """Bitmask of the player x positions from left to right"""
+        return (1 << (right + 1)) - (1 << left) if left <= right else 0
+    
+    def spread(self, positions):
+        """Positions one tick of moving sideways (or not) can get to from positions"""
+        for shift in self.shifts:
+            positions |= (positions << shift) | (positions >> shift)
+        return positions & self.screen
+    
+    def neighbors(self, index):
+        """Platforms a single jump from platforms[index] can land on"""
+        return self.sweep(index)[1]
+    
+    def linked(self, platform, other):
+        """Whether the player can jump from either platform to the other"""
+        index = self.platforms.index(platform)
+        other_index = self.platforms.index(other)
+        return other_index in self.neighbors(index) or index in self.neighbors(other_index)
+    
+    def reachable_platforms(self):
+        return [self.platforms[index] for index in sorted(self.reachable)]
+    
+    def can_touch(self, rect):
+        """Whether the player can overlap rect while standing on or jumping from a reachable platform"""
+        if self.frame_bottoms is None:
+            frames = sorted(frame for index in self.reachable for frame in self.sweep(index)[0])
+            self.frame_bottoms = [bottom for bottom, _ in frames]
+            self.frame_positions = [positions for _, positions in frames]
+        
+        # Frames where the player is level with rect, then positions overlapping it
+        first = bisect.bisect_right(self.frame_bottoms, rect.top)
+        last = bisect.bisect_left(self.frame_bottoms, rect.bottom + self.player_height)
+        touching = self.positions(*self.envelope.x_range(rect))
+        return any(positions & touching for positions in self.frame_positions[first:last])
+
+class Simulation:
+    """Game rules and physics with no window, mixer or wall clock.
+    
+    Call step() once per tick with a PlayerInput. Things a renderer may want
+    to react to (particles, camera shake, sounds) are queued in self.events.
+    
+    With endless=True each level is a ChunkedWorld instead of one screen, and
+    the object lists only hold the chunks around the player. Endless games
+    have no countdown and no win, they go on until the lives run out.
+    
+    With generate=False no level is generated until generate_level() or
+    regenerate_level() is called, for callers that only use the generators.
+    """
+    def __init__(self, seed=None, endless=False, generate=True):
+        self.endless = endless
+        self.world = None
+        self.new_game()
+        
+        # Each level is generated from its own seed, drawn from this stream unless given
+        self.seed_rng = random.Random(seed)
+        if generate:
+            self.generate_level()
+    
+    def new_game(self):
+        """Reset the clock, player, score, lives and timers to how a new Simulation starts"""
+        # Simulated time in milliseconds, advanced by TICK_MS every step
+        self.ticks = 0
+        self.events = []
         
         # Game objects
         self.player = Player(100, 400)
-        
-        # Generate random platforms
-        self.platforms = self.generate_random_platforms()
-        
-        # Generate enemies, coins, and power-ups based on platforms
-        self.enemies = self.generate_enemies()
-        self.coins = self.generate_coins()
-        self.power_ups = self.generate_power_ups()
-        
-        # Particle system
-        self.particles = []
+        if self.endless:
+            self.player.max_x = math.inf
         
         # Enhanced game state
         self.score = 0
@@ -1213,187 +1982,403 @@ class Game:
         self.invulnerable = False  # Make sure this is explicitly set to False
         self.invulnerable_time = 0
         self.invulnerable_duration = 2000
-        self.font = pygame.font.Font(None, 36)
-        self.small_font = pygame.font.Font(None, 24)
         self.game_won = False
         self.game_over = False
         self.win_time = 0
-        self.start_time = pygame.time.get_ticks()
+        self.start_time = self.ticks
         
         # Add countdown timer
         self.countdown_duration = 120  # 2 minutes in seconds
-        self.countdown_start_time = pygame.time.get_ticks()
+        self.countdown_start_time = self.ticks
         self.time_warning_played = False  # To play warning sound at 30 seconds
-        
-        # Camera shake effect
-        self.camera_shake = 0
-        self.camera_shake_duration = 0
     
     def generate_power_ups(self):
-        power_ups = []
+        power_ups = SpatialGrid()
         
-        # Place power-ups on platforms and in floating positions
-        available_platforms = [p for p in self.platforms 
+        # Place power-ups on reachable platforms and in floating positions
+        available_platforms = [p for p in self.reachability.reachable_platforms() 
                              if p.y < SCREEN_HEIGHT - 50 and p.width >= 60]
         
         if not available_platforms:
-            return power_ups
+            return power_ups.items
         
         # Generate 2-4 power-ups guaranteed
-        num_power_ups = random.randint(2, 4)
+        num_power_ups = self.level_rng.randint(2, 4)
         
         # Method 1: Place some power-ups on platforms
         platform_power_ups = min(num_power_ups // 2 + 1, len(available_platforms))
-        selected_platforms = random.sample(available_platforms, platform_power_ups)
+        selected_platforms = self.level_rng.sample(available_platforms, platform_power_ups)
         
         for platform in selected_platforms:
-            power_up_x = random.randint(int(platform.x + 10), 
-                                      int(platform.x + platform.width - 30))
+            power_up_x = self.level_rng.randint(int(platform.x + 10), 
+                                              int(platform.x + platform.width - 30))
             power_up_y = platform.y - 25
-            power_ups.append(PowerUp(power_up_x, power_up_y))
+            power_ups.insert_point(PowerUp(power_up_x, power_up_y, rng=self.level_rng))
         
         # Method 2: Place remaining power-ups in floating positions
-        remaining_power_ups = num_power_ups - len(power_ups)
+        remaining_power_ups = num_power_ups - len(power_ups.items)
         
         for _ in range(remaining_power_ups):
             attempts = 0
             placed = False
             
             while attempts < 30 and not placed:
+                self.placement_attempts += 1
                 # Random position anywhere on screen
-                x = random.randint(50, SCREEN_WIDTH - 70)
-                y = random.randint(100, SCREEN_HEIGHT - 200)
-                
-                # Check if position is reachable from at least one platform
-                reachable = False
-                MAX_JUMP_HEIGHT = abs(JUMP_STRENGTH) * abs(JUMP_STRENGTH) / (2 * GRAVITY) - 10
-                MAX_JUMP_DISTANCE = PLAYER_SPEED * (2 * abs(JUMP_STRENGTH) / GRAVITY) * 0.9
+                x = self.level_rng.randint(50, SCREEN_WIDTH - 70)
+                y = self.level_rng.randint(100, SCREEN_HEIGHT - 200)
                 
-                for platform in available_platforms:
-                    platform_center_x = platform.x + platform.width // 2
-                    platform_top_y = platform.y
-                    
-                    horizontal_distance = abs(platform_center_x - (x + 10))  # 10 is half power-up width
-                    vertical_distance = platform_top_y - y
-                    
-                    # Check if reachable
-                    if (horizontal_distance <= MAX_JUMP_DISTANCE and 
-                        -50 <= vertical_distance <= MAX_JUMP_HEIGHT):
-                        reachable = True
-                        break
-                
-                if not reachable:
-                    attempts += 1
-                    continue
-                
-                # Check if position doesn't overlap with platforms or other power-ups
+                # Check if position doesn't overlap with platforms or other power-ups, 
+                # and is reachable from the spawn
                 power_up_rect = pygame.Rect(x - 10, y - 10, 40, 40)
-                valid_position = True
-                
-                # Check platform overlaps
-                for platform in self.platforms:
-                    platform_rect = pygame.Rect(platform.x, platform.y, 
-                                               platform.width, platform.height)
-                    if power_up_rect.colliderect(platform_rect):
-                        valid_position = False
-                        break
-                
-                # Check other power-up overlaps
-                if valid_position:
-                    for existing_power_up in power_ups:
-                        if (abs(existing_power_up.x - x) < 50 and 
-                            abs(existing_power_up.y - y) < 50):
-                            valid_position = False
-                            break
+                valid_position = (not self.platform_grid.collides(power_up_rect) and 
+                                  not power_ups.near(x, y, 50) and 
+                                  self.reachability.can_touch(pygame.Rect(x, y, 20, 20)))
                 
                 if valid_position:
-                    power_ups.append(PowerUp(x, y))
+                    power_ups.insert_point(PowerUp(x, y, rng=self.level_rng))
                     placed = True
                 
                 attempts += 1
         
         # Method 3: If we still don't have enough power-ups, place them more liberally
-        if len(power_ups) < 2:
-            for _ in range(2 - len(power_ups)):
+        if len(power_ups.items) < 2:
+            for _ in range(2 - len(power_ups.items)):
                 # Just place them on random platforms without too many restrictions
                 if available_platforms:
-                    platform = random.choice(available_platforms)
-                    power_up_x = random.randint(int(platform.x + 10), 
-                                              int(platform.x + platform.width - 30))
+                    platform = self.level_rng.choice(available_platforms)
+                    power_up_x = self.level_rng.randint(int(platform.x + 10), 
+                                                      int(platform.x + platform.width - 30))
                     power_up_y = platform.y - 25
                     
                     # Quick check to avoid placing on same spot
-                    too_close = False
-                    for existing_power_up in power_ups:
-                        if (abs(existing_power_up.x - power_up_x) < 30 and 
-                            abs(existing_power_up.y - power_up_y) < 30):
-                            too_close = True
-                            break
+                    if not power_ups.near(power_up_x, power_up_y, 30):
+                        power_ups.insert_point(PowerUp(power_up_x, power_up_y, rng=self.level_rng))
                     
-                    if not too_close:
-                        power_ups.append(PowerUp(power_up_x, power_up_y))
-        
-        return power_ups
-    
-    def add_particles(self, x, y, color, count=PARTICLE_COUNT):
-        for _ in range(count):
-            particle = Particle(x, y, color)
-            self.particles.append(particle)
+        return power_ups.items
     
-    def add_camera_shake(self, intensity=5, duration=300):
-        self.camera_shake = intensity
-        self.camera_shake_duration = duration
-    
-    def load_music(self):
-        """Load and start background music"""
-        try:
-            pygame.mixer.music.load("somegame_music.wav")
-            pygame.mixer.music.set_volume(self.music_volume)
-            pygame.mixer.music.play(-1)  # -1 means loop indefinitely
-            self.music_playing = True
-            print("Music loaded and playing successfully!")
-        except pygame.error as e:
-            print(f"Could not load music file 'somegame_music.wav': {e}")
-            print("Game will continue without music.")
-            self.music_playing = False
-    
-    def toggle_music(self):
-        """Toggle music on/off"""
-        if self.music_playing:
-            if pygame.mixer.music.get_busy():
-                pygame.mixer.music.pause()
-                print("Music paused")
-            else:
-                pygame.mixer.music.unpause()
-                print("Music resumed")
-        else:
-            # Try to reload and play music
-            self.load_music()
+    def step(self, inputs):
+        """Advance the simulation by one tick"""
+        self.ticks += TICK_MS
     
-    def adjust_volume(self, change):
-        """Adjust music volume"""
-        self.music_volume = max(0.0, min(1.0, self.music_volume + change))
-        pygame.mixer.music.set_volume(self.music_volume)
-        print(f"Music volume: {int(self.music_volume * 100)}%")
+        if not self.game_won and not self.game_over:
+            # Check countdown timer
+            remaining_time = self.get_remaining_time()
     
-    def generate_random_platforms(self):
-        platforms = []
-        
-        # Always add ground platform (grass type)
-        ground_platform = Platform(0, SCREEN_HEIGHT - 40, SCREEN_WIDTH, 40)
-        ground_platform.platform_type = 'grass'
-        platforms.append(ground_platform)
-        
-        # Generate accessible platforms in layers
-        self.generate_accessible_platforms(platforms)
-        
-        return platforms
+            # Play warning sound at 30 seconds (if sound is available)
+            if remaining_time <= 30 and remaining_time > 29 and not self.time_warning_played:
+                self.time_warning_played = True
+                self.events.append(('time_warning',))
+    
+            # Game over when time runs out
+            if remaining_time <= 0:
+                self.game_over = True
+                self.events.append(('time_up',))
+                return
+            
+            self.player.update(self.platform_grid, inputs, self.ticks)
+            
+            # Stream in the chunks around the player's new position
+            if self.world is not None and self.world.update(self.player.x):
+                self.load_active_chunks()
+            
+            # Update invulnerability
+            if self.invulnerable:
+                if self.ticks - self.invulnerable_time > self.invulnerable_duration:
+                    self.invulnerable = False
+            
+            # Update combo timer
+            if self.combo_timer > 0:
+                self.combo_timer -= TICK_MS
+                if self.combo_timer <= 0:
+                    self.combo_multiplier = 1
+            
+            # Update enemies
+            for enemy in self.enemies:
+                if enemy.alive:
+                    enemy.update(self.platform_grid)
+                    self.entity_grid.move(enemy, pygame.Rect(enemy.x, enemy.y, enemy.width, enemy.height))
+            self.check_enemy_collisions()
+            
+            # Update coins
+            for coin in self.coins:
+                coin.update()
+            
+            # Update power-ups
+            for power_up in self.power_ups:
+                power_up.update()
+            
+            # Check collisions
+            self.check_collisions()
+            
+            # Check win condition (an endless world never runs out of coins)
+            if self.world is None:
+                self.check_win_condition()
+    
+    def check_collisions(self):
+        player_rect = pygame.Rect(self.player.x, self.player.y, self.player.width, self.player.height)
+        
+        # Broad phase: only entities sharing a grid cell with the player can touch it
+        nearby = self.entity_grid.query(player_rect)
+        
+        # Player vs enemies
+        for enemy in nearby:
+            if isinstance(enemy, Enemy) and enemy.alive:
+                if player_rect.colliderect(enemy.x, enemy.y, enemy.width, enemy.height):
+                    # Special case for spiky enemies - player always dies when touching them
+                    if enemy.enemy_type == 'spiky':
+                        # Player hit by spiky enemy - always lose a life if not invulnerable
+                        if not self.invulnerable and not self.player.invincible_power:
+                            # Extra camera shake for spiky enemy (more dangerous)
+                            self.events.append(('spiky_hit',))
+                            self.lose_life()
+                    else:
+                        # For other enemies, check if player is jumping on them
+                        if self.player.vel_y > 0 and self.player.y < enemy.y:
+                            enemy.alive = False
+                            self.player.vel_y = JUMP_STRENGTH // 2  # Small bounce
+                            
+                            # Enhanced scoring with combo system
+                            points = 100 * self.combo_multiplier
+                            self.score += points
+                            self.combo_multiplier = min(5, self.combo_multiplier + 1)
+                            self.combo_timer = 3000  # 3 seconds to maintain combo
+                            
+                            # Particles and camera shake
+                            self.events.append(('stomp', enemy.x + enemy.width//2, enemy.y + enemy.height//2))
+                        
+                        else:
+                            # Player hit by enemy - lose a life if not invulnerable
+                            if not self.invulnerable and not self.player.invincible_power:
+                                self.lose_life()
+        
+        # Magnet effect: pull coins in range towards the player. A coin's pull 
+        # shows up in next tick's collision test, so note where each one was
+        pulled = {}
+        if self.player.magnet_power:
+            magnet_range = 100
+            player_x = self.player.x
+            player_y = self.player.y
+            box = pygame.Rect(player_x - magnet_range - 1, player_y - magnet_range - 1, 
+                              2 * magnet_range + 3, 2 * magnet_range + 3)
+            for coin in self.entity_grid.query(box):
+                if isinstance(coin, Coin) and not coin.collected:
+                    dx = player_x - coin.x
+                    dy = player_y - coin.y
+                    if dx * dx + dy * dy < magnet_range * magnet_range:
+                        pulled[coin] = (coin.x, coin.y)
+                        coin.x += dx * 0.1
+                        coin.y += dy * 0.1
+                        self.entity_grid.move(coin, pygame.Rect(coin.x, coin.y, coin.width, coin.height))
+                
+        # Player vs coins
+        for coin in nearby:
+            if isinstance(coin, Coin) and not coin.collected:
+                coin_x, coin_y = pulled.get(coin, (coin.x, coin.y))
+                if player_rect.colliderect(coin_x, coin_y, coin.width, coin.height):
+                    coin.collected = True
+                    points = 50 * self.combo_multiplier
+                    self.score += points
+                    
+                    # Add coin particles
+                    self.events.append(('coin', coin.x + coin.width//2, coin.y + coin.height//2))
+        
+        # Player vs power-ups
+        for power_up in nearby:
+            if isinstance(power_up, PowerUp) and not power_up.collected:
+                if player_rect.colliderect(power_up.x, power_up.y, power_up.width, power_up.height):
+                    power_up.collected = True
+                    self.player.apply_power_up(power_up.power_type, power_up.effect_duration, self.ticks)
+                    self.score += 200
+                    
+                    # Power-up particles and camera shake
+                    self.events.append(('power_up', power_up.x + power_up.width//2, 
+                                        power_up.y + power_up.height//2, power_up.color))
+    
+    def check_enemy_collisions(self):
+        """Walking enemies that run into each other turn away from each other"""
+        walking = [enemy for enemy in self.enemies if enemy.alive and enemy.enemy_type != 'ghost']
+        for enemy, other in self.entity_grid.pairs(walking):
+            left, right = (enemy, other) if enemy.x <= other.x else (other, enemy)
+            if left.vel_x > 0:
+                left.vel_x *= -1
+            if right.vel_x < 0:
+                right.vel_x *= -1
+    
+    def lose_life(self):
+        """Handle losing a life"""
+        self.lives -= 1
+        
+        # Reset player position
+        spawn_x = 100 if self.world is None else self.world.spawn_x(self.player.x)
+        spawn_y = 400
+        self.player.x = spawn_x
+        self.player.y = spawn_y
+        self.player.prev_x = spawn_x  # Don't interpolate the jump back to spawn
+        self.player.prev_y = spawn_y
+        self.player.vel_x = 0
+        self.player.vel_y = 0
+        
+        # Red particle effect and camera shake at spawn point every time player dies
+        self.events.append(('life_lost', spawn_x + self.player.width//2, 
+                            spawn_y + self.player.height//2))
+        
+        if self.lives <= 0:
+            self.game_over = True
+            self.events.append(('game_over',))
+        else:
+            # Make invulnerable temporarily
+            self.invulnerable = True
+            self.invulnerable_time = self.ticks
+    
+    def check_win_condition(self):
+        """Check if all coins have been collected"""
+        all_collected = True
+        for coin in self.coins:
+            if not coin.collected:
+                all_collected = False
+                break
+        
+        if all_collected and not self.game_won:
+            self.game_won = True
+            self.win_time = self.ticks
+            self.events.append(('win',))
+    
+    def regenerate_level(self, seed=None, level=None):
+        """Regenerate the entire level from a seed (the next one by default).
+        
+        A level from current_level(), LevelFormat or LevelQueue can be loaded
+        instead of generating one.
+        """
+        if level is not None:
+            (self.level_seed, self.platforms, self.platform_grid, 
+             self.enemies, self.coins, self.power_ups) = level
+            self.build_entity_grid()
+        else:
+            self.generate_level(seed)
+        
+        # Reset player position
+        self.player.x = 100
+        self.player.y = 400
+        self.player.prev_x = 100
+        self.player.prev_y = 400
+        self.player.vel_x = 0
+        self.player.vel_y = 0
+        
+        # Reset score and timers if starting new game
+        if self.game_won or self.game_over:
+            self.score = 0
+            self.start_time = self.ticks
+            self.countdown_start_time = self.ticks  # Reset countdown timer
+            self.time_warning_played = False
+        
+        # Reset invulnerability when regenerating level
+        self.invulnerable = False
+        self.invulnerable_time = 0
+    
+    def generate_level(self, seed=None):
+        """Generate platforms, enemies, coins and power-ups; the same seed gives the same level.
+        
+        A layout where the player can't leave the spawn platform or get to any
+        coin is thrown away for the next seed's, up to LEVEL_RETRIES times, so
+        level_seed may end up past the seed asked for.
+        """
+        self.level_seed = self.seed_rng.randrange(2**32) if seed is None else seed
+        self.level_rng = random.Random(self.level_seed)
+        # Random placements tried and layouts thrown away by the generators, for generation statistics
+        self.placement_attempts = 0
+        self.rejected_layouts = 0
+        
+        if self.endless:
+            # The seed picks the world, whose chunks are generated as the player reaches them
+            if self.world is None:
+                self.world = ChunkedWorld(self.level_seed)
+            else:
+                self.world.reset(self.level_seed)
+            self.world.update(100)
+            self.load_active_chunks()
+            return
+        
+        self.generate_layout()
+        while not self.winnable() and self.rejected_layouts < LEVEL_RETRIES:
+            self.rejected_layouts += 1
+            self.level_seed = (self.level_seed + 1) % 2**32
+            self.level_rng = random.Random(self.level_seed)
+            self.generate_layout()
+        self.build_entity_grid()
+    
+    def generate_layout(self):
+        """Generate platforms, then enemies, coins and power-ups based on them, from level_rng"""
+        # Generate random platforms
+        self.platforms = self.generate_random_platforms()
+        self.reachability = ReachabilityGraph(self.platforms)
+        
+        # Generate enemies, coins, and power-ups based on platforms
+        self.enemies = self.generate_enemies()
+        self.coins = self.generate_coins()
+        self.power_ups = self.generate_power_ups()
+        
+        # Drop anything the player can't get to, counting it for generation statistics
+        generated = len(self.coins) + len(self.power_ups)
+        self.coins = [coin for coin in self.coins 
+                      if self.reachability.can_touch(pygame.Rect(coin.x, coin.y, coin.width, coin.height))]
+        self.power_ups = [power_up for power_up in self.power_ups 
+                          if self.reachability.can_touch(pygame.Rect(power_up.x, power_up.y, 
+                                                                     power_up.width, power_up.height))]
+        self.pruned_objects = generated - len(self.coins) - len(self.power_ups)
+    
+    def winnable(self):
+        """Whether the player can get off the spawn platform and there are coins to collect"""
+        return len(self.reachability.reachable) > 1 and bool(self.coins)
+    
+    def build_entity_grid(self):
+        """Index enemies, coins and power-ups by their hitboxes, for the collision broad phase"""
+        self.entity_grid = SpatialGrid()
+        for entity in self.enemies + self.coins + self.power_ups:
+            self.entity_grid.insert(entity, pygame.Rect(entity.x, entity.y, entity.width, entity.height))
+    
+    def load_active_chunks(self):
+        """Point the object lists at the endless world's active chunks"""
+        (self.platforms, self.platform_grid, 
+         self.enemies, self.coins, self.power_ups) = self.world.active_level()
+        self.build_entity_grid()
+    
+    def current_level(self):
+        """The level's seed and objects, as regenerate_level(level=...) takes them"""
+        return (self.level_seed, self.platforms, self.platform_grid, 
+                self.enemies, self.coins, self.power_ups)
+    
+    def generate_random_platforms(self):
+        platforms = []
+        
+        # Collision index for this level, filled in as platforms are placed so 
+        # the generators can check for overlaps with it
+        self.platform_grid = SpatialGrid()
+        
+        # Always add ground platform (grass type)
+        ground_platform = Platform(0, SCREEN_HEIGHT - 40, SCREEN_WIDTH, 40, rng=self.level_rng)
+        ground_platform.platform_type = 'grass'
+        self.add_platform(platforms, ground_platform)
+        
+        # Generate accessible platforms in layers
+        self.generate_accessible_platforms(platforms)
+        
+        return platforms
+        
+    def add_platform(self, platforms, platform):
+        platforms.append(platform)
+        self.platform_grid.insert(platform, platform.rect)
+    
+    @staticmethod
+    def build_platform_grid(platforms):
+        grid = SpatialGrid()
+        for platform in platforms:
+            grid.insert(platform, platform.rect)
+        return grid
     
     def generate_accessible_platforms(self, platforms):
         """Generate platforms that are guaranteed to be reachable"""
-        # Define jumping constraints
-        MAX_JUMP_HEIGHT = abs(JUMP_STRENGTH) * abs(JUMP_STRENGTH) / (2 * GRAVITY) - 20  # More conservative
-        MAX_JUMP_DISTANCE = PLAYER_SPEED * (2 * abs(JUMP_STRENGTH) / GRAVITY) * 0.8  # More conservative
+        envelope = JumpEnvelope.get()
         
         # Create platforms in accessible layers
         current_layer_platforms = [platforms[0]]  # Start with ground platform
@@ -1406,16 +2391,17 @@ class Game:
             if layer_height < 80:
                 break
                 
-            num_platforms_in_layer = random.randint(2, 4)  # Fewer platforms per layer to avoid crowding
+            num_platforms_in_layer = self.level_rng.randint(2, 4)  # Fewer platforms per layer to avoid crowding
             
             for i in range(num_platforms_in_layer):
                 attempts = 0
                 platform_created = False
                 
                 while attempts < 50 and not platform_created:  # More attempts
+                    self.placement_attempts += 1
                     # Random platform properties
-                    width = random.randint(MIN_PLATFORM_WIDTH, MAX_PLATFORM_WIDTH)
-                    height = random.randint(MIN_PLATFORM_HEIGHT, MAX_PLATFORM_HEIGHT)
+                    width = self.level_rng.randint(MIN_PLATFORM_WIDTH, MAX_PLATFORM_WIDTH)
+                    height = self.level_rng.randint(MIN_PLATFORM_HEIGHT, MAX_PLATFORM_HEIGHT)
                     
                     # Simple random positioning with bounds checking
                     margin = 50  # Minimum distance from screen edges
@@ -1427,51 +2413,28 @@ class Game:
                         attempts += 1
                         continue
                     
-                    x = random.randint(min_x, max_x)
+                    x = self.level_rng.randint(min_x, max_x)
                     
                     # Add some height variation within the layer
-                    y_variation = random.randint(-20, 20)
+                    y_variation = self.level_rng.randint(-20, 20)
                     y = max(50, min(SCREEN_HEIGHT - 100, layer_height + y_variation))
                     
                     # Check if platform is reachable from at least one platform in current layer
-                    reachable = False
-                    for source_platform in current_layer_platforms:
-                        horizontal_distance = abs((source_platform.x + source_platform.width/2) - (x + width/2))
-                        height_diff = source_platform.y - (y + height)
-                        
-                        if (horizontal_distance <= MAX_JUMP_DISTANCE and 
-                            -30 <= height_diff <= MAX_JUMP_HEIGHT):
-                            reachable = True
-                            break
+                    new_platform_rect = pygame.Rect(x, y, width, height)
+                    reachable = any(envelope.can_land(source_platform.rect, new_platform_rect) 
+                                    for source_platform in current_layer_platforms)
                     
                     if not reachable:
                         attempts += 1
                         continue
                     
-                    # Check for overlaps with existing platforms (more strict)
+                    # Check for overlaps with existing platforms, this layer's included (more strict)
                     new_rect = pygame.Rect(x - 20, y - 20, width + 40, height + 40)  # Larger buffer
-                    valid_position = True
-                    
-                    for existing_platform in platforms:
-                        existing_rect = pygame.Rect(existing_platform.x, existing_platform.y, 
-                                                  existing_platform.width, existing_platform.height)
-                        
-                        if new_rect.colliderect(existing_rect):
-                            valid_position = False
-                            break
-                    
-                    # Also check against platforms being created in this layer
-                    for existing_platform in next_layer_platforms:
-                        existing_rect = pygame.Rect(existing_platform.x, existing_platform.y, 
-                                                  existing_platform.width, existing_platform.height)
-                        
-                        if new_rect.colliderect(existing_rect):
-                            valid_position = False
-                            break
+                    valid_position = not self.platform_grid.collides(new_rect)
                     
                     if valid_position:
-                        platform = Platform(x, y, width, height)
-                        platforms.append(platform)
+                        platform = Platform(x, y, width, height, rng=self.level_rng)
+                        self.add_platform(platforms, platform)
                         next_layer_platforms.append(platform)
                         platform_created = True
                     
@@ -1487,18 +2450,11 @@ class Game:
                 
                 # Make sure it doesn't overlap
                 new_rect = pygame.Rect(x - 10, y - 10, width + 20, height + 20)
-                valid_position = True
-                
-                for existing_platform in platforms:
-                    existing_rect = pygame.Rect(existing_platform.x, existing_platform.y, 
-                                              existing_platform.width, existing_platform.height)
-                    if new_rect.colliderect(existing_rect):
-                        valid_position = False
-                        break
+                valid_position = not self.platform_grid.collides(new_rect)
                 
                 if valid_position:
-                    platform = Platform(x, y, width, height)
-                    platforms.append(platform)
+                    platform = Platform(x, y, width, height, rng=self.level_rng)
+                    self.add_platform(platforms, platform)
                     next_layer_platforms.append(platform)
             
             # If still no platforms, stop creating layers
@@ -1512,25 +2468,24 @@ class Game:
     
     def add_connecting_platforms(self, platforms):
         """Add platforms to connect isolated areas"""
-        MAX_JUMP_HEIGHT = abs(JUMP_STRENGTH) * abs(JUMP_STRENGTH) / (2 * GRAVITY) - 20
-        MAX_JUMP_DISTANCE = PLAYER_SPEED * (2 * abs(JUMP_STRENGTH) / GRAVITY) * 0.8
+        envelope = JumpEnvelope.get()
+        boosted = JumpEnvelope.get(speed_boost=True, jump_boost=True)
         
         # Find platform pairs that are almost reachable and add connecting platforms
         platform_pairs = []
         for i, platform1 in enumerate(platforms):
             for j, platform2 in enumerate(platforms[i+1:], i+1):
-                horizontal_distance = abs((platform1.x + platform1.width/2) - (platform2.x + platform2.width/2))
-                height_diff = abs(platform1.y - platform2.y)
-                
-                # If platforms are close but not quite reachable, they're candidates for connection
-                if (MAX_JUMP_DISTANCE < horizontal_distance < MAX_JUMP_DISTANCE * 1.5 and
-                    height_diff < MAX_JUMP_HEIGHT):
+                # If only a boosted jump makes it, they're candidates for connection
+                if (not envelope.can_land(platform1.rect, platform2.rect) and 
+                    not envelope.can_land(platform2.rect, platform1.rect) and 
+                    (boosted.can_land(platform1.rect, platform2.rect) or 
+                     boosted.can_land(platform2.rect, platform1.rect))):
                     platform_pairs.append((platform1, platform2))
         
         # Add connecting platforms for some pairs
         if platform_pairs:
             num_connections = min(2, len(platform_pairs))
-            selected_pairs = random.sample(platform_pairs, num_connections)
+            selected_pairs = self.level_rng.sample(platform_pairs, num_connections)
             
             for platform1, platform2 in selected_pairs:
                 # Calculate midpoint
@@ -1538,8 +2493,8 @@ class Game:
                 mid_y = (platform1.y + platform2.y) // 2
                 
                 # Create connecting platform
-                width = random.randint(60, 100)
-                height = random.randint(15, 20)
+                width = self.level_rng.randint(60, 100)
+                height = self.level_rng.randint(15, 20)
                 
                 x = mid_x - width // 2
                 y = mid_y - height // 2
@@ -1550,32 +2505,25 @@ class Game:
                 
                 # Check if position is valid
                 new_rect = pygame.Rect(x - 10, y - 10, width + 20, height + 20)
-                valid_position = True
-                
-                for existing_platform in platforms:
-                    existing_rect = pygame.Rect(existing_platform.x, existing_platform.y, 
-                                              existing_platform.width, existing_platform.height)
-                    if new_rect.colliderect(existing_rect):
-                        valid_position = False
-                        break
+                valid_position = not self.platform_grid.collides(new_rect)
                 
                 if valid_position:
-                    platform = Platform(x, y, width, height)
-                    platforms.append(platform)
+                    platform = Platform(x, y, width, height, rng=self.level_rng)
+                    self.add_platform(platforms, platform)
     
     def add_floating_platforms(self, platforms):
         """Add some floating platforms that are accessible"""
-        MAX_JUMP_HEIGHT = abs(JUMP_STRENGTH) * abs(JUMP_STRENGTH) / (2 * GRAVITY) - 30
-        MAX_JUMP_DISTANCE = PLAYER_SPEED * (2 * abs(JUMP_STRENGTH) / GRAVITY) * 0.7
+        envelope = JumpEnvelope.get()
         
-        num_floating = random.randint(1, 3)  # Fewer floating platforms
+        num_floating = self.level_rng.randint(1, 3)  # Fewer floating platforms
         
         for _ in range(num_floating):
             attempts = 0
             while attempts < 30:  # More attempts
+                self.placement_attempts += 1
                 # Random platform properties (smaller floating platforms)
-                width = random.randint(50, 90)
-                height = random.randint(15, 20)
+                width = self.level_rng.randint(50, 90)
+                height = self.level_rng.randint(15, 20)
                 
                 # Random position with proper bounds checking
                 margin = 30
@@ -1585,23 +2533,13 @@ class Game:
                 if min_x >= max_x:
                     break  # Can't place platform, skip
                 
-                x = random.randint(min_x, max_x)
-                y = random.randint(80, SCREEN_HEIGHT - 250)
+                x = self.level_rng.randint(min_x, max_x)
+                y = self.level_rng.randint(80, SCREEN_HEIGHT - 250)
                 
                 # Check if this platform is reachable from at least one existing platform
-                reachable = False
                 new_rect = pygame.Rect(x, y, width, height)
-                
-                for existing_platform in platforms:
-                    # Calculate distance and height difference
-                    horizontal_distance = abs(existing_platform.x + existing_platform.width/2 - (x + width/2))
-                    height_diff = existing_platform.y - (y + height)
-                    
-                    # Check if reachable (more lenient for floating platforms)
-                    if (horizontal_distance <= MAX_JUMP_DISTANCE and 
-                        -40 <= height_diff <= MAX_JUMP_HEIGHT):
-                        reachable = True
-                        break
+                reachable = any(envelope.can_land(existing_platform.rect, new_rect) 
+                                for existing_platform in platforms)
                 
                 if not reachable:
                     attempts += 1
@@ -1609,19 +2547,11 @@ class Game:
                 
                 # Check for overlaps (stricter)
                 buffer_rect = pygame.Rect(x - 30, y - 30, width + 60, height + 60)
-                valid_position = True
-                
-                for existing_platform in platforms:
-                    existing_rect = pygame.Rect(existing_platform.x, existing_platform.y, 
-                                              existing_platform.width, existing_platform.height)
-                    
-                    if buffer_rect.colliderect(existing_rect):
-                        valid_position = False
-                        break
+                valid_position = not self.platform_grid.collides(buffer_rect)
                 
                 if valid_position:
-                    platform = Platform(x, y, width, height)
-                    platforms.append(platform)
+                    platform = Platform(x, y, width, height, rng=self.level_rng)
+                    self.add_platform(platforms, platform)
                     break
                 
                 attempts += 1
@@ -1636,17 +2566,17 @@ class Game:
         if not available_platforms:
             return enemies
         
-        num_enemies = random.randint(2, min(4, len(available_platforms)))
-        selected_platforms = random.sample(available_platforms, min(num_enemies, len(available_platforms)))
+        num_enemies = self.level_rng.randint(2, min(4, len(available_platforms)))
+        selected_platforms = self.level_rng.sample(available_platforms, min(num_enemies, len(available_platforms)))
         
         for platform in selected_platforms:
             # Place enemy on platform with some margin
             margin = 10
             if platform.width > margin * 2:
-                enemy_x = random.randint(int(platform.x + margin), 
-                                       int(platform.x + platform.width - margin - 30))
+                enemy_x = self.level_rng.randint(int(platform.x + margin), 
+                                               int(platform.x + platform.width - margin - 30))
                 enemy_y = platform.y - 30
-                enemy = Enemy(enemy_x, enemy_y)
+                enemy = Enemy(enemy_x, enemy_y, rng=self.level_rng)
                 
                 # Adjust enemy position based on type
                 if enemy.enemy_type == 'ghost':
@@ -1657,38 +2587,42 @@ class Game:
         return enemies
     
     def generate_coins(self):
-        coins = []
+        coins = SpatialGrid()
         
-        # Define jumping constraints for coin reachability
-        MAX_JUMP_HEIGHT = abs(JUMP_STRENGTH) * abs(JUMP_STRENGTH) / (2 * GRAVITY) - 10
-        MAX_JUMP_DISTANCE = PLAYER_SPEED * (2 * abs(JUMP_STRENGTH) / GRAVITY) * 0.9
+        # Jump range for placing air coins around a platform
+        envelope = JumpEnvelope.get()
+        max_offset_x = envelope.reach(0)
+        max_offset_y = int(envelope.apex)
         
-        # Place coins on platforms (guaranteed reachable)
-        available_platforms = [p for p in self.platforms if p.y < SCREEN_HEIGHT - 50]
+        # Place coins on platforms the player can reach
+        available_platforms = [p for p in self.reachability.reachable_platforms() if p.y < SCREEN_HEIGHT - 50]
+        if not available_platforms:
+            return coins.items
         
         for platform in available_platforms:
             if platform.width >= 50:  # Only place coins on platforms big enough
                 # Place coin on platform surface
-                coin_x = random.randint(int(platform.x + 10), 
-                                      int(platform.x + platform.width - 26))
+                coin_x = self.level_rng.randint(int(platform.x + 10), 
+                                              int(platform.x + platform.width - 26))
                 coin_y = platform.y - 20
-                coins.append(Coin(coin_x, coin_y))
+                coins.insert_point(Coin(coin_x, coin_y))
         
         # Add floating coins that are reachable from existing platforms
-        num_air_coins = random.randint(2, 4)
+        num_air_coins = self.level_rng.randint(2, 4)
         for _ in range(num_air_coins):
             attempts = 0
             while attempts < 20:
+                self.placement_attempts += 1
                 # Try to place coin in reachable position
-                source_platform = random.choice(available_platforms)
+                source_platform = self.level_rng.choice(available_platforms)
                 
                 # Calculate reachable area from source platform
                 base_x = source_platform.x + source_platform.width // 2
                 base_y = source_platform.y
                 
                 # Random position within jumping range
-                offset_x = random.randint(-int(MAX_JUMP_DISTANCE * 0.7), int(MAX_JUMP_DISTANCE * 0.7))
-                offset_y = random.randint(-int(MAX_JUMP_HEIGHT * 0.8), int(MAX_JUMP_HEIGHT * 0.3))
+                offset_x = self.level_rng.randint(-max_offset_x, max_offset_x)
+                offset_y = self.level_rng.randint(-max_offset_y, 0)
                 
                 coin_x = base_x + offset_x
                 coin_y = base_y + offset_y
@@ -1697,57 +2631,27 @@ class Game:
                 coin_x = max(20, min(SCREEN_WIDTH - 36, coin_x))
                 coin_y = max(20, min(SCREEN_HEIGHT - 100, coin_y))
                 
-                # Verify coin is reachable from at least one platform
-                reachable = False
+                # Make sure coin stays 10 pixels clear of platforms, isn't too close 
+                # to other coins and is reachable from the spawn
                 coin_rect = pygame.Rect(coin_x, coin_y, 16, 16)
-                
-                for platform in available_platforms:
-                    # Check if coin is reachable from this platform
-                    platform_center_x = platform.x + platform.width // 2
-                    platform_top_y = platform.y
-                    
-                    horizontal_distance = abs(platform_center_x - (coin_x + 8))
-                    vertical_distance = platform_top_y - coin_y
-                    
-                    # Check if within jumping range
-                    if (horizontal_distance <= MAX_JUMP_DISTANCE and 
-                        -30 <= vertical_distance <= MAX_JUMP_HEIGHT):
-                        reachable = True
-                        break
-                
-                if not reachable:
-                    attempts += 1
-                    continue
-                
-                # Make sure coin doesn't overlap with platforms
-                valid_position = True
-                for platform in self.platforms:
-                    platform_rect = pygame.Rect(platform.x - 10, platform.y - 10, 
-                                               platform.width + 20, platform.height + 20)
-                    if coin_rect.colliderect(platform_rect):
-                        valid_position = False
-                        break
-                
-                # Make sure coin isn't too close to other coins
-                for existing_coin in coins:
-                    if abs(existing_coin.x - coin_x) < 30 and abs(existing_coin.y - coin_y) < 30:
-                        valid_position = False
-                        break
+                valid_position = (not self.platform_grid.collides(coin_rect.inflate(20, 20)) and 
+                                  not coins.near(coin_x, coin_y, 30) and 
+                                  self.reachability.can_touch(coin_rect))
                 
                 if valid_position:
-                    coins.append(Coin(coin_x, coin_y))
+                    coins.insert_point(Coin(coin_x, coin_y))
                     break
                     
                 attempts += 1
         
         # Add bonus coins in strategic locations (optional)
-        self.add_bonus_coins(coins, available_platforms, MAX_JUMP_HEIGHT, MAX_JUMP_DISTANCE)
+        self.add_bonus_coins(coins, available_platforms)
         
-        return coins
+        return coins.items
 
-    def add_bonus_coins(self, coins, platforms, max_jump_height, max_jump_distance):
-        """Add bonus coins in challenging but reachable locations"""
-        num_bonus = random.randint(1, 2)
+    def add_bonus_coins(self, coins, platforms):
+        """Add bonus coins in challenging but reachable locations to the coins grid"""
+        num_bonus = self.level_rng.randint(1, 2)
         
         for _ in range(num_bonus):
             attempts = 0
@@ -1756,62 +2660,1236 @@ class Game:
                 if len(platforms) < 2:
                     break
                     
-                platform1 = random.choice(platforms)
-                platform2 = random.choice(platforms)
+                self.placement_attempts += 1
+                platform1 = self.level_rng.choice(platforms)
+                platform2 = self.level_rng.choice(platforms)
                 
                 if platform1 == platform2:
                     attempts += 1
                     continue
                 
-                # Check if platforms are within jumping distance
-                horizontal_gap = abs((platform1.x + platform1.width//2) - (platform2.x + platform2.width//2))
-                vertical_gap = abs(platform1.y - platform2.y)
-                
-                if horizontal_gap <= max_jump_distance and vertical_gap <= max_jump_height:
+                # Check if the player can jump between the platforms
+                if self.reachability.linked(platform1, platform2):
                     # Place coin between the platforms
                     mid_x = (platform1.x + platform1.width//2 + platform2.x + platform2.width//2) // 2
-                    mid_y = min(platform1.y, platform2.y) - random.randint(20, 40)
+                    mid_y = min(platform1.y, platform2.y) - self.level_rng.randint(20, 40)
                     
                     # Ensure coin is within screen bounds
                     mid_x = max(20, min(SCREEN_WIDTH - 36, mid_x))
                     mid_y = max(20, min(SCREEN_HEIGHT - 100, mid_y))
                     
-                    # Check if position is valid (not overlapping with platforms)
+                    # Check if position is valid (clear of platforms and other coins, reachable)
                     coin_rect = pygame.Rect(mid_x, mid_y, 16, 16)
-                    valid_position = True
-                    
-                    for platform in self.platforms:
-                        platform_rect = pygame.Rect(platform.x - 10, platform.y - 10, 
-                                                   platform.width + 20, platform.height + 20)
-                        if coin_rect.colliderect(platform_rect):
-                            valid_position = False
-                            break
-                    
-                    # Check distance from existing coins
-                    for existing_coin in coins:
-                        if abs(existing_coin.x - mid_x) < 40 and abs(existing_coin.y - mid_y) < 40:
-                            valid_position = False
-                            break
+                    valid_position = (not self.platform_grid.collides(coin_rect.inflate(20, 20)) and 
+                                      not coins.near(mid_x, mid_y, 40) and 
+                                      self.reachability.can_touch(coin_rect))
                     
                     if valid_position:
-                        coins.append(Coin(mid_x, mid_y))
+                        coins.insert_point(Coin(mid_x, mid_y))
                         break
                 
                 attempts += 1
 
-    def check_win_condition(self):
-        """Check if all coins have been collected"""
-        all_collected = True
-        for coin in self.coins:
-            if not coin.collected:
-                all_collected = False
-                break
+    def get_remaining_time(self):
+        """Get remaining time in seconds"""
+        if self.endless:
+            # Endless games have no time limit, so the clock never runs down
+            return self.countdown_duration
+        elapsed_time = (self.ticks - self.countdown_start_time) / 1000
+        remaining_time = max(0, self.countdown_duration - elapsed_time)
+        return remaining_time
+
+class LevelFormat:
+    """Compact fixed-size binary encoding of a level.
+    
+    A record holds the level seed (-1 if unknown) and the object counts,
+    then platforms (x, y, width, height, type), enemies (x, y, vel_x in
+    hundredths of a pixel, type), coins (x, y) and power-ups (x, y, type) as
+    little-endian ints, with positions rounded to whole pixels. Each kind is
+    padded to its capacity so every record has the same size.
+    """
+    header = struct.Struct('<qBBBB')
+    platform = struct.Struct('<hhHHB')
+    enemy = struct.Struct('<hhhB')
+    coin = struct.Struct('<hh')
+    power_up = struct.Struct('<hhB')
+    
+    def __init__(self, capacities):
+        """capacities: slots for (platforms, enemies, coins, power-ups)"""
+        self.capacities = tuple(int(capacity) for capacity in capacities)
+        
+        # Byte offset of each kind's slots within a record
+        self.offsets = []
+        offset = self.header.size
+        for capacity, slot in zip(self.capacities, (self.platform, self.enemy, self.coin, self.power_up)):
+            self.offsets.append(offset)
+            offset += capacity * slot.size
+        self.record_size = offset
+    
+    @staticmethod
+    def counts(level):
+        """Number of (platforms, enemies, coins, power-ups) in a level tuple"""
+        _, platforms, _, enemies, coins, power_ups = level
+        return (len(platforms), len(enemies), len(coins), len(power_ups))
+    
+    def fits(self, level):
+        return all(count <= capacity for count, capacity in zip(self.counts(level), self.capacities))
+    
+    def encode_into(self, buffer, offset, level):
+        """Write a level tuple (see Simulation.current_level) into buffer at offset"""
+        if not self.fits(level):
+            raise ValueError(f"Level with {self.counts(level)} objects does not fit in {self.capacities} slots")
+        seed, platforms, _, enemies, coins, power_ups = level
+        buffer[offset:offset + self.record_size] = bytes(self.record_size)
+        self.header.pack_into(buffer, offset, -1 if seed is None else seed, *self.counts(level))
+        
+        platform_offset, enemy_offset, coin_offset, power_up_offset = (offset + start for start in self.offsets)
+        for slot, platform in enumerate(platforms):
+            self.platform.pack_into(buffer, platform_offset + slot * self.platform.size, 
+                                    platform.x, platform.y, platform.width, platform.height, 
+                                    Platform.platform_types.index(platform.platform_type))
+        for slot, enemy in enumerate(enemies):
+            self.enemy.pack_into(buffer, enemy_offset + slot * self.enemy.size, 
+                                 round(enemy.x), round(enemy.y), round(enemy.vel_x * 100), 
+                                 Enemy.enemy_types.index(enemy.enemy_type))
+        for slot, coin in enumerate(coins):
+            self.coin.pack_into(buffer, coin_offset + slot * self.coin.size, round(coin.x), round(coin.y))
+        for slot, power_up in enumerate(power_ups):
+            self.power_up.pack_into(buffer, power_up_offset + slot * self.power_up.size, 
+                                    round(power_up.x), round(power_up.y), PowerUp.power_types.index(power_up.power_type))
+    
+    def encode(self, level):
+        record = bytearray(self.record_size)
+        self.encode_into(record, 0, level)
+        return bytes(record)
+    
+    def decode(self, buffer, offset=0):
+        """Rebuild the level tuple stored in buffer at offset"""
+        seed, num_platforms, num_enemies, num_coins, num_power_ups = self.header.unpack_from(buffer, offset)
+        seed = None if seed == -1 else seed
+        platform_offset, enemy_offset, coin_offset, power_up_offset = (offset + start for start in self.offsets)
+        # Only used for cosmetic start phases
+        rng = random.Random(seed)
+        
+        platforms = []
+        for slot in range(num_platforms):
+            x, y, width, height, type_index = self.platform.unpack_from(buffer, platform_offset + slot * self.platform.size)
+            platform = Platform(x, y, width, height, rng=rng)
+            platform.platform_type = Platform.platform_types[type_index]
+            platforms.append(platform)
+        
+        enemies = []
+        for slot in range(num_enemies):
+            x, y, vel_x, type_index = self.enemy.unpack_from(buffer, enemy_offset + slot * self.enemy.size)
+            enemy = Enemy(x, y, Enemy.enemy_types[type_index], rng=rng)
+            enemy.vel_x = vel_x / 100
+            enemies.append(enemy)
+        
+        coins = []
+        for slot in range(num_coins):
+            x, y = self.coin.unpack_from(buffer, coin_offset + slot * self.coin.size)
+            coins.append(Coin(x, y))
+        
+        power_ups = []
+        for slot in range(num_power_ups):
+            x, y, type_index = self.power_up.unpack_from(buffer, power_up_offset + slot * self.power_up.size)
+            power_ups.append(PowerUp(x, y, PowerUp.power_types[type_index], rng=rng))
+        
+        return (seed, platforms, Simulation.build_platform_grid(platforms), enemies, coins, power_ups)
+
+class LevelLibrary:
+    """Fixed-record level file, memory-mapped so any level loads by index.
+    
+    The file is a header (magic, version, slot capacities, level count)
+    followed by one LevelFormat record per level, so loading a level only
+    touches its own record.
+    """
+    header = struct.Struct('<4sHHHHHQ')
+    magic = b'SGLV'
+    version = 1
+    
+    def __init__(self, path):
+        self.file = open(path, 'rb')
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, *capacities, self.count = self.header.unpack_from(self.data, 0)
+        if magic != self.magic or version != self.version:
+            self.close()
+            raise ValueError(f"{path} is not a version {self.version} level library")
+        self.format = LevelFormat(capacities)
+    
+    def __len__(self):
+        return self.count
+    
+    def load(self, index):
+        """Level tuple for Simulation.regenerate_level(level=...)"""
+        if not 0 <= index < self.count:
+            raise IndexError(f"Level {index} is out of range for a library of {self.count}")
+        return self.format.decode(self.data, self.header.size + index * self.format.record_size)
+    
+    def close(self):
+        self.data.close()
+        self.file.close()
+    
+    @staticmethod
+    def write(path, levels, capacities=None):
+        """Write level tuples to a library file and return how many were written.
+        
+        Without capacities the levels are gathered first to size the slots;
+        pass capacities to stream a long iterator straight to disk.
+        """
+        if capacities is None:
+            levels = list(levels)
+            capacities = [max(counts) for counts in zip((0, 0, 0, 0), *map(LevelFormat.counts, levels))]
+        level_format = LevelFormat(capacities)
+        return LevelLibrary.write_records(path, level_format, map(level_format.encode, levels))
+        
+    @staticmethod
+    def write_records(path, level_format, records):
+        """Write records already encoded with level_format and return how many were written"""
+        count = 0
+        with open(path, 'wb') as file:
+            # Header goes in last, once the count is known
+            file.write(bytes(LevelLibrary.header.size))
+            for record in records:
+                if len(record) != level_format.record_size:
+                    raise ValueError(f"Record of {len(record)} bytes does not match the {level_format.record_size} byte format")
+                file.write(record)
+                count += 1
+            file.seek(0)
+            file.write(LevelLibrary.header.pack(LevelLibrary.magic, LevelLibrary.version, 
+                                                *level_format.capacities, count))
+        return count
+
+class LevelQueue:
+    """Generates upcoming levels on a background thread.
+    
+    next_level() hands over a ready level, and waits for the producer when it
+    hasn't caught up, so levels always come out in the order they were
+    generated. Levels are drawn from the same seed stream as Simulation(seed),
+    so a seed gives the same levels as regenerating synchronously.
+    """
+    def __init__(self, seed=None, size=LEVEL_QUEUE_SIZE):
+        # The generator's own first level stands in for the one the game starts on
+        self.generator = Simulation(seed)
+        self.levels = queue.Queue(maxsize=size)
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.produce, daemon=True)
+        self.thread.start()
+    
+    def produce(self):
+        while not self.stopped.is_set():
+            self.generator.generate_level()
+            level = self.generator.current_level()
+            while not self.stopped.is_set():
+                try:
+                    self.levels.put(level, timeout=0.1)
+                    break
+                except queue.Full:
+                    pass
+    
+    def next_level(self):
+        """The next level for Simulation.regenerate_level(level=...), waiting for it if need be"""
+        return self.levels.get()
+    
+    def close(self):
+        self.stopped.set()
+        self.thread.join()
+
+class LevelBatch:
+    """Generates levels by seed across a process pool, without a window.
+    
+    Workers run Simulation's generators and send back each level as a
+    LevelFormat record with its generation stats, so a long batch streams
+    straight into a LevelLibrary file. Levels with more objects than the
+    format has slots for are left out of the library, and their stats say
+    so in 'fits'.
+    """
+    # Stats columns, in the order write() puts them in the metrics CSV
+    stat_names = ('seed', 'fits', 'platforms', 'reachable_fraction', 'enemies', 'coins', 'power_ups', 
+                  'pruned', 'attempts', 'retries', 'generation_ms')
+    # Generator and level format, created once per worker process
+    worker = None
+    
+    def __init__(self, processes=None, shard_size=LEVEL_BATCH_SHARD_SIZE, 
+                 capacities=(VECTOR_ENV_MAX_PLATFORMS, VECTOR_ENV_MAX_ENEMIES, 
+                             VECTOR_ENV_MAX_COINS, VECTOR_ENV_MAX_POWER_UPS)):
+        self.processes = processes
+        self.shard_size = shard_size
+        self.format = LevelFormat(capacities)
+    
+    def run(self, count, seed=0):
+        """Generate levels from seed .. seed + count - 1 and yield (record, stats) for each, in seed order.
+        
+        record is None for levels that don't fit the format.
+        """
+        with multiprocessing.Pool(self.processes, initializer=LevelBatch.start_worker, 
+                                  initargs=(self.format.capacities,)) as pool:
+            yield from pool.imap(LevelBatch.generate, range(seed, seed + count), chunksize=self.shard_size)
+    
+    def write(self, path, count, seed=0, metrics=None):
+        """Generate count levels into a LevelLibrary file and return how many were written.
+        
+        If metrics is a text file, each level's stats are written to it as a CSV row.
+        """
+        writer = None
+        if metrics is not None:
+            writer = csv.DictWriter(metrics, fieldnames=self.stat_names)
+            writer.writeheader()
+        return LevelLibrary.write_records(path, self.format, self.records(count, seed, writer))
+    
+    def records(self, count, seed, writer):
+        for record, stats in self.run(count, seed):
+            if writer is not None:
+                writer.writerow(stats)
+            if record is not None:
+                yield record
+    
+    @staticmethod
+    def start_worker(capacities):
+        """Pool initializer: one generator per process, reused for every level"""
+        LevelBatch.worker = (Simulation(generate=False), LevelFormat(capacities))
+    
+    @staticmethod
+    def generate(seed):
+        sim, level_format = LevelBatch.worker
+        start = time.perf_counter()
+        sim.generate_level(seed)
+        generation_ms = (time.perf_counter() - start) * 1000
+        
+        level = sim.current_level()
+        fits = level_format.fits(level)
+        stats = {
+            'seed': seed,
+            'fits': fits,
+            'platforms': len(sim.platforms),
+            'reachable_fraction': len(sim.reachability.reachable) / len(sim.platforms),
+            'enemies': len(sim.enemies),
+            'coins': len(sim.coins),
+            'power_ups': len(sim.power_ups),
+            'pruned': sim.pruned_objects,
+            'attempts': sim.placement_attempts,
+            'retries': sim.rejected_layouts,
+            'generation_ms': round(generation_ms, 3)
+        }
+        return level_format.encode(level) if fits else None, stats
+
+class Chunk:
+    """One CHUNK_WIDTH-wide slice of an endless world.
+    
+    Holds a level generated for the chunk's seed, moved from screen
+    coordinates to the chunk's place in the world.
+    """
+    def __init__(self, index, level):
+        self.index = index
+        self.left = index * CHUNK_WIDTH
+        self.right = self.left + CHUNK_WIDTH
+        self.seed, self.platforms, _, self.enemies, self.coins, self.power_ups = level
+        self.shift(self.left)
+        for enemy in self.enemies:
+            enemy.min_x = self.left
+            enemy.max_x = self.right
+    
+    def shift(self, dx):
+        """Move everything in the chunk dx pixels to the right"""
+        for platform in self.platforms:
+            platform.x += dx
+            platform.rect.x += dx
+        for enemy in self.enemies:
+            enemy.x += dx
+            enemy.prev_x += dx
+        for coin in self.coins:
+            coin.x += dx
+        for power_up in self.power_ups:
+            power_up.x += dx
+    
+    def serialize(self, level_format):
+        """Encode what is left of the chunk (uncollected items, live enemies) in screen coordinates"""
+        self.shift(-self.left)
+        return level_format.encode((self.seed, self.platforms, None, 
+                                    [enemy for enemy in self.enemies if enemy.alive], 
+                                    [coin for coin in self.coins if not coin.collected], 
+                                    [power_up for power_up in self.power_ups if not power_up.collected]))
+
+class ChunkedWorld:
+    """Endless horizontally scrolling world, generated one chunk at a time.
+    
+    Chunk i is generated from a seed derived from the world seed and i when
+    the player comes within CHUNK_LOAD_RADIUS chunks of it. Chunks ahead of
+    the active ones are generated on a background thread, so crossing into a
+    new chunk doesn't stall a tick. Only chunks within CHUNK_ACTIVE_RADIUS
+    are simulated and drawn. Chunks left further than CHUNK_KEEP_RADIUS
+    behind are serialized with LevelFormat into a bounded archive, so memory
+    stays flat however far the player goes.
+    """
+    def __init__(self, seed):
+        # Generates chunks the producer hasn't got to
+        self.generator = Simulation(generate=False)
+        self.format = LevelFormat((VECTOR_ENV_MAX_PLATFORMS, VECTOR_ENV_MAX_ENEMIES, 
+                                   VECTOR_ENV_MAX_COINS, VECTOR_ENV_MAX_POWER_UPS))
+        # Chunk requests in, finished chunks out, tagged with the world they belong to
+        self.requests = queue.Queue()
+        self.finished = queue.Queue()
+        self.generation = 0
+        self.thread = threading.Thread(target=self.produce, daemon=True)
+        self.thread.start()
+        self.reset(seed)
+    
+    def reset(self, seed):
+        """Start a new world from seed"""
+        self.generation += 1
+        self.seed = seed
+        self.chunks = {}
+        self.archive = OrderedDict()
+        self.prefetched = {}
+        self.requested = set()
+        self.center = None
+        self.active = []
+    
+    def produce(self):
+        generator = Simulation(generate=False)
+        while True:
+            request = self.requests.get()
+            if request is None:
+                return
+            generation, index, seed = request
+            generator.generate_level(seed)
+            self.finished.put((generation, Chunk(index, generator.current_level())))
+    
+    def chunk_seed(self, index):
+        return (self.seed + index * 0x9E3779B9) % 2**32
+    
+    def chunk_index(self, x):
+        return max(0, math.floor(x / CHUNK_WIDTH))
+    
+    def update(self, x):
+        """Load and evict chunks around world x and return whether the active chunks changed"""
+        self.collect()
+        center = self.chunk_index(x)
+        if center == self.center:
+            return False
+        self.center = center
+        
+        for index in [index for index in self.chunks if abs(index - center) > CHUNK_KEEP_RADIUS]:
+            self.evict(index)
+        for index in [index for index in self.prefetched if abs(index - center) > CHUNK_KEEP_RADIUS]:
+            del self.prefetched[index]
+        for index in range(max(0, center - CHUNK_LOAD_RADIUS), center + CHUNK_LOAD_RADIUS + 1):
+            if index in self.chunks:
+                continue
+            if abs(index - center) <= CHUNK_ACTIVE_RADIUS or index in self.archive:
+                self.chunks[index] = self.load(index)
+            elif index not in self.prefetched and index not in self.requested:
+                self.requested.add(index)
+                self.requests.put((self.generation, index, self.chunk_seed(index)))
+        
+        self.active = [self.chunks[index] 
+                       for index in range(max(0, center - CHUNK_ACTIVE_RADIUS), center + CHUNK_ACTIVE_RADIUS + 1)]
+        return True
+    
+    def collect(self):
+        """Take chunks the producer has finished since the last call"""
+        while True:
+            try:
+                generation, chunk = self.finished.get_nowait()
+            except queue.Empty:
+                return
+            if generation == self.generation:
+                self.requested.discard(chunk.index)
+                if chunk.index not in self.chunks:
+                    self.prefetched[chunk.index] = chunk
+    
+    def load(self, index):
+        """Restore a chunk from the archive, take it from the producer, or generate it from its seed"""
+        if index in self.archive:
+            return Chunk(index, self.format.decode(self.archive.pop(index)))
+        if index in self.prefetched:
+            return self.prefetched.pop(index)
+        self.generator.generate_level(self.chunk_seed(index))
+        return Chunk(index, self.generator.current_level())
+    
+    def evict(self, index):
+        self.archive[index] = self.chunks.pop(index).serialize(self.format)
+        if len(self.archive) > CHUNK_ARCHIVE_SIZE:
+            self.archive.popitem(last=False)
+    
+    def close(self):
+        """Stop the background producer"""
+        self.requests.put(None)
+        self.thread.join()
+    
+    def spawn_x(self, x):
+        """Where the player respawns after dying at world x: the spawn point of that chunk"""
+        return self.chunk_index(x) * CHUNK_WIDTH + 100
+    
+    def active_level(self):
+        """(platforms, platform grid, enemies, coins, power-ups) of the active chunks"""
+        platforms = [platform for chunk in self.active for platform in chunk.platforms]
+        return (platforms, Simulation.build_platform_grid(platforms), 
+                [enemy for chunk in self.active for enemy in chunk.enemies], 
+                [coin for chunk in self.active for coin in chunk.coins], 
+                [power_up for chunk in self.active for power_up in chunk.power_ups])
+        
+class VectorEnv:
+    """Steps many independent headless games in lockstep with NumPy.
+    
+    Each game follows the same rules as Simulation.step, but all entity state
+    lives in (num_envs, slots) arrays so physics and collisions run batched.
+    Levels come from Simulation's generators and are padded to fixed slot
+    counts. Actions are ints made of ACTION_LEFT | ACTION_RIGHT | ACTION_JUMP
+    bits. step() returns (observations, rewards, dones). Rewards are score
+    gained, and finished games are reset to a fresh level straight away.
+    
+    Generating a level takes milliseconds, far longer than a step, so with
+    many environments reset() is dominated by generation. Pass a
+    level_library file to load levels from it in order instead.
+    """
+    def __init__(self, num_envs, max_platforms=VECTOR_ENV_MAX_PLATFORMS, max_enemies=VECTOR_ENV_MAX_ENEMIES,
+                 max_coins=VECTOR_ENV_MAX_COINS, max_power_ups=VECTOR_ENV_MAX_POWER_UPS, seed=None, 
+                 level_library=None):
+        self.num_envs = num_envs
+        self.observation_size = 12 + 4 * max_platforms + 5 * max_enemies + 3 * max_coins + 4 * max_power_ups
+        shape = (num_envs,)
+        
+        # Player
+        self.player_x = np.zeros(shape)
+        self.player_y = np.zeros(shape)
+        self.player_vel_x = np.zeros(shape)
+        self.player_vel_y = np.zeros(shape)
+        self.on_ground = np.zeros(shape, dtype=bool)
+        # Power-up effects are active while ticks <= their end time
+        self.power_up_end = np.zeros((num_envs, len(PowerUp.power_types)))
+        
+        # Game state
+        self.ticks = np.zeros(shape)
+        self.score = np.zeros(shape)
+        self.lives = np.zeros(shape, dtype=np.int32)
+        self.combo_multiplier = np.ones(shape)
+        self.combo_timer = np.zeros(shape)
+        self.invulnerable = np.zeros(shape, dtype=bool)
+        self.invulnerable_time = np.zeros(shape)
+        self.game_won = np.zeros(shape, dtype=bool)
+        self.game_over = np.zeros(shape, dtype=bool)
+        
+        # Platform edges, padded with empty rects far off screen
+        self.platform_left = np.zeros((num_envs, max_platforms), dtype=np.int32)
+        self.platform_top = np.zeros((num_envs, max_platforms), dtype=np.int32)
+        self.platform_right = np.zeros((num_envs, max_platforms), dtype=np.int32)
+        self.platform_bottom = np.zeros((num_envs, max_platforms), dtype=np.int32)
+        
+        # Enemies, padded with dead ones
+        self.enemy_x = np.zeros((num_envs, max_enemies))
+        self.enemy_y = np.zeros((num_envs, max_enemies))
+        self.enemy_vel_x = np.zeros((num_envs, max_enemies))
+        self.enemy_vel_y = np.zeros((num_envs, max_enemies))
+        self.enemy_width = np.zeros((num_envs, max_enemies))
+        self.enemy_height = np.zeros((num_envs, max_enemies))
+        self.enemy_alive = np.zeros((num_envs, max_enemies), dtype=bool)
+        self.enemy_on_ground = np.zeros((num_envs, max_enemies), dtype=bool)
+        self.enemy_ghost = np.zeros((num_envs, max_enemies), dtype=bool)
+        self.enemy_spiky = np.zeros((num_envs, max_enemies), dtype=bool)
+        
+        # Coins and power-ups, padded with collected ones
+        self.coin_x = np.zeros((num_envs, max_coins))
+        self.coin_y = np.zeros((num_envs, max_coins))
+        self.coin_collected = np.ones((num_envs, max_coins), dtype=bool)
+        self.power_up_x = np.zeros((num_envs, max_power_ups))
+        self.power_up_y = np.zeros((num_envs, max_power_ups))
+        self.power_up_type = np.zeros((num_envs, max_power_ups), dtype=np.int32)
+        self.power_up_duration = np.zeros((num_envs, max_power_ups))
+        self.power_up_collected = np.ones((num_envs, max_power_ups), dtype=bool)
+        
+        # Observation rows, see observe(); platform columns only change when a level is loaded
+        self.observations = np.zeros((num_envs, self.observation_size), dtype=np.float32)
+        
+        # Source of new levels; a seed makes the sequence of levels repeatable
+        self.level_source = Simulation(seed, generate=level_library is None)
+        
+        # Levels from a library file are used in order instead of generated
+        self.level_library = LevelLibrary(level_library) if level_library else None
+        self.library_index = 0
+        if self.level_library is not None:
+            slots = (max_platforms, max_enemies, max_coins, max_power_ups)
+            if any(capacity > slot for capacity, slot in zip(self.level_library.format.capacities, slots)):
+                self.level_library.close()
+                raise ValueError(f"{level_library} has {self.level_library.format.capacities} slots, "
+                                 f"more than the environments' {slots}")
+    
+    def reset(self):
+        """Start a new game in every environment and return the observations"""
+        for index in range(self.num_envs):
+            self.reset_env(index)
+        return self.observe()
+    
+    def reset_env(self, index):
+        """Start a new game on a freshly generated (or the next library) level in one environment"""
+        while True:
+            if self.level_library is not None:
+                self.level_source.regenerate_level(level=self.next_library_level())
+            else:
+                self.level_source.regenerate_level()
+            if self.load_level(index, self.level_source):
+                break
+        
+        self.player_x[index] = 100
+        self.player_y[index] = 400
+        self.player_vel_x[index] = 0
+        self.player_vel_y[index] = 0
+        self.on_ground[index] = False
+        self.power_up_end[index] = -1
+        self.ticks[index] = 0
+        self.score[index] = 0
+        self.lives[index] = 3
+        self.combo_multiplier[index] = 1
+        self.combo_timer[index] = 0
+        self.invulnerable[index] = False
+        self.invulnerable_time[index] = 0
+        self.game_won[index] = False
+        self.game_over[index] = False
+    
+    def next_library_level(self):
+        """Next level from the library, starting over after the last one"""
+        level = self.level_library.load(self.library_index % len(self.level_library))
+        self.library_index += 1
+        return level
+    
+    def load_level(self, index, sim):
+        """Copy a Simulation's level into one environment's slots.
+        
+        Returns False, leaving the environment untouched, if the level has
+        more objects than there are slots.
+        """
+        if (len(sim.platforms) > self.platform_left.shape[1] or len(sim.enemies) > self.enemy_x.shape[1] or
+                len(sim.coins) > self.coin_x.shape[1] or len(sim.power_ups) > self.power_up_x.shape[1]):
+            return False
+        
+        self.platform_left[index] = -1000000
+        self.platform_top[index] = -1000000
+        self.platform_right[index] = -1000000
+        self.platform_bottom[index] = -1000000
+        for slot, platform in enumerate(sim.platforms):
+            rect = platform.rect
+            self.platform_left[index, slot] = rect.left
+            self.platform_top[index, slot] = rect.top
+            self.platform_right[index, slot] = rect.right
+            self.platform_bottom[index, slot] = rect.bottom
+        self.observations[index, 12:12 + 4 * self.platform_left.shape[1]] = np.concatenate([
+            self.platform_left[index], self.platform_top[index], self.platform_right[index], self.platform_bottom[index]])
+        
+        self.enemy_alive[index] = False
+        for slot, enemy in enumerate(sim.enemies):
+            self.enemy_x[index, slot] = enemy.x
+            self.enemy_y[index, slot] = enemy.y
+            self.enemy_vel_x[index, slot] = enemy.vel_x
+            self.enemy_vel_y[index, slot] = enemy.vel_y
+            self.enemy_width[index, slot] = enemy.width
+            self.enemy_height[index, slot] = enemy.height
+            self.enemy_alive[index, slot] = enemy.alive
+            self.enemy_on_ground[index, slot] = enemy.on_ground
+            self.enemy_ghost[index, slot] = enemy.enemy_type == 'ghost'
+            self.enemy_spiky[index, slot] = enemy.enemy_type == 'spiky'
+        
+        self.coin_collected[index] = True
+        for slot, coin in enumerate(sim.coins):
+            self.coin_x[index, slot] = coin.x
+            self.coin_y[index, slot] = coin.y
+            self.coin_collected[index, slot] = coin.collected
+        
+        self.power_up_collected[index] = True
+        for slot, power_up in enumerate(sim.power_ups):
+            self.power_up_x[index, slot] = power_up.x
+            self.power_up_y[index, slot] = power_up.y
+            self.power_up_type[index, slot] = PowerUp.power_types.index(power_up.power_type)
+            self.power_up_duration[index, slot] = power_up.effect_duration
+            self.power_up_collected[index, slot] = power_up.collected
+        return True
+    
+    @staticmethod
+    def rect(x, y, width, height):
+        """Edges (left, top, right, bottom) of pygame.Rect(x, y, width, height), which truncates"""
+        left = np.trunc(x).astype(np.int32)
+        top = np.trunc(y).astype(np.int32)
+        return left, top, left + np.trunc(width).astype(np.int32), top + np.trunc(height).astype(np.int32)
+    
+    @staticmethod
+    def overlaps(rect, other):
+        """Vectorized pygame.Rect.colliderect on edge tuples from rect()"""
+        left, top, right, bottom = rect
+        other_left, other_top, other_right, other_bottom = other
+        return (left < other_right) & (other_left < right) & (top < other_bottom) & (other_top < bottom)
+    
+    def platforms(self, ndim):
+        """Platform edges shaped to broadcast against (num_envs,) or (num_envs, slots) rects"""
+        edges = (self.platform_left, self.platform_top, self.platform_right, self.platform_bottom)
+        if ndim == 2:
+            return tuple(edge[:, None] for edge in edges)
+        return edges
+    
+    def first_platform_hit(self, x, y, width, height, velocity, vertical=False):
+        """Whether each rect moving by velocity along one axis hits a platform, and that platform's edges.
+        
+        Mirrors SpatialGrid.sweep and the loops in Player.update and
+        Enemy.update: a platform is hit if the rect ends up overlapping it or
+        the rect's leading edge crosses it on the way, and the first hit in
+        order of impact wins, ties going to level order. Vertical moves only
+        count tops the rect started above and bottoms it started below, within
+        5 pixels. x and y are (num_envs,) or (num_envs, slots) arrays.
+        """
+        left, top, right, bottom = self.rect(x, y, width, height)
+        platform_left, platform_top, platform_right, platform_bottom = self.platforms(x.ndim)
+        forward = velocity >= 0
+        if vertical:
+            start, end, size = top, np.trunc(y + velocity).astype(np.int32), bottom - top
+            across = (left[..., None] < platform_right) & (platform_left < right[..., None])
+            near, far = platform_top, platform_bottom
+            near_edges, far_edges = self.platform_top, self.platform_bottom
+        else:
+            start, end, size = left, np.trunc(x + velocity).astype(np.int32), right - left
+            across = (top[..., None] < platform_bottom) & (platform_top < bottom[..., None])
+            near, far = platform_left, platform_right
+            near_edges, far_edges = self.platform_left, self.platform_right
+        
+        # Overlapping at the end, or crossed on the way forward or back
+        lead = np.where(forward, start + size, 1 << 30)[..., None]
+        trail = np.where(forward, -1 << 30, start)[..., None]
+        reach = (end + size)[..., None]
+        end = end[..., None]
+        hits = across & (((near < reach) & ((lead <= near) | (end < far))) | ((end < far) & (far <= trail)))
+        if vertical:
+            # Same tolerance as Player.update, as whole pixels
+            lowest = np.where(velocity > 0, np.ceil(y + height) - 5, np.where(velocity < 0, -1 << 30, 1 << 30))
+            highest = np.where(velocity < 0, np.floor(y) + 5, 1 << 30)
+            lowest, highest = lowest.astype(np.int32), highest.astype(np.int32)
+            hits &= (near >= lowest[..., None]) & (far <= highest[..., None])
+        
+        # Level order is right unless a moving rect hits several platforms, which is rare
+        first = hits.argmax(axis=-1)
+        crowded = np.nonzero((end[..., 0] != start) & (hits.sum(axis=-1) > 1))
+        if crowded[0].size:
+            rows = crowded[0]
+            keys = np.where(forward[crowded][:, None], near_edges[rows], -far_edges[rows])
+            first[crowded] = np.where(hits[crowded], keys, np.iinfo(np.int32).max).argmin(axis=-1)
+        
+        rows = np.arange(self.num_envs).reshape((-1,) + (1,) * (x.ndim - 1))
+        hit = hits.any(axis=-1)
+        return (hit, self.platform_left[rows, first], self.platform_top[rows, first],
+                self.platform_right[rows, first], self.platform_bottom[rows, first])
+    
+    def step(self, actions):
+        """Advance every environment by one tick.
+        
+        Returns (observations, rewards, dones). Environments that finished
+        are reset before their observation is taken.
+        """
+        actions = np.asarray(actions)
+        score_before = self.score.copy()
+        self.ticks += TICK_MS
+        
+        # Game over when time runs out; nothing else in such a tick counts
+        timed_out = self.level_source.countdown_duration - self.ticks / 1000 <= 0
+        self.game_over |= timed_out
+        
+        self.update_player(actions)
+        
+        # Update invulnerability
+        self.invulnerable &= ~(self.ticks - self.invulnerable_time > self.level_source.invulnerable_duration)
+        
+        # Update combo timer
+        counting = self.combo_timer > 0
+        self.combo_timer[counting] -= TICK_MS
+        self.combo_multiplier[counting & (self.combo_timer <= 0)] = 1
+        
+        self.update_enemies()
+        self.check_collisions()
+        
+        # Win once every coin is collected
+        self.game_won |= self.coin_collected.all(axis=1)
+        
+        rewards = np.where(timed_out, 0, self.score - score_before)
+        dones = self.game_won | self.game_over
+        for index in np.flatnonzero(dones):
+            self.reset_env(index)
+        return self.observe(), rewards, dones
+    
+    def update_player(self, actions):
+        """Vectorized Player.update"""
+        speed_boost, jump_boost = (self.ticks[:, None] <= self.power_up_end[:, :2]).T
+        current_speed = np.where(speed_boost, PLAYER_SPEED * 1.5, PLAYER_SPEED)
+        
+        # Horizontal movement, left wins when both are held
+        left = (actions & ACTION_LEFT) != 0
+        right = (actions & ACTION_RIGHT) != 0
+        self.player_vel_x = np.where(left, -current_speed, np.where(right, current_speed, 0.0))
+        
+        # Jumping with power-up enhancement
+        jumping = ((actions & ACTION_JUMP) != 0) & self.on_ground
+        jump_strength = np.where(jump_boost, JUMP_STRENGTH * 1.3, JUMP_STRENGTH)
+        self.player_vel_y = np.where(jumping, jump_strength, self.player_vel_y) + GRAVITY
+        old_y = self.player_y
+        
+        # Horizontal position and collisions along the whole move
+        hit, platform_left, _, platform_right, _ = self.first_platform_hit(self.player_x, old_y, 32, 32,
+                                                                           self.player_vel_x)
+        self.player_x = self.player_x + self.player_vel_x
+        self.player_x = np.where(hit & (self.player_vel_x > 0), platform_left - 32,
+                                 np.where(hit & (self.player_vel_x < 0), platform_right, self.player_x))
+        self.player_vel_x[hit] = 0
+        
+        # Vertical position and collisions
+        hit, _, platform_top, _, platform_bottom = self.first_platform_hit(self.player_x, old_y, 32, 32,
+                                                                           self.player_vel_y, vertical=True)
+        self.player_y = self.player_y + self.player_vel_y
+        landed = hit & (self.player_vel_y > 0)
+        bumped = hit & (self.player_vel_y < 0)
+        self.player_y = np.where(landed, platform_top - 32, np.where(bumped, platform_bottom, self.player_y))
+        self.player_vel_y[landed | bumped] = 0
+        self.on_ground = landed
+        
+        # Keep player on screen
+        np.clip(self.player_x, 0, SCREEN_WIDTH - 32, out=self.player_x)
+        grounded = self.player_y > SCREEN_HEIGHT - 32
+        self.player_y[grounded] = SCREEN_HEIGHT - 32
+        self.player_vel_y[grounded] = 0
+        self.on_ground |= grounded
+    
+    def update_enemies(self):
+        """Vectorized Enemy.update and Enemy.check_platform_edges"""
+        width = self.enemy_width
+        height = self.enemy_height
+        flying = self.enemy_alive & self.enemy_ghost
+        walking = self.enemy_alive & ~self.enemy_ghost
+        
+        # Ghosts fly horizontally, ignore gravity and turn at screen edges
+        self.enemy_x = np.where(flying, self.enemy_x + self.enemy_vel_x, self.enemy_x)
+        at_edge = (self.enemy_x <= 0) | (self.enemy_x >= SCREEN_WIDTH - width)
+        self.enemy_vel_x = np.where(flying & at_edge, -self.enemy_vel_x, self.enemy_vel_x)
+        
+        # Everyone else walks under gravity
+        old_y = self.enemy_y
+        self.enemy_vel_y = np.where(walking, self.enemy_vel_y + GRAVITY, self.enemy_vel_y)
+        
+        # Horizontal collisions along the whole move reverse direction
+        hit, platform_left, _, platform_right, _ = self.first_platform_hit(self.enemy_x, old_y, width, height,
+                                                                           self.enemy_vel_x)
+        hit &= walking
+        self.enemy_x = np.where(walking, self.enemy_x + self.enemy_vel_x, self.enemy_x)
+        self.enemy_x = np.where(hit & (self.enemy_vel_x > 0), platform_left - width,
+                                np.where(hit & (self.enemy_vel_x < 0), platform_right, self.enemy_x))
+        self.enemy_vel_x = np.where(hit, -self.enemy_vel_x, self.enemy_vel_x)
+        
+        # Vertical collisions
+        hit, _, platform_top, _, platform_bottom = self.first_platform_hit(self.enemy_x, old_y, width, height,
+                                                                           self.enemy_vel_y, vertical=True)
+        hit &= walking
+        self.enemy_y = np.where(walking, self.enemy_y + self.enemy_vel_y, self.enemy_y)
+        landed = hit & (self.enemy_vel_y > 0)
+        bumped = hit & (self.enemy_vel_y < 0)
+        self.enemy_y = np.where(landed, platform_top - height, np.where(bumped, platform_bottom, self.enemy_y))
+        self.enemy_vel_y[landed | bumped] = 0
+        self.enemy_on_ground = np.where(walking, landed, self.enemy_on_ground)
+        
+        # Ground collision
+        grounded = walking & (self.enemy_y > SCREEN_HEIGHT - height)
+        self.enemy_y = np.where(grounded, SCREEN_HEIGHT - height, self.enemy_y)
+        self.enemy_vel_y[grounded] = 0
+        self.enemy_on_ground |= grounded
+        
+        # Reverse direction at screen edges
+        at_edge = (self.enemy_x <= 0) | (self.enemy_x >= SCREEN_WIDTH - width)
+        self.enemy_vel_x = np.where(walking & at_edge, -self.enemy_vel_x, self.enemy_vel_x)
+        
+        # Turn around when there is no platform just ahead of the feet
+        look_ahead_x = self.enemy_x + np.where(self.enemy_vel_x > 0, 10, -10)
+        foot_rect = tuple(edge[..., None] for edge in self.rect(look_ahead_x, self.enemy_y + height, 5, 10))
+        ahead = self.overlaps(foot_rect, self.platforms(2)).any(axis=-1)
+        turning = walking & self.enemy_on_ground & ~ahead
+        self.enemy_vel_x = np.where(turning, -self.enemy_vel_x, self.enemy_vel_x)
+    
+        # Walking enemies that run into each other turn away. Simulation goes pair by pair in 
+        # slot order, so the last touching pair an enemy is in decides which way it faces
+        edges = self.rect(self.enemy_x, self.enemy_y, width, height)
+        slots = self.enemy_x.shape[1]
+        first, second = np.triu_indices(slots, 1)
+        touching = walking[:, first] & walking[:, second] & self.overlaps(tuple(edge[:, first] for edge in edges), 
+                                                                          tuple(edge[:, second] for edge in edges))
+        rows = np.flatnonzero(touching.any(axis=1))
+        if not rows.size:
+            return
+        slot = np.arange(slots)
+        in_pair = touching[rows, :, None] & ((first[:, None] == slot) | (second[:, None] == slot))
+        last = len(first) - 1 - in_pair[:, ::-1].argmax(axis=1)
+        is_first = first[last] == slot
+        partner = np.where(is_first, second[last], first[last])
+        x = self.enemy_x[rows]
+        partner_x = np.take_along_axis(x, partner, axis=1)
+        # The one on the left (the lower slot when level) turns left, the other right
+        goes_left = np.where(is_first, x <= partner_x, x < partner_x)
+        vel_x = self.enemy_vel_x[rows]
+        turn = in_pair.any(axis=1) & np.where(goes_left, vel_x > 0, vel_x < 0)
+        self.enemy_vel_x[rows] = np.where(turn, -vel_x, vel_x)
+    
+    def check_collisions(self):
+        """Vectorized Simulation.check_collisions"""
+        # Rect of the player before anything here moves it
+        player_rect = self.rect(self.player_x, self.player_y, 32, 32)
+        invincible_power = self.ticks <= self.power_up_end[:, 2]
+        
+        # Player vs enemies, one slot at a time since a stomp or a lost life
+        # changes what the next enemy sees
+        for slot in range(self.enemy_x.shape[1]):
+            enemy_y = self.enemy_y[:, slot]
+            enemy_rect = self.rect(self.enemy_x[:, slot], enemy_y, self.enemy_width[:, slot], self.enemy_height[:, slot])
+            touching = self.enemy_alive[:, slot] & self.overlaps(player_rect, enemy_rect)
+            if not touching.any():
+                continue
+            
+            spiky = self.enemy_spiky[:, slot]
+            stomped = touching & ~spiky & (self.player_vel_y > 0) & (self.player_y < enemy_y)
+            hurt = touching & (spiky | ~stomped) & ~self.invulnerable & ~invincible_power
+            
+            self.enemy_alive[stomped, slot] = False
+            self.player_vel_y[stomped] = JUMP_STRENGTH // 2  # Small bounce
+            self.score[stomped] += 100 * self.combo_multiplier[stomped]
+            self.combo_multiplier[stomped] = np.minimum(5, self.combo_multiplier[stomped] + 1)
+            self.combo_timer[stomped] = 3000
+            
+            self.lose_life(hurt)
+        
+        # Player vs coins (with magnet effect); the pull shows up in next tick's rects
+        coin_rect = self.rect(self.coin_x, self.coin_y, 16, 16)
+        magnet = (self.ticks <= self.power_up_end[:, 3])[:, None] & ~self.coin_collected
+        dx = self.player_x[:, None] - self.coin_x
+        dy = self.player_y[:, None] - self.coin_y
+        pulled = magnet & (dx * dx + dy * dy < 100 * 100)
+        self.coin_x = np.where(pulled, self.coin_x + dx * 0.1, self.coin_x)
+        self.coin_y = np.where(pulled, self.coin_y + dy * 0.1, self.coin_y)
+        
+        player_rect = tuple(edge[:, None] for edge in player_rect)
+        collected = ~self.coin_collected & self.overlaps(player_rect, coin_rect)
+        self.coin_collected |= collected
+        self.score += 50 * self.combo_multiplier * collected.sum(axis=1)
+        
+        # Player vs power-ups
+        collected = ~self.power_up_collected & self.overlaps(
+            player_rect, self.rect(self.power_up_x, self.power_up_y, 20, 20))
+        if collected.any():
+            self.power_up_collected |= collected
+            self.score += 200 * collected.sum(axis=1)
+            for power_index in range(len(PowerUp.power_types)):
+                applied = collected & (self.power_up_type == power_index)
+                end_time = self.ticks + np.max(np.where(applied, self.power_up_duration, -np.inf), axis=1)
+                self.power_up_end[:, power_index] = np.where(applied.any(axis=1), end_time,
+                                                             self.power_up_end[:, power_index])
+    
+    def lose_life(self, mask):
+        """Vectorized Simulation.lose_life for the environments in mask"""
+        if not mask.any():
+            return
+        self.lives -= mask
+        self.player_x[mask] = 100
+        self.player_y[mask] = 400
+        self.player_vel_x[mask] = 0
+        self.player_vel_y[mask] = 0
+        
+        out_of_lives = mask & (self.lives <= 0)
+        self.game_over |= out_of_lives
+        protected = mask & ~out_of_lives
+        self.invulnerable |= protected
+        self.invulnerable_time[protected] = self.ticks[protected]
+    
+    def observe(self):
+        """Observation rows: player state, then every slot relative to the player.
+        
+        Layout per environment: 12 player values (position, velocity, on
+        ground, the four power-up effects, invulnerable, lives, seconds left),
+        then platforms (left, top, right, bottom), enemies (dx, dy, vel_x, alive,
+        spiky), coins (dx, dy, present) and power-ups (dx, dy, present, type).
+        """
+        observations = self.observations
+        player_x = self.player_x[:, None]
+        player_y = self.player_y[:, None]
+        observations[:, :12] = np.column_stack([
+            self.player_x, self.player_y, self.player_vel_x, self.player_vel_y, self.on_ground,
+            self.ticks[:, None] <= self.power_up_end, self.invulnerable, self.lives,
+            np.maximum(0, self.level_source.countdown_duration - self.ticks / 1000)])
+        
+        column = 12 + 4 * self.platform_left.shape[1]
+        for block in (self.enemy_x - player_x, self.enemy_y - player_y, self.enemy_vel_x, self.enemy_alive,
+                      self.enemy_spiky, self.coin_x - player_x, self.coin_y - player_y, ~self.coin_collected,
+                      self.power_up_x - player_x, self.power_up_y - player_y, ~self.power_up_collected,
+                      self.power_up_type):
+            observations[:, column:column + block.shape[1]] = block
+            column += block.shape[1]
+        return observations.copy()
+
+class RolloutRunner:
+    """Plays scripted episodes on headless Simulations across a process pool.
+    
+    The action scripts are handed to the workers through shared memory, and
+    each worker generates an episode's level from its seed. run() yields each
+    episode's stats as soon as a worker finishes it.
+    """
+    # Shared-memory block and actions view, attached once per worker process
+    worker_actions = None
+    # Simulation reused for every episode a worker process plays
+    worker_sim = None
+    
+    def __init__(self, processes=None, shard_size=ROLLOUT_SHARD_SIZE):
+        self.processes = processes
+        self.shard_size = shard_size
+    
+    def run(self, actions, seed=0):
+        """Play one episode per row of actions (ACTION_* bits per tick) and yield a stats dict for each.
+        
+        Episode i plays a level generated from seed + i and ends when the game
+        is won or lost, or when its row of actions runs out.
+        """
+        actions = np.ascontiguousarray(actions, dtype=np.uint8)
+        block = shared_memory.SharedMemory(create=True, size=max(1, actions.nbytes))
+        try:
+            np.ndarray(actions.shape, actions.dtype, buffer=block.buf)[:] = actions
+            with multiprocessing.Pool(self.processes, initializer=RolloutRunner.attach_worker, 
+                                      initargs=(block.name, actions.shape)) as pool:
+                tasks = [(episode, seed + episode) for episode in range(len(actions))]
+                yield from pool.imap_unordered(RolloutRunner.play_episode, tasks, chunksize=self.shard_size)
+        finally:
+            block.close()
+            block.unlink()
+    
+    @staticmethod
+    def attach_worker(name, shape):
+        """Pool initializer: map the shared actions into this process"""
+        block = shared_memory.SharedMemory(name=name)
+        RolloutRunner.worker_actions = (block, np.ndarray(shape, np.uint8, buffer=block.buf))
+        RolloutRunner.worker_sim = Simulation(generate=False)
+    
+    @staticmethod
+    def play_episode(task):
+        episode, seed = task
+        _, actions = RolloutRunner.worker_actions
+        sim = RolloutRunner.worker_sim
+        sim.new_game()
+        sim.regenerate_level(seed=seed)
+        
+        coins = 0
+        deaths = 0
+        steps = 0
+        for action in actions[episode]:
+            sim.step(PlayerInput(left=bool(action & ACTION_LEFT), right=bool(action & ACTION_RIGHT), 
+                                 jump=bool(action & ACTION_JUMP)))
+            steps += 1
+            for event in sim.events:
+                if event[0] == 'coin':
+                    coins += 1
+                elif event[0] == 'life_lost':
+                    deaths += 1
+            sim.events.clear()
+            if sim.game_won or sim.game_over:
+                break
+        
+        return {
+            'episode': episode,
+            'seed': seed,
+            'score': sim.score,
+            'coins': coins,
+            'total_coins': len(sim.coins),
+            'won': sim.game_won,
+            'time_to_win': (sim.win_time - sim.start_time) / 1000 if sim.game_won else None,
+            'deaths': deaths,
+            'steps': steps
+        }
+    
+    @staticmethod
+    def summarize(stats):
+        """Aggregate per-episode stats from run()"""
+        stats = list(stats)
+        win_times = [episode['time_to_win'] for episode in stats if episode['won']]
+        return {
+            'episodes': len(stats),
+            'mean_score': sum(episode['score'] for episode in stats) / max(1, len(stats)),
+            'coins': sum(episode['coins'] for episode in stats),
+            'wins': len(win_times),
+            'mean_time_to_win': sum(win_times) / len(win_times) if win_times else None,
+            'deaths': sum(episode['deaths'] for episode in stats)
+        }
+
+class TextCache:
+    """Keeps fonts alive and memoizes rendered text surfaces"""
+    def __init__(self, max_entries=TEXT_CACHE_SIZE):
+        self.fonts = {}
+        self.surfaces = OrderedDict()
+        self.max_entries = max_entries
+    
+    def font(self, size):
+        """Return a default font of the given size, loading it only once"""
+        if size not in self.fonts:
+            self.fonts[size] = pygame.font.Font(None, size)
+        return self.fonts[size]
+    
+    def render(self, font, text, color):
+        """Render antialiased text, reusing the surface from an earlier frame when possible"""
+        key = (font, text, color)
+        surface = self.surfaces.get(key)
+        if surface is None:
+            surface = font.render(text, True, color)
+            self.surfaces[key] = surface
+            if len(self.surfaces) > self.max_entries:
+                self.surfaces.popitem(last=False)
+        else:
+            self.surfaces.move_to_end(key)
+        return surface
+
+class Camera:
+    """Maps world coordinates to the screen.
+    
+    x and y are the world position shown at the screen's top-left corner.
+    Draw passes add offset to world positions to get screen positions.
+    Shake jitters the picture by a random offset, picked once per frame in
+    begin_frame(), without moving the view itself.
+    """
+    def __init__(self, width=SCREEN_WIDTH, height=SCREEN_HEIGHT, seed=None):
+        self.width = width
+        self.height = height
+        self.x = 0
+        self.y = 0
+        
+        # Shake strength in pixels and simulated milliseconds left
+        self.shake = 0
+        self.shake_duration = 0
+        self.shake_rng = random.Random(seed)
+        
+        # Screen position = world position + offset, for the frame being drawn
+        self.offset = (0, 0)
+    
+    def add_shake(self, intensity=5, duration=300):
+        self.shake = intensity
+        self.shake_duration = duration
+    
+    def update(self):
+        """Run the shake down by one tick"""
+        if self.shake_duration > 0:
+            self.shake_duration -= TICK_MS
+            if self.shake_duration <= 0:
+                self.shake = 0
+    
+    def follow(self, x, min_x=0):
+        """Scroll so world x sits a third of the way across the screen, never left of min_x"""
+        self.x = max(min_x, int(x) - self.width // 3)
+    
+    def begin_frame(self):
+        shake_x = self.shake_rng.randint(-self.shake, self.shake) if self.shake > 0 else 0
+        shake_y = self.shake_rng.randint(-self.shake, self.shake) if self.shake > 0 else 0
+        self.offset = (shake_x - self.x, shake_y - self.y)
+    
+    def view(self, margin=VIEW_MARGIN):
+        """World rect on screen this frame, grown by margin and the shake on every side"""
+        margin += self.shake
+        return pygame.Rect(self.x - margin, self.y - margin, self.width + 2 * margin, self.height + 2 * margin)
+
+class Game:
+    def __init__(self, dirty_rects=DIRTY_RECT_RENDERING, render_fps=RENDER_FPS, 
+                 max_catch_up_steps=MAX_CATCH_UP_STEPS, seed=None, level_queue_size=LEVEL_QUEUE_SIZE, 
+                 level_library=None, endless=False):
+        # Initialize Pygame and mixer
+        pygame.init()
+        pygame.mixer.init()
         
-        if all_collected and not self.game_won:
-            self.game_won = True
-            self.win_time = pygame.time.get_ticks()
-            self.play_win_sound()  # Play win sound
-            print("Congratulations! You collected all coins!")
+        self.screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+        pygame.display.set_caption("Mario Bros Clone - Enhanced Edition")
+        self.clock = pygame.time.Clock()
+        
+        # Initialize music
+        self.music_playing = False
+        self.music_volume = 0.7
+        self.load_music()
+        
+        # Load sound effects
+        self.load_sound_effects()
+        
+        # Game rules and state
+        self.sim = Simulation(seed, endless=endless)
+        
+        # Levels from a library file are played in order instead of generated
+        self.level_library = LevelLibrary(level_library) if level_library and not endless else None
+        self.library_index = 0
+        if self.level_library is not None:
+            self.sim.regenerate_level(level=self.next_library_level())
+        
+        # Upcoming levels, generated in the background
+        self.level_queue = None
+        if self.level_library is None and level_queue_size > 0 and not endless:
+            self.level_queue = LevelQueue(seed, level_queue_size)
+        
+        # Particle system
+        self.particles = ParticleSystem(seed=seed)
+        
+        # HUD text
+        self.text_cache = TextCache()
+        self.font = self.text_cache.font(36)
+        self.small_font = self.text_cache.font(24)
+        self.instruction_font = self.text_cache.font(20)
+        
+        # Scrolling and shake
+        self.camera = Camera(seed=seed)
+        
+        # Cached background layers (built on first draw)
+        self.sky_layer = None
+        self.scenery_layer = None
+        self.background_size = None
+        self.cloud_sprites = []
+        self.cloud_drift = 0
+        self.prev_cloud_drift = 0
+        
+        # Cached end screen overlay (built on first use)
+        self.overlay = None
+        
+        # Fixed-timestep loop settings
+        self.render_fps = render_fps
+        self.max_catch_up_steps = max_catch_up_steps
+        
+        # Dirty-rect rendering state (a scrolling world repaints every frame)
+        self.dirty_rects = dirty_rects and not endless
+        self.level_layer = None
+        self.previous_rects = []
+        self.ui_rects = []
+        self.screen_shaken = False
+    
+    def add_particles(self, x, y, color, count=PARTICLE_COUNT):
+        self.particles.emit(x, y, color, count)
+    
+    def add_camera_shake(self, intensity=5, duration=300):
+        self.camera.add_shake(intensity, duration)
+    
+    def load_music(self):
+        """Load and start background music"""
+        try:
+            pygame.mixer.music.load("somegame_music.wav")
+            pygame.mixer.music.set_volume(self.music_volume)
+            pygame.mixer.music.play(-1)  # -1 means loop indefinitely
+            self.music_playing = True
+            print("Music loaded and playing successfully!")
+        except pygame.error as e:
+            print(f"Could not load music file 'somegame_music.wav': {e}")
+            print("Game will continue without music.")
+            self.music_playing = False
+    
+    def toggle_music(self):
+        """Toggle music on/off"""
+        if self.music_playing:
+            if pygame.mixer.music.get_busy():
+                pygame.mixer.music.pause()
+                print("Music paused")
+            else:
+                pygame.mixer.music.unpause()
+                print("Music resumed")
+        else:
+            # Try to reload and play music
+            self.load_music()
+    
+    def adjust_volume(self, change):
+        """Adjust music volume"""
+        self.music_volume = max(0.0, min(1.0, self.music_volume + change))
+        pygame.mixer.music.set_volume(self.music_volume)
+        print(f"Music volume: {int(self.music_volume * 100)}%")
     
     def handle_events(self):
         for event in pygame.event.get():
@@ -1821,15 +3899,15 @@ class Game:
                 if event.key == pygame.K_ESCAPE:
                     return False
                 elif event.key == pygame.K_r:  # Press R to regenerate level
-                    if self.game_won or self.game_over:
+                    if self.sim.game_won or self.sim.game_over:
                         # Reset game state
-                        self.game_won = False
-                        self.game_over = False
-                        self.win_time = 0
-                        self.lives = 3  # Reset lives
-                        self.invulnerable = False
-                        self.combo_multiplier = 1
-                        self.combo_timer = 0
+                        self.sim.game_won = False
+                        self.sim.game_over = False
+                        self.sim.win_time = 0
+                        self.sim.lives = 3  # Reset lives
+                        self.sim.invulnerable = False
+                        self.sim.combo_multiplier = 1
+                        self.sim.combo_timer = 0
                     self.regenerate_level()
                 elif event.key == pygame.K_m:  # Press M to toggle music
                     self.toggle_music()
@@ -1837,75 +3915,74 @@ class Game:
                     self.adjust_volume(0.1)
                 elif event.key == pygame.K_MINUS:  # Press - to decrease volume
                     self.adjust_volume(-0.1)
-                elif event.key == pygame.K_RETURN and (self.game_won or self.game_over):  # Press Enter to play again
-                    self.game_won = False
-                    self.game_over = False
-                    self.win_time = 0
-                    self.lives = 3  # Reset lives
-                    self.invulnerable = False
-                    self.combo_multiplier = 1
-                    self.combo_timer = 0
+                elif event.key == pygame.K_RETURN and (self.sim.game_won or self.sim.game_over):  # Press Enter to play again
+                    self.sim.game_won = False
+                    self.sim.game_over = False
+                    self.sim.win_time = 0
+                    self.sim.lives = 3  # Reset lives
+                    self.sim.invulnerable = False
+                    self.sim.combo_multiplier = 1
+                    self.sim.combo_timer = 0
                     self.regenerate_level()
         return True
     
-    def regenerate_level(self):
-        """Regenerate the entire level with new random platforms"""
-        self.platforms = self.generate_random_platforms()
-        self.enemies = self.generate_enemies()
-        self.coins = self.generate_coins()
-        self.power_ups = self.generate_power_ups()
-        
-        # Reset player position
-        self.player.x = 100
-        self.player.y = 400
-        self.player.vel_x = 0
-        self.player.vel_y = 0
+    def regenerate_level(self, seed=None):
+        """Regenerate the entire level from seed if given, otherwise take the next library or queued level"""
+        if seed is None and self.level_library is not None:
+            self.sim.regenerate_level(level=self.next_library_level())
+        elif seed is None and self.level_queue is not None:
+            self.sim.regenerate_level(level=self.level_queue.next_level())
+        else:
+            self.sim.regenerate_level(seed=seed)
         
         # Clear particles
-        self.particles = []
+        self.particles.clear()
         
-        # Reset score and timers if starting new game
-        if self.game_won or self.game_over:
-            self.score = 0
-            self.start_time = pygame.time.get_ticks()
-            self.countdown_start_time = pygame.time.get_ticks()  # Reset countdown timer
-            self.time_warning_played = False
-            
-        # Reset invulnerability when regenerating level
-        self.invulnerable = False
-        self.invulnerable_time = 0
+        # Platforms changed, so the dirty-rect restore layer is stale
+        self.level_layer = None
+    
+    def next_library_level(self):
+        """Next level from the library, starting over after the last one"""
+        level = self.level_library.load(self.library_index % len(self.level_library))
+        self.library_index += 1
+        return level
+    
+    def get_overlay(self):
+        """Return the cached semi-transparent end screen overlay"""
+        if self.overlay is None or self.overlay.get_size() != self.screen.get_size():
+            self.overlay = pygame.Surface(self.screen.get_size()).convert()
+            self.overlay.set_alpha(128)
+            self.overlay.fill(BLACK)
+        return self.overlay
     
     def draw_win_screen(self):
         """Draw the victory screen"""
         # Semi-transparent overlay
-        overlay = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
-        overlay.set_alpha(128)
-        overlay.fill(BLACK)
-        self.screen.blit(overlay, (0, 0))
+        self.screen.blit(self.get_overlay(), (0, 0))
         
         # Victory messages
-        win_font = pygame.font.Font(None, 72)
-        score_font = pygame.font.Font(None, 48)
-        instruction_font = pygame.font.Font(None, 36)
+        win_font = self.text_cache.font(72)
+        score_font = self.text_cache.font(48)
+        instruction_font = self.text_cache.font(36)
         
         # Main victory text
-        win_text = win_font.render("VICTORY!", True, YELLOW)
+        win_text = self.text_cache.render(win_font, "VICTORY!", YELLOW)
         win_rect = win_text.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2 - 80))
         self.screen.blit(win_text, win_rect)
         
         # Congratulations text
-        congrats_text = score_font.render("All Coins Collected!", True, WHITE)
+        congrats_text = self.text_cache.render(score_font, "All Coins Collected!", WHITE)
         congrats_rect = congrats_text.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2 - 20))
         self.screen.blit(congrats_text, congrats_rect)
         
         # Final score
-        final_score_text = score_font.render(f"Final Score: {self.score}", True, WHITE)
+        final_score_text = self.text_cache.render(score_font, f"Final Score: {self.sim.score}", WHITE)
         score_rect = final_score_text.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2 + 20))
         self.screen.blit(final_score_text, score_rect)
         
         # Calculate completion time correctly
-        completion_time = (self.win_time - self.start_time) // 1000
-        time_text = instruction_font.render(f"Completion Time: {completion_time}s", True, WHITE)
+        completion_time = (self.sim.win_time - self.sim.start_time) // 1000
+        time_text = self.text_cache.render(instruction_font, f"Completion Time: {completion_time}s", WHITE)
         time_rect = time_text.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2 + 60))
         self.screen.blit(time_text, time_rect)
         
@@ -1917,46 +3994,43 @@ class Game:
         ]
         
         for i, instruction in enumerate(instructions):
-            text = instruction_font.render(instruction, True, WHITE)
+            text = self.text_cache.render(instruction_font, instruction, WHITE)
             text_rect = text.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2 + 120 + i * 40))
             self.screen.blit(text, text_rect)
     
     def draw_game_over_screen(self):
         """Draw the game over screen"""
         # Semi-transparent overlay
-        overlay = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
-        overlay.set_alpha(128)
-        overlay.fill(BLACK)
-        self.screen.blit(overlay, (0, 0))
+        self.screen.blit(self.get_overlay(), (0, 0))
         
         # Game over messages
-        game_over_font = pygame.font.Font(None, 72)
-        score_font = pygame.font.Font(None, 48)
-        instruction_font = pygame.font.Font(None, 36)
+        game_over_font = self.text_cache.font(72)
+        score_font = self.text_cache.font(48)
+        instruction_font = self.text_cache.font(36)
         
         # Main game over text
-        game_over_text = game_over_font.render("GAME OVER", True, RED)
+        game_over_text = self.text_cache.render(game_over_font, "GAME OVER", RED)
         game_over_rect = game_over_text.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2 - 100))
         self.screen.blit(game_over_text, game_over_rect)
         
         # Show reason for game over
-        remaining_time = self.get_remaining_time()
+        remaining_time = self.sim.get_remaining_time()
         if remaining_time <= 0:
-            reason_text = score_font.render("Time's Up!", True, WHITE)
+            reason_text = self.text_cache.render(score_font, "Time's Up!", WHITE)
         else:
-            reason_text = score_font.render("No Lives Remaining!", True, WHITE)
+            reason_text = self.text_cache.render(score_font, "No Lives Remaining!", WHITE)
         reason_rect = reason_text.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2 - 50))
         self.screen.blit(reason_text, reason_rect)
         
         # Final score
-        final_score_text = score_font.render(f"Final Score: {self.score}", True, WHITE)
+        final_score_text = self.text_cache.render(score_font, f"Final Score: {self.sim.score}", WHITE)
         score_rect = final_score_text.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2))
         self.screen.blit(final_score_text, score_rect)
         
         # Coins collected
-        coins_collected = sum(1 for coin in self.coins if coin.collected)
-        total_coins = len(self.coins)
-        coins_text = instruction_font.render(f"Coins Collected: {coins_collected}/{total_coins}", True, WHITE)
+        coins_collected = sum(1 for coin in self.sim.coins if coin.collected)
+        total_coins = len(self.sim.coins)
+        coins_text = self.text_cache.render(instruction_font, f"Coins Collected: {coins_collected}/{total_coins}", WHITE)
         coins_rect = coins_text.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2 + 40))
         self.screen.blit(coins_text, coins_rect)
         
@@ -1968,7 +4042,7 @@ class Game:
         ]
         
         for i, instruction in enumerate(instructions):
-            text = instruction_font.render(instruction, True, WHITE)
+            text = self.text_cache.render(instruction_font, instruction, WHITE)
             text_rect = text.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2 + 100 + i * 40))
             self.screen.blit(text, text_rect)
 
@@ -1976,10 +4050,10 @@ class Game:
         """Draw lives as heart icons"""
         heart_size = 20
         heart_spacing = 25
-        start_x = SCREEN_WIDTH - (self.lives * heart_spacing + 20)
+        start_x = SCREEN_WIDTH - (self.sim.lives * heart_spacing + 20)
         start_y = 10
         
-        for i in range(self.lives):
+        for i in range(self.sim.lives):
             heart_x = start_x + i * heart_spacing
             heart_y = start_y
             
@@ -2000,181 +4074,105 @@ class Game:
             pygame.draw.circle(self.screen, (139, 0, 0), (heart_x + 5, heart_y + 5), 5, 2)
             pygame.draw.circle(self.screen, (139, 0, 0), (heart_x + 15, heart_y + 5), 5, 2)
             pygame.draw.polygon(self.screen, (139, 0, 0), heart_points, 2)
+        
+        self.ui_rects.append(pygame.Rect(start_x, start_y, self.sim.lives * heart_spacing, heart_size))
 
     def update(self):
-        if not self.game_won and not self.game_over:
-            # Check countdown timer
-            remaining_time = self.get_remaining_time()
-            
-            # Play warning sound at 30 seconds (if sound is available)
-            if remaining_time <= 30 and remaining_time > 29 and not self.time_warning_played:
-                self.time_warning_played = True
-                # You could add a warning sound here if you have one
-                print("Warning: 30 seconds remaining!")
-            
-            # Game over when time runs out
-            if remaining_time <= 0:
-                self.game_over = True
-                self.play_lose_sound()
-                print("Time's up! Game Over!")
-                return
-            
-            self.player.update(self.platforms)
-            
+        # Clouds drift with the fixed step, not the frame rate (frozen in the dirty-rect level layer)
+        if not self.dirty_rects:
+            self.prev_cloud_drift = self.cloud_drift
+            self.cloud_drift += CLOUD_DRIFT_SPEED
+        
+        if not self.sim.game_won and not self.sim.game_over:
             # Update camera shake
-            if self.camera_shake_duration > 0:
-                self.camera_shake_duration -= 1000 / FPS
-                if self.camera_shake_duration <= 0:
-                    self.camera_shake = 0
-            
-            # Update invulnerability
-            if self.invulnerable:
-                if pygame.time.get_ticks() - self.invulnerable_time > self.invulnerable_duration:
-                    self.invulnerable = False
-            
-            # Update combo timer
-            if self.combo_timer > 0:
-                self.combo_timer -= 1000 / FPS
-                if self.combo_timer <= 0:
-                    self.combo_multiplier = 1
-            
-            # Update enemies
-            for enemy in self.enemies:
-                enemy.update(self.platforms)
-                
-            # Update coins
-            for coin in self.coins:
-                coin.update()
-                
-            # Update power-ups
-            for power_up in self.power_ups:
-                power_up.update()
+            self.camera.update()
                 
             # Update particles
-            self.particles = [p for p in self.particles if p.life > 0]
-            for particle in self.particles:
-                particle.update()
+            self.particles.update()
                 
-            # Check collisions
-            self.check_collisions()
+        self.sim.step(self.read_input())
+        self.handle_simulation_events()
             
-            # Check win condition
-            self.check_win_condition()
+    def read_input(self):
+        """Map the keyboard onto simulation input"""
+        keys = pygame.key.get_pressed()
+        return PlayerInput(left=keys[pygame.K_LEFT] or keys[pygame.K_a],
+                           right=keys[pygame.K_RIGHT] or keys[pygame.K_d],
+                           jump=keys[pygame.K_SPACE] or keys[pygame.K_UP] or keys[pygame.K_w])
     
-    def check_collisions(self):
-        player_rect = pygame.Rect(self.player.x, self.player.y, self.player.width, self.player.height)
-        
-        # Player vs enemies
-        for enemy in self.enemies:
-            if enemy.alive:
-                enemy_rect = pygame.Rect(enemy.x, enemy.y, enemy.width, enemy.height)
-                if player_rect.colliderect(enemy_rect):
-                    # Special case for spiky enemies - player always dies when touching them
-                    if enemy.enemy_type == 'spiky':
-                        # Player hit by spiky enemy - always lose a life if not invulnerable
-                        if not self.invulnerable and not self.player.invincible_power:
-                            # Extra camera shake for spiky enemy (more dangerous)
-                            self.add_camera_shake(8, 500)
-                            self.lose_life()
-                    else:
-                        # For other enemies, check if player is jumping on them
-                        if self.player.vel_y > 0 and self.player.y < enemy.y:
-                            enemy.alive = False
-                            self.player.vel_y = JUMP_STRENGTH // 2  # Small bounce
-                            
-                            # Enhanced scoring with combo system
-                            points = 100 * self.combo_multiplier
-                            self.score += points
-                            self.combo_multiplier = min(5, self.combo_multiplier + 1)
-                            self.combo_timer = 3000  # 3 seconds to maintain combo
-                            
-                            # Add particles
-                            self.add_particles(enemy.x + enemy.width//2, enemy.y + enemy.height//2, 
-                                             YELLOW, 15)
-                            
-                            # Camera shake
-                            self.add_camera_shake(3, 200)
-                            
-                        else:
-                            # Player hit by enemy - lose a life if not invulnerable
-                            if not self.invulnerable and not self.player.invincible_power:
-                                self.lose_life()
-        
-        # Player vs coins (with magnet effect)
-        for coin in self.coins:
-            if not coin.collected:
-                coin_rect = pygame.Rect(coin.x, coin.y, coin.width, coin.height)
-                
-                # Magnet effect
-                if self.player.magnet_power:
-                    distance = math.sqrt((coin.x - self.player.x)**2 + (coin.y - self.player.y)**2)
-                    if distance < 100:  # Magnet range
-                        # Pull coin towards player
-                        dx = self.player.x - coin.x
-                        dy = self.player.y - coin.y
-                        coin.x += dx * 0.1
-                        coin.y += dy * 0.1
-                
-                if player_rect.colliderect(coin_rect):
-                    coin.collected = True
-                    points = 50 * self.combo_multiplier
-                    self.score += points
-                    
-                    # Add coin particles
-                    self.add_particles(coin.x + coin.width//2, coin.y + coin.height//2, 
-                                     YELLOW, 10)
-        
-        # Player vs power-ups
-        for power_up in self.power_ups:
-            if not power_up.collected:
-                power_up_rect = pygame.Rect(power_up.x, power_up.y, power_up.width, power_up.height)
-                if player_rect.colliderect(power_up_rect):
-                    power_up.collected = True
-                    self.player.apply_power_up(power_up.power_type, power_up.effect_duration)
-                    self.score += 200
-                    
-                    # Add power-up particles
-                    self.add_particles(power_up.x + power_up.width//2, power_up.y + power_up.height//2, 
-                                     power_up.color, 20)
-                    
-                    # Camera shake for power-up
-                    self.add_camera_shake(4, 250)
+    def handle_simulation_events(self):
+        """Turn simulation events into particles, camera shake, sounds and messages"""
+        for event in self.sim.events:
+            kind = event[0]
+            if kind == 'stomp':
+                self.add_particles(event[1], event[2], YELLOW, 15)
+                self.add_camera_shake(3, 200)
+            elif kind == 'coin':
+                self.add_particles(event[1], event[2], YELLOW, 10)
+            elif kind == 'power_up':
+                self.add_particles(event[1], event[2], event[3], 20)
+                self.add_camera_shake(4, 250)
+            elif kind == 'spiky_hit':
+                self.add_camera_shake(8, 500)
+            elif kind == 'life_lost':
+                print(f"Life lost! Lives remaining: {self.sim.lives}")
+                self.add_particles(event[1], event[2], RED, 25)
+                self.add_camera_shake(6, 400)
+            elif kind == 'game_over':
+                self.play_lose_sound()  # Play lose sound
+                print("Game Over!")
+            elif kind == 'time_up':
+                self.play_lose_sound()
+                print("Time's up! Game Over!")
+            elif kind == 'time_warning':
+                # You could add a warning sound here if you have one
+                print("Warning: 30 seconds remaining!")
+            elif kind == 'win':
+                self.play_win_sound()  # Play win sound
+                print("Congratulations! You collected all coins!")
+        self.sim.events.clear()
     
-    def lose_life(self):
-        """Handle losing a life"""
-        self.lives -= 1
-        print(f"Life lost! Lives remaining: {self.lives}")
-        
-        # Reset player position
-        spawn_x = 100
-        spawn_y = 400
-        self.player.x = spawn_x
-        self.player.y = spawn_y
-        self.player.vel_x = 0
-        self.player.vel_y = 0
+    def draw_background(self, alpha=1.0):
+        """Draw a beautiful background"""
+        # Static layers are rendered once and rebuilt only when the screen size changes
+        if self.background_size != self.screen.get_size():
+            self.build_background_layers()
         
-        # Add red particle effect at spawn point every time player dies
-        self.add_particles(spawn_x + self.player.width//2, 
-                         spawn_y + self.player.height//2, RED, 25)
+        # Draw sky
+        self.screen.blit(self.sky_layer, (0, 0))
         
-        # Camera shake for respawn
-        self.add_camera_shake(6, 400)
+        # Draw clouds with slow parallax drift, blended between ticks
+        self.draw_clouds(self.screen, self.prev_cloud_drift + (self.cloud_drift - self.prev_cloud_drift) * alpha)
         
-        if self.lives <= 0:
-            self.game_over = True
-            self.play_lose_sound()  # Play lose sound
-            print("Game Over!")
-        else:
-            # Make invulnerable temporarily
-            self.invulnerable = True
-            self.invulnerable_time = pygame.time.get_ticks()
+        # Draw distant mountains and sun
+        self.screen.blit(self.scenery_layer, (0, 0))
     
-    def draw_background(self):
-        """Draw a beautiful background"""
+    def build_background_layers(self):
+        """Render the static sky, mountain, sun and cloud layers into cached surfaces"""
+        self.background_size = self.screen.get_size()
+        
+        # Sky layer (opaque, drawn first)
+        self.sky_layer = pygame.Surface(self.background_size).convert()
+        self.draw_sky(self.sky_layer)
+        
+        # Scenery layer (mountains and sun) drawn over the clouds
+        self.scenery_layer = pygame.Surface(self.background_size).convert()
+        self.scenery_layer.fill(BACKGROUND_COLORKEY)
+        self.draw_mountains(self.scenery_layer)
+        self.draw_sun(self.scenery_layer)
+        self.scenery_layer.set_colorkey(BACKGROUND_COLORKEY, pygame.RLEACCEL)
+        
+        # Cloud sprites (drawn between sky and scenery)
+        self.build_cloud_sprites()
+    
+    def draw_sky(self, surface):
+        """Draw the gradient sky"""
+        width, height = surface.get_size()
+        
         # Create a gradient sky background
-        for y in range(SCREEN_HEIGHT):
+        for y in range(height):
             # Create gradient from light blue at top to lighter blue at bottom
-            ratio = y / SCREEN_HEIGHT
+            ratio = y / height
             
             # Sky colors - from dark blue at top to light blue at bottom
             top_color = (135, 206, 250)    # Light sky blue
@@ -2185,20 +4183,23 @@ class Game:
             g = int(top_color[1] + (bottom_color[1] - top_color[1]) * ratio)
             b = int(top_color[2] + (bottom_color[2] - top_color[2]) * ratio)
             
-            pygame.draw.line(self.screen, (r, g, b), (0, y), (SCREEN_WIDTH, y))
-        
-        # Draw clouds
-        self.draw_clouds()
-        
-        # Draw distant mountains
-        self.draw_mountains()
+            pygame.draw.line(surface, (r, g, b), (0, y), (width, y))
+    
+    def draw_clouds(self, surface, drift):
+        """Draw fluffy clouds in the background (one blit per cloud), drift pixels along"""
+        screen_width = surface.get_width()
         
-        # Draw sun
-        self.draw_sun()
+        for sprite, cloud_x, cloud_y, parallax in self.cloud_sprites:
+            sprite_width = sprite.get_width()
+            x = cloud_x + drift * parallax
+            
+            # Wrap clouds around once they leave the screen
+            x = (x + sprite_width) % (screen_width + sprite_width) - sprite_width
+            surface.blit(sprite, (int(x), cloud_y))
     
-    def draw_clouds(self):
-        """Draw fluffy clouds in the background"""
-        cloud_color = (255, 255, 255, 180)  # Semi-transparent white
+    def build_cloud_sprites(self):
+        """Pre-render each cloud once from a seeded RNG"""
+        cloud_rng = random.Random(CLOUD_SEED)
         
         # Create cloud positions (static for consistency)
         cloud_positions = [
@@ -2211,60 +4212,72 @@ class Game:
             (700, 140, 65)
         ]
         
+        self.cloud_sprites = []
         for cloud_x, cloud_y, cloud_size in cloud_positions:
+            # Sprite large enough for the widest and tallest circle
+            half_width = 2 * (cloud_size // 4) + cloud_size // 2 + 6
+            half_height = cloud_size // 6 + cloud_size // 2 + 6
+            sprite = pygame.Surface((half_width * 2, half_height * 2), pygame.SRCALPHA)
+            
             # Draw multiple overlapping circles to create cloud shape
             for i in range(5):
                 offset_x = (i - 2) * (cloud_size // 4)
-                offset_y = random.randint(-cloud_size//6, cloud_size//6)
-                radius = cloud_size // 2 + random.randint(-5, 5)
+                offset_y = cloud_rng.randint(-cloud_size//6, cloud_size//6)
+                radius = cloud_size // 2 + cloud_rng.randint(-5, 5)
                 
                 # Main cloud body
-                pygame.draw.circle(self.screen, (255, 255, 255), 
-                                 (cloud_x + offset_x, cloud_y + offset_y), radius)
+                pygame.draw.circle(sprite, (255, 255, 255), 
+                                 (half_width + offset_x, half_height + offset_y), radius)
                 
                 # Cloud highlight
-                pygame.draw.circle(self.screen, (240, 248, 255), 
-                                 (cloud_x + offset_x - 3, cloud_y + offset_y - 3), radius - 5)
+                pygame.draw.circle(sprite, (240, 248, 255), 
+                                 (half_width + offset_x - 3, half_height + offset_y - 3), radius - 5)
+            
+            # Smaller clouds are further away and drift slower
+            parallax = cloud_size / 80
+            self.cloud_sprites.append((sprite.convert_alpha(), cloud_x - half_width, 
+                                       cloud_y - half_height, parallax))
     
-    def draw_mountains(self):
+    def draw_mountains(self, surface):
         """Draw distant mountains"""
+        screen_width, screen_height = surface.get_size()
         mountain_color = (119, 136, 153)  # Light slate gray
         mountain_dark = (105, 105, 105)   # Dim gray
         
         # Back mountains (darker, further)
         back_mountain_points = [
-            (0, SCREEN_HEIGHT - 200),
-            (150, SCREEN_HEIGHT - 300),
-            (300, SCREEN_HEIGHT - 250),
-            (450, SCREEN_HEIGHT - 320),
-            (600, SCREEN_HEIGHT - 280),
-            (SCREEN_WIDTH, SCREEN_HEIGHT - 220),
-            (SCREEN_WIDTH, SCREEN_HEIGHT),
-            (0, SCREEN_HEIGHT)
+            (0, screen_height - 200),
+            (150, screen_height - 300),
+            (300, screen_height - 250),
+            (450, screen_height - 320),
+            (600, screen_height - 280),
+            (screen_width, screen_height - 220),
+            (screen_width, screen_height),
+            (0, screen_height)
         ]
-        pygame.draw.polygon(self.screen, mountain_dark, back_mountain_points)
+        pygame.draw.polygon(surface, mountain_dark, back_mountain_points)
         
         # Front mountains (lighter, closer)
         front_mountain_points = [
-            (0, SCREEN_HEIGHT - 150),
-            (100, SCREEN_HEIGHT - 200),
-            (250, SCREEN_HEIGHT - 180),
-            (400, SCREEN_HEIGHT - 240),
-            (550, SCREEN_HEIGHT - 190),
-            (700, SCREEN_HEIGHT - 210),
-            (SCREEN_WIDTH, SCREEN_HEIGHT - 160),
-            (SCREEN_WIDTH, SCREEN_HEIGHT),
-            (0, SCREEN_HEIGHT)
+            (0, screen_height - 150),
+            (100, screen_height - 200),
+            (250, screen_height - 180),
+            (400, screen_height - 240),
+            (550, screen_height - 190),
+            (700, screen_height - 210),
+            (screen_width, screen_height - 160),
+            (screen_width, screen_height),
+            (0, screen_height)
         ]
-        pygame.draw.polygon(self.screen, mountain_color, front_mountain_points)
+        pygame.draw.polygon(surface, mountain_color, front_mountain_points)
         
         # Add snow caps on peaks
         snow_color = (255, 250, 250)  # Snow white
         snow_peaks = [
-            (150, SCREEN_HEIGHT - 300, 20),  # x, y, width
-            (450, SCREEN_HEIGHT - 320, 25),
-            (400, SCREEN_HEIGHT - 240, 15),
-            (700, SCREEN_HEIGHT - 210, 18)
+            (150, screen_height - 300, 20),  # x, y, width
+            (450, screen_height - 320, 25),
+            (400, screen_height - 240, 15),
+            (700, screen_height - 210, 18)
         ]
         
         for peak_x, peak_y, width in snow_peaks:
@@ -2273,11 +4286,11 @@ class Game:
                 (peak_x, peak_y),
                 (peak_x + width, peak_y + 20)
             ]
-            pygame.draw.polygon(self.screen, snow_color, snow_points)
+            pygame.draw.polygon(surface, snow_color, snow_points)
     
-    def draw_sun(self):
+    def draw_sun(self, surface):
         """Draw a bright sun"""
-        sun_x = SCREEN_WIDTH - 100
+        sun_x = surface.get_width() - 100
         sun_y = 80
         sun_radius = 30
         
@@ -2290,7 +4303,7 @@ class Game:
             end_x = sun_x + math.cos(ray_angle) * (sun_radius + 20)
             end_y = sun_y + math.sin(ray_angle) * (sun_radius + 20)
             
-            pygame.draw.line(self.screen, (255, 255, 0), 
+            pygame.draw.line(surface, (255, 255, 0), 
                            (start_x, start_y), (end_x, end_y), 3)
         
         # Sun body with gradient effect
@@ -2298,77 +4311,129 @@ class Game:
             alpha = 255 - (sun_radius - radius) * 8
             color_intensity = 255 - (sun_radius - radius) * 3
             sun_color = (255, color_intensity, 0)
-            pygame.draw.circle(self.screen, sun_color, (sun_x, sun_y), radius)
+            pygame.draw.circle(surface, sun_color, (sun_x, sun_y), radius)
         
         # Sun highlight
-        pygame.draw.circle(self.screen, (255, 255, 200), 
+        pygame.draw.circle(surface, (255, 255, 200), 
                          (sun_x - 8, sun_y - 8), 8)
 
-    def draw(self):
-        # Calculate camera offset for shake effect
-        shake_x = random.randint(-self.camera_shake, self.camera_shake) if self.camera_shake > 0 else 0
-        shake_y = random.randint(-self.camera_shake, self.camera_shake) if self.camera_shake > 0 else 0
-        
-        # Draw background
-        self.draw_background()
-        
-        # Draw platforms
-        for platform in self.platforms:
-            platform.draw(self.screen)
-            
-        # Draw enemies
-        for enemy in self.enemies:
-            enemy.draw(self.screen)
-            
-        # Draw coins
-        for coin in self.coins:
-            coin.draw(self.screen)
+    def draw(self, alpha=1.0):
+        # An endless world scrolls to keep the player a third of the way across the screen
+        if self.sim.world is not None:
+            player = self.sim.player
+            self.camera.follow(player.prev_x + (player.x - player.prev_x) * alpha)
+        self.camera.begin_frame()
+        view = self.camera.view()
+        shaking = self.camera.shake > 0
+        
+        # Dirty-rect mode repaints everything while the screen shakes or an overlay is up, 
+        # and once more after shaking to put the still level layer back
+        full_repaint = (not self.dirty_rects or self.level_layer is None or shaking or 
+                        self.screen_shaken or self.sim.game_won or self.sim.game_over)
+        
+        if self.dirty_rects and not shaking:
+            if self.level_layer is None or self.level_layer.get_size() != self.screen.get_size():
+                self.build_level_layer()
             
-        # Draw power-ups
-        for power_up in self.power_ups:
-            power_up.draw(self.screen)
+            if full_repaint:
+                self.screen.blit(self.level_layer, (0, 0))
+            else:
+                # Restore only what was drawn over last frame
+                for rect in self.previous_rects:
+                    self.screen.blit(self.level_layer, rect, rect)
+        else:
+            # Draw background
+            self.draw_background(alpha)
             
-        # Draw particles
-        for particle in self.particles:
-            particle.draw(self.screen)
+            # Draw platforms on screen
+            for platform in self.sim.platform_grid.query(view):
+                platform.draw(self.screen, self.camera.offset)
             
-        # Draw player (with flashing effect if invulnerable)
-        if self.invulnerable:
-            # Flash player by only drawing every few frames
-            flash_rate = 200  # milliseconds
-            if (pygame.time.get_ticks() // flash_rate) % 2 == 0:
-                self.player.draw(self.screen)
-        else:
-            self.player.draw(self.screen)
+        rects = self.draw_entities(alpha, view)
         
         # Enhanced UI
+        self.ui_rects = []
         self.draw_enhanced_ui()
+        rects.extend(self.ui_rects)
         
         # Draw win screen if game is won
-        if self.game_won:
+        if self.sim.game_won:
             self.draw_win_screen()
         
         # Draw game over screen if game is over
-        if self.game_over:
+        if self.sim.game_over:
             self.draw_game_over_screen()
         
-        pygame.display.flip()
+        if full_repaint:
+            pygame.display.flip()
+        else:
+            pygame.display.update(self.previous_rects + rects)
+        self.previous_rects = rects
+        self.screen_shaken = shaking
+    
+    def draw_entities(self, alpha=1.0, view=None):
+        """Draw the moving objects inside view (a world rect, everything if None) 
+        and return the screen rects they cover"""
+        rects = []
+        offset = self.camera.offset
+        
+        # Draw enemies, coins and power-ups (the entity grid keeps them in that order)
+        entities = self.sim.entity_grid.items if view is None else self.sim.entity_grid.query(view)
+        for entity in entities:
+            if isinstance(entity, Enemy):
+                rects.append(entity.draw(self.screen, alpha, offset))
+            else:
+                rects.append(entity.draw(self.screen, offset))
+        
+        # Draw particles
+        rects.extend(self.particles.draw(self.screen, offset, view))
+        
+        # Draw player (with flashing effect if invulnerable)
+        if self.sim.invulnerable:
+            # Flash player by only drawing every few frames
+            flash_rate = 200  # milliseconds
+            if (self.sim.ticks // flash_rate) % 2 == 0:
+                rects.append(self.sim.player.draw(self.screen, alpha, offset))
+        else:
+            rects.append(self.sim.player.draw(self.screen, alpha, offset))
+        
+        return [rect for rect in rects if rect is not None]
+    
+    def build_level_layer(self):
+        """Composite the background and platforms into the layer dirty rects are restored from"""
+        if self.background_size != self.screen.get_size():
+            self.build_background_layers()
+        
+        # Clouds are frozen in place while rendering with dirty rects
+        self.level_layer = pygame.Surface(self.screen.get_size()).convert()
+        self.level_layer.blit(self.sky_layer, (0, 0))
+        self.draw_clouds(self.level_layer, self.cloud_drift)
+        self.level_layer.blit(self.scenery_layer, (0, 0))
+        for platform in self.sim.platforms:
+            platform.draw(self.level_layer)
+        self.previous_rects = []
+    
+    def blit_ui(self, surface, dest):
+        """Blit a HUD element and remember the area it covers"""
+        rect = self.screen.blit(surface, dest)
+        self.ui_rects.append(rect)
+        return rect
     
     def draw_enhanced_ui(self):
         # Score with combo multiplier
-        score_text = self.font.render(f"Score: {self.score}", True, BLACK)
-        self.screen.blit(score_text, (10, 10))
+        score_text = self.text_cache.render(self.font, f"Score: {self.sim.score}", BLACK)
+        self.blit_ui(score_text, (10, 10))
         
-        if self.combo_multiplier > 1:
-            combo_text = self.small_font.render(f"Combo x{self.combo_multiplier}!", True, ORANGE)
-            self.screen.blit(combo_text, (10, 45))
+        if self.sim.combo_multiplier > 1:
+            combo_text = self.text_cache.render(self.small_font, f"Combo x{self.sim.combo_multiplier}!", ORANGE)
+            self.blit_ui(combo_text, (10, 45))
         
         # Level indicator
-        level_text = self.small_font.render(f"Level: {self.level}", True, BLACK)
-        self.screen.blit(level_text, (SCREEN_WIDTH - 100, 10))
+        level_text = self.text_cache.render(self.small_font, f"Level: {self.sim.level}", BLACK)
+        self.blit_ui(level_text, (SCREEN_WIDTH - 100, 10))
         
         # Draw countdown timer
-        remaining_time = self.get_remaining_time()
+        remaining_time = self.sim.get_remaining_time()
         minutes = int(remaining_time // 60)
         seconds = int(remaining_time % 60)
         
@@ -2380,75 +4445,98 @@ class Game:
         else:
             timer_color = BLACK  # Normal color
         
-        timer_text = self.font.render(f"Time: {minutes:02d}:{seconds:02d}", True, timer_color)
+        if self.sim.endless:
+            # No time limit, show how far the player has come instead (the player is 32 pixels, about a meter)
+            timer_text = self.text_cache.render(self.font, f"Distance: {int(self.sim.player.x) // 32} m", BLACK)
+        else:
+            timer_text = self.text_cache.render(self.font, f"Time: {minutes:02d}:{seconds:02d}", timer_color)
         timer_rect = timer_text.get_rect()
         timer_rect.centerx = SCREEN_WIDTH // 2
         timer_rect.y = 10
-        self.screen.blit(timer_text, timer_rect)
+        self.blit_ui(timer_text, timer_rect)
         
         # Add flashing effect when time is very low (last 10 seconds)
         if remaining_time <= 10 and remaining_time > 0:
             if int(remaining_time * 2) % 2 == 0:  # Flash every half second
-                warning_text = self.small_font.render("TIME RUNNING OUT!", True, RED)
+                warning_text = self.text_cache.render(self.small_font, "TIME RUNNING OUT!", RED)
                 warning_rect = warning_text.get_rect()
                 warning_rect.centerx = SCREEN_WIDTH // 2
                 warning_rect.y = 50
-                self.screen.blit(warning_text, warning_rect)
+                self.blit_ui(warning_text, warning_rect)
         
         # Draw lives
         self.draw_lives()
         
         # Draw coins remaining
-        coins_remaining = sum(1 for coin in self.coins if not coin.collected)
-        coins_text = self.small_font.render(f"Coins: {coins_remaining}", True, BLACK)
-        self.screen.blit(coins_text, (10, 70))
+        coins_remaining = sum(1 for coin in self.sim.coins if not coin.collected)
+        coins_text = self.text_cache.render(self.small_font, f"Coins: {coins_remaining}", BLACK)
+        self.blit_ui(coins_text, (10, 70))
         
         # Power-up status indicators
         y_offset = 95
-        if self.player.speed_boost:
-            speed_text = self.small_font.render("SPEED BOOST!", True, ORANGE)
-            self.screen.blit(speed_text, (10, y_offset))
+        if self.sim.player.speed_boost:
+            speed_text = self.text_cache.render(self.small_font, "SPEED BOOST!", ORANGE)
+            self.blit_ui(speed_text, (10, y_offset))
             y_offset += 20
         
-        if self.player.jump_boost:
-            jump_text = self.small_font.render("SUPER JUMP!", True, GREEN)
-            self.screen.blit(jump_text, (10, y_offset))
+        if self.sim.player.jump_boost:
+            jump_text = self.text_cache.render(self.small_font, "SUPER JUMP!", GREEN)
+            self.blit_ui(jump_text, (10, y_offset))
             y_offset += 20
         
-        if self.player.invincible_power:
-            invincible_text = self.small_font.render("INVINCIBLE!", True, PURPLE)
-            self.screen.blit(invincible_text, (10, y_offset))
+        if self.sim.player.invincible_power:
+            invincible_text = self.text_cache.render(self.small_font, "INVINCIBLE!", PURPLE)
+            self.blit_ui(invincible_text, (10, y_offset))
             y_offset += 20
         
-        if self.player.magnet_power:
-            magnet_text = self.small_font.render("COIN MAGNET!", True, CYAN)
-            self.screen.blit(magnet_text, (10, y_offset))
+        if self.sim.player.magnet_power:
+            magnet_text = self.text_cache.render(self.small_font, "COIN MAGNET!", CYAN)
+            self.blit_ui(magnet_text, (10, y_offset))
             y_offset += 20
         
         # Music status
         music_status = "ON" if (self.music_playing and pygame.mixer.music.get_busy()) else "OFF"
-        music_text = self.small_font.render(f"Music: {music_status}", True, BLACK)
-        self.screen.blit(music_text, (10, y_offset))
+        music_text = self.text_cache.render(self.small_font, f"Music: {music_status}", BLACK)
+        self.blit_ui(music_text, (10, y_offset))
         
         # Instructions (condensed)
-        if not self.game_won and not self.game_over:
+        if not self.sim.game_won and not self.sim.game_over:
             instructions = [
                 "WASD/Arrows: Move | Space: Jump | R: New Level | M: Music | ESC: Quit"
             ]
             
             for i, instruction in enumerate(instructions):
-                text = pygame.font.Font(None, 20).render(instruction, True, BLACK)
-                self.screen.blit(text, (10, SCREEN_HEIGHT - 30 + i * 20))
+                text = self.text_cache.render(self.instruction_font, instruction, BLACK)
+                self.blit_ui(text, (10, SCREEN_HEIGHT - 30 + i * 20))
 
     def run(self):
         running = True
+        # Wall-clock milliseconds not yet simulated
+        accumulator = 0
         while running:
+            accumulator += self.clock.tick(self.render_fps)
             running = self.handle_events()
-            self.update()
-            self.draw()
-            self.clock.tick(FPS)
             
-        # Stop music when game ends
+            # Run the simulation at a fixed rate however fast we draw
+            steps = 0
+            while accumulator >= TICK_MS and steps < self.max_catch_up_steps:
+                self.update()
+                accumulator -= TICK_MS
+                steps += 1
+            
+            # Too far behind to catch up: drop the backlog instead of spiralling
+            if accumulator >= TICK_MS:
+                accumulator %= TICK_MS
+            
+            self.draw(accumulator / TICK_MS)
+            
+        # Stop music and the level and chunk producers when game ends
+        if self.level_queue is not None:
+            self.level_queue.close()
+        if self.sim.world is not None:
+            self.sim.world.close()
+        if self.level_library is not None:
+            self.level_library.close()
         pygame.mixer.music.stop()
         pygame.quit()
         sys.exit()
@@ -2485,12 +4573,40 @@ class Game:
             except pygame.error as e:
                 print(f"Error playing lose sound: {e}")
 
-    def get_remaining_time(self):
-        """Get remaining time in seconds"""
-        elapsed_time = (pygame.time.get_ticks() - self.countdown_start_time) / 1000
-        remaining_time = max(0, self.countdown_duration - elapsed_time)
-        return remaining_time
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Play somegame, or generate a level library without a window.")
+    parser.add_argument('library', nargs='?', 
+                        help="level library file to play instead of random levels (or to write with --generate)")
+    parser.add_argument('--endless', action='store_true', 
+                        help="play an endless scrolling world instead of single-screen levels")
+    parser.add_argument('--seed', type=int, 
+                        help="seed for the random levels, or the first level's seed with --generate (default 0)")
+    parser.add_argument('--generate', type=int, metavar='N', help="generate N levels into LIBRARY and exit")
+    parser.add_argument('--processes', type=int, help="worker processes for --generate (default: one per CPU)")
+    parser.add_argument('--metrics', metavar='CSV', 
+                        help="with --generate, write per-level stats to this CSV file ('-' for stdout)")
+    args = parser.parse_args(argv)
+    
+    if args.generate is None:
+        if args.endless and args.library is not None:
+            parser.error("--endless plays generated worlds and can't be used with a LIBRARY")
+        Game(seed=args.seed, level_library=args.library, endless=args.endless).run()
+        return
+    if args.library is None:
+        parser.error("--generate needs a LIBRARY file to write")
+    
+    seed = 0 if args.seed is None else args.seed
+    batch = LevelBatch(processes=args.processes)
+    start = time.perf_counter()
+    if args.metrics is None:
+        count = batch.write(args.library, args.generate, seed)
+    elif args.metrics == '-':
+        count = batch.write(args.library, args.generate, seed, metrics=sys.stdout)
+    else:
+        with open(args.metrics, 'w', newline='') as metrics:
+            count = batch.write(args.library, args.generate, seed, metrics=metrics)
+    skipped = f" (skipped {args.generate - count} too big for the format)" if count < args.generate else ""
+    print(f"Wrote {count} levels to {args.library} in {time.perf_counter() - start:.1f}s{skipped}", file=sys.stderr)
 
 if __name__ == "__main__":
-    game = Game()
-    game.run()
+    main()
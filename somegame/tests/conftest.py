@@ -0,0 +1,7 @@
+import os
+import sys
+
+# Run without a window or sound, and import somegame.py from the directory above
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,45 @@
+from somegame import LEVEL_RETRIES, PlayerInput, Simulation
+
+
+def platform_rects(sim):
+    return [tuple(platform.rect) for platform in sim.platforms]
+
+
+def test_spawn_inside_a_platform_top_gives_a_level_that_can_be_won():
+    # The spawn point dips a pixel into one platform's top, above a boxed-in one
+    sim = Simulation(0)
+    sim.generate_level(1473)
+    assert sim.level_seed == 1473
+    assert len(sim.reachability.reachable) > 1
+    assert sim.coins
+    
+    sim.step(PlayerInput())
+    assert not sim.game_won
+
+
+def test_unwinnable_layouts_are_generated_again_from_the_next_seed(monkeypatch):
+    sim = Simulation(0)
+    sim.generate_level(1474)
+    expected = platform_rects(sim)
+    
+    monkeypatch.setattr(Simulation, 'winnable', lambda sim: sim.level_seed != 1473)
+    sim.generate_level(1473)
+    assert (sim.level_seed, sim.rejected_layouts) == (1474, 1)
+    assert platform_rects(sim) == expected
+
+
+def test_layout_retries_are_bounded(monkeypatch):
+    monkeypatch.setattr(Simulation, 'winnable', lambda sim: False)
+    sim = Simulation(0)
+    sim.generate_level(1473)
+    assert (sim.level_seed, sim.rejected_layouts) == (1473 + LEVEL_RETRIES, LEVEL_RETRIES)
+
+
+def test_simulation_can_start_without_a_level():
+    sim = Simulation(0, generate=False)
+    assert not hasattr(sim, 'platforms')
+    
+    sim.generate_level(1474)
+    expected = Simulation(0)
+    expected.generate_level(1474)
+    assert platform_rects(sim) == platform_rects(expected)
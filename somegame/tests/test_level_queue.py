@@ -0,0 +1,23 @@
+from somegame import LevelQueue, Simulation
+
+
+def level_signature(level):
+    seed, platforms, _, enemies, coins, power_ups = level
+    return (seed, [tuple(platform.rect) for platform in platforms],
+            [(enemy.x, enemy.y) for enemy in enemies], [(coin.x, coin.y) for coin in coins],
+            [(power_up.x, power_up.y, power_up.power_type) for power_up in power_ups])
+
+
+def test_seeded_queue_matches_serial_generation():
+    sim = Simulation(7)
+    expected = []
+    for _ in range(12):
+        sim.regenerate_level()
+        expected.append(level_signature(sim.current_level()))
+    
+    # A queue of one keeps the consumer waiting on the producer most of the time
+    level_queue = LevelQueue(7, size=1)
+    try:
+        assert [level_signature(level_queue.next_level()) for _ in range(12)] == expected
+    finally:
+        level_queue.close()
@@ -0,0 +1,72 @@
+import random
+
+import numpy as np
+import pytest
+
+from somegame import LevelLibrary, PlayerInput, Simulation, VectorEnv
+
+
+def actions(seed, count):
+    """Held-down inputs that change about every other tick, as VectorEnv action bits"""
+    rng = random.Random(seed)
+    action = 0
+    for _ in range(count):
+        if rng.random() < 0.5:
+            action = rng.choice([0, 1, 2, 4, 5, 6, 2, 2, 6])
+        yield action
+
+
+def assert_same_run(sim, actions):
+    """Step a Simulation and a one-environment VectorEnv side by side, comparing their state every tick"""
+    env = VectorEnv(1)
+    env.reset_env(0)
+    assert env.load_level(0, sim)
+    
+    for tick, action in enumerate(actions):
+        sim.step(PlayerInput(left=bool(action & 1), right=bool(action & 2), jump=bool(action & 4)))
+        _, _, dones = env.step(np.array([action]))
+        if dones[0]:
+            # The env resets itself when it finishes, so there is no state left to compare
+            assert sim.game_over or sim.game_won, f'tick {tick}'
+            return
+        assert not (sim.game_over or sim.game_won), f'tick {tick}'
+        
+        player = (sim.player.x, sim.player.y, sim.score, sim.lives)
+        assert np.allclose(player, (env.player_x[0], env.player_y[0], env.score[0], env.lives[0])), f'tick {tick}'
+        enemies = [(enemy.x, enemy.y, enemy.vel_x, enemy.alive) for enemy in sim.enemies]
+        slots = range(len(sim.enemies))
+        vector_enemies = [(env.enemy_x[0, slot], env.enemy_y[0, slot], env.enemy_vel_x[0, slot], env.enemy_alive[0, slot]) 
+                          for slot in slots]
+        assert np.allclose(np.array(enemies, float), np.array(vector_enemies, float)), f'tick {tick}'
+
+
+@pytest.mark.parametrize('seed', range(6))
+def test_vector_env_matches_simulation(seed):
+    assert_same_run(Simulation(seed), actions(seed, 1500))
+
+
+@pytest.mark.parametrize('seed', range(6))
+def test_vector_env_matches_simulation_with_crowded_enemies(seed):
+    # Bunch every enemy up behind the first so they keep running into each other
+    sim = Simulation(seed)
+    leader = sim.enemies[0]
+    for slot, enemy in enumerate(sim.enemies):
+        enemy.x = leader.x + 12 * slot
+        enemy.y = leader.y
+    assert_same_run(sim, [0] * 600)
+
+
+def test_vector_env_loads_library_levels_in_order(tmp_path):
+    levels = []
+    sim = Simulation(3)
+    for _ in range(2):
+        sim.regenerate_level()
+        levels.append(sim.current_level())
+    path = tmp_path / 'levels.bin'
+    LevelLibrary.write(path, levels)
+    
+    env = VectorEnv(3, level_library=path)
+    env.reset()
+    for index, (_, platforms, *_) in zip(range(3), levels * 2):
+        assert list(env.platform_left[index, :len(platforms)]) == [platform.rect.left for platform in platforms]
+        assert list(env.platform_top[index, :len(platforms)]) == [platform.rect.top for platform in platforms]
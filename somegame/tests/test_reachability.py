@@ -0,0 +1,50 @@
+from collections import deque
+
+import pytest
+
+from somegame import Player, PlayerInput, Simulation
+
+INPUTS = [PlayerInput(left, right, jump) for left, right, jump in
+          [(0, 0, 0), (1, 0, 0), (0, 1, 0), (0, 0, 1), (1, 0, 1), (0, 1, 1)]]
+
+
+def standable_platforms(sim):
+    """Every platform Player.update can land on from the spawn, by searching all input sequences"""
+    player = Player(100, 400)
+    start = (player.x, player.y, player.vel_y, player.on_ground)
+    seen = {start}
+    queue = deque([start])
+    standable = set()
+    while queue:
+        state = queue.popleft()
+        for player_input in INPUTS:
+            if player_input.jump and not state[3]:
+                continue
+            player.x, player.y, player.vel_y, player.on_ground = state
+            player.update(sim.platform_grid, player_input, 0)
+            # Rounding merges states that differ only by float noise
+            state_after = (player.x, round(player.y, 3), round(player.vel_y, 3), player.on_ground)
+            if state_after in seen:
+                continue
+            seen.add(state_after)
+            queue.append(state_after)
+            if player.on_ground:
+                for index, platform in enumerate(sim.platforms):
+                    if (abs(player.y + player.height - platform.y) < 1e-6 and
+                            player.x < platform.x + platform.width and player.x + player.width > platform.x):
+                        standable.add(index)
+    return standable
+
+
+# Seed 38 has a platform that can only be reached by walking off another one's end
+@pytest.mark.parametrize('seed', [0, 1, 38])
+def test_reachability_matches_exhaustive_search(seed):
+    sim = Simulation(seed)
+    assert sim.reachability.reachable == standable_platforms(sim)
+
+
+def test_reachability_starts_on_the_platform_the_spawn_lands_on():
+    # The spawn point is a pixel inside the top of one platform, with another boxed in below it
+    sim = Simulation(0)
+    sim.generate_level(1473)
+    assert sim.reachability.reachable == standable_platforms(sim)